@@ -1,27 +1,131 @@
 """Background removal module using U-2-Net model."""
 
+import io
 import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import List, Optional, Sequence, Tuple, Union
+import cv2
 import numpy as np
 from PIL import Image
 import torch
 import torch.nn.functional as F
 from ..config.model_paths import get_model_path
 
+U2NET_INPUT_SIZE = 320
+_MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32).reshape(3, 1, 1)
+_STD = np.array([0.229, 0.224, 0.225], dtype=np.float32).reshape(3, 1, 1)
+# Longest side of the guide image the guided filter runs at
+GUIDE_MAX_SIZE = 640
+MASK_UPSAMPLING = ("lanczos", "guided")
+
+
+@dataclass
+class BatchItemResult:
+    """Outcome of one image in a batch: the cut-out and mask, or the error."""
+    image: Optional[Image.Image] = None
+    mask: Optional[Image.Image] = None
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def guided_cutout(image: Image.Image, pred: np.ndarray, radius: int = 4, eps: float = 1e-3,
+                  soft: bool = False, threshold: float = 0.5) -> Tuple[Image.Image, Image.Image]:
+    """
+    Cut out an image with a low-resolution probability map, upsampled by a fast guided filter.
+    
+    The filter coefficients are fitted at guide resolution (GUIDE_MAX_SIZE)
+    against a downscaled grayscale guide, then upsampled, so mask edges
+    follow the full-resolution garment edges. At full resolution there is
+    only the coefficient upsampling, one multiply-add, the threshold and
+    the RGBA conversion.
+    
+    Args:
+        image: Original image
+        pred: U-2-Net sigmoid map (any resolution)
+        radius: Box filter radius at guide resolution
+        eps: Regularization; larger values give smoother edges
+        soft: Return a soft alpha matte instead of a binary mask
+        threshold: Probability above which a pixel is foreground (binary mask only)
+        
+    Returns:
+        Tuple of (RGBA cut-out, mask)
+    """
+    rgb = np.asarray(image if image.mode == "RGB" else image.convert("RGB"))
+    height, width = rgb.shape[:2]
+    scale = min(1.0, GUIDE_MAX_SIZE / max(height, width))
+    low_size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    
+    gray = cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY)
+    guide = cv2.resize(gray, low_size, interpolation=cv2.INTER_AREA).astype(np.float32)
+    guide *= np.float32(1.0 / 255.0)
+    p = cv2.resize(np.asarray(pred, dtype=np.float32), low_size, interpolation=cv2.INTER_LINEAR)
+    
+    ksize = (2 * radius + 1, 2 * radius + 1)
+    mean_i = cv2.boxFilter(guide, -1, ksize)
+    mean_p = cv2.boxFilter(p, -1, ksize)
+    cov_ip = cv2.boxFilter(guide * p, -1, ksize) - mean_i * mean_p
+    var_i = cv2.boxFilter(guide * guide, -1, ksize) - mean_i * mean_i
+    a = cov_ip / (var_i + eps)
+    b = mean_p - a * mean_i
+    # Scale the coefficients so that q = a * gray + b comes out in alpha
+    # units straight from the uint8 guide
+    a_full = cv2.resize(cv2.boxFilter(a, -1, ksize), (width, height), interpolation=cv2.INTER_LINEAR)
+    b_full = cv2.resize(cv2.boxFilter(b, -1, ksize) * np.float32(255.0), (width, height),
+                        interpolation=cv2.INTER_LINEAR)
+    q = np.multiply(a_full, gray, out=a_full)
+    q += b_full
+    
+    cutout = cv2.cvtColor(rgb, cv2.COLOR_RGB2RGBA)
+    if soft:
+        # Clamp below at zero; convertScaleAbs rounds and saturates at 255
+        alpha = cv2.convertScaleAbs(cv2.threshold(q, 0, 0, cv2.THRESH_TOZERO)[1])
+    else:
+        # NumPy rather than cv2.compare, which rejects a 1x1 array against a scalar
+        alpha = np.greater(q, np.float32(threshold * 255.0)).view(np.uint8) * np.uint8(255)
+    cutout[:, :, 3] = alpha
+    
+    return Image.fromarray(cutout, mode="RGBA"), Image.fromarray(alpha, mode="L")
+
+
+def decode_image(source: Union[bytes, Image.Image]) -> Image.Image:
+    """RGB PIL image from encoded bytes or a PIL image."""
+    if isinstance(source, Image.Image):
+        return source.convert("RGB")
+    image = Image.open(io.BytesIO(source))
+    image.load()
+    return image.convert("RGB")
+
 
 class U2NetBackgroundRemover:
     """U-2-Net based background removal for clothing items."""
     
-    def __init__(self, model_path: str = None, device: str = "cpu"):
+    def __init__(self, model_path: str = None, device: str = "cpu", batch_size: int = 8, num_workers: int = 4,
+                 mask_upsampling: str = "lanczos", soft_alpha: bool = False):
         """
         Initialize U-2-Net background remover.
         
         Args:
             model_path: Path to U-2-Net model weights (optional, uses external drive if None)
             device: Device to run model on (cpu/cuda/mps)
+            batch_size: Images per forward pass in remove_background_batch
+            num_workers: Threads for decoding, normalization and mask post-processing
+            mask_upsampling: "lanczos" resizes the mask, "guided" upsamples it with a
+                fast guided filter driven by the image (sharper garment edges)
+            soft_alpha: With "guided", return a soft alpha matte instead of a binary mask
         """
+        if mask_upsampling not in MASK_UPSAMPLING:
+            raise ValueError(f"Unknown mask upsampling: {mask_upsampling}. Choose from: {list(MASK_UPSAMPLING)}")
+        self.mask_upsampling = mask_upsampling
+        self.soft_alpha = soft_alpha
         self.device = device
+        self.batch_size = max(1, batch_size)
+        self.num_workers = max(1, num_workers)
+        self._pool = None
         # Use external drive model path if not provided
         if model_path is None:
             try:
@@ -93,7 +197,6 @@ class U2NetBackgroundRemover:
             return image, mask
             
         # Preprocess image
-        original_size = image.size
         image_tensor = self._preprocess_image(image)
         
         # Generate mask
@@ -102,41 +205,100 @@ class U2NetBackgroundRemover:
             pred = d1[:, 0, :, :]
             pred = torch.sigmoid(pred)
             
-        # Convert to PIL mask
-        mask = self._postprocess_mask(pred, original_size)
+        # Convert to PIL mask and apply it to create transparent image
+        result = self._cutout(image, pred.squeeze().cpu().numpy())
+        return result.image, result.mask
         
-        # Apply mask to create transparent image
-        image_rgba = image.convert("RGBA")
-        image_rgba.putalpha(mask)
+    def remove_background_batch(
+        self, images: Sequence[Union[bytes, Image.Image]]
+    ) -> List[BatchItemResult]:
+        """
+        Remove backgrounds from many images, batch_size at a time.
         
-        return image_rgba, mask
+        Images are decoded and normalized on a thread pool straight into a
+        preallocated float32 NCHW batch, and masks are post-processed in
+        parallel. An image that fails to decode gets an error result and
+        does not affect the others.
         
-    def _preprocess_image(self, image: Image.Image) -> torch.Tensor:
-        """Preprocess image for U-2-Net."""
-        # Resize to 320x320
-        image = image.resize((320, 320), Image.Resampling.LANCZOS)
+        Args:
+            images: Encoded image bytes or PIL Images
+            
+        Returns:
+            One BatchItemResult per input, in order
+        """
+        self.load_model()
+        pool = self._get_pool()
         
-        # Convert to tensor
-        image_np = np.array(image).astype(np.float32) / 255.0
-        if len(image_np.shape) == 2:
-            image_np = np.stack([image_np] * 3, axis=-1)
+        decoded = list(pool.map(self._safe_decode, images))
+        results = [BatchItemResult(error=item) if isinstance(item, str) else None for item in decoded]
+        valid = [i for i, item in enumerate(decoded) if not isinstance(item, str)]
         
-        # Normalize
-        mean = np.array([0.485, 0.456, 0.406])
-        std = np.array([0.229, 0.224, 0.225])
-        image_np = (image_np - mean) / std
+        if self.model is None:
+            # Same fallback as remove_background
+            for i in valid:
+                results[i] = BatchItemResult(decoded[i], Image.new('L', decoded[i].size, 255))
+            return results
         
-        # Convert to tensor
-        image_tensor = torch.from_numpy(image_np.transpose(2, 0, 1)).float()
-        image_tensor = image_tensor.unsqueeze(0).to(self.device)
+        batch = np.empty((min(self.batch_size, max(len(valid), 1)), 3, U2NET_INPUT_SIZE, U2NET_INPUT_SIZE),
+                         dtype=np.float32)
+        for start in range(0, len(valid), self.batch_size):
+            chunk = valid[start:start + self.batch_size]
+            list(pool.map(lambda j: self._normalize_into(decoded[chunk[j]], batch[j]), range(len(chunk))))
+            
+            with torch.no_grad():
+                d1, _, _, _, _, _, _ = self.model(torch.from_numpy(batch[:len(chunk)]).to(self.device))
+                preds = torch.sigmoid(d1[:, 0, :, :]).cpu().numpy()
+            
+            for i, result in zip(chunk, pool.map(self._cutout, [decoded[i] for i in chunk], preds)):
+                results[i] = result
         
-        return image_tensor
+        return results
+    
+    def _get_pool(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.num_workers, thread_name_prefix="u2net")
+        return self._pool
+    
+    @staticmethod
+    def _safe_decode(source):
+        try:
+            return decode_image(source)
+        except Exception as e:
+            return f"Could not decode image: {e}"
+    
+    def _cutout(self, image: Image.Image, pred: np.ndarray) -> BatchItemResult:
+        # One bad image must not fail the rest of its batch
+        try:
+            if self.mask_upsampling == "guided":
+                return BatchItemResult(*guided_cutout(image, pred, soft=self.soft_alpha))
+            mask = self._mask_from_pred(pred, image.size)
+            image_rgba = image.convert("RGBA")
+            image_rgba.putalpha(mask)
+            return BatchItemResult(image_rgba, mask)
+        except Exception as e:
+            return BatchItemResult(error=f"Background removal failed: {e}")
+    
+    @staticmethod
+    def _normalize_into(image: Image.Image, out: np.ndarray):
+        """Resize to the U-2-Net input and write the normalized CHW float32 image into `out`."""
+        image = image.resize((U2NET_INPUT_SIZE, U2NET_INPUT_SIZE), Image.Resampling.LANCZOS)
+        image_np = np.asarray(image)
+        if image_np.ndim == 2:
+            image_np = np.stack([image_np] * 3, axis=-1)
+        out[...] = image_np[:, :, :3].transpose(2, 0, 1)
+        out *= np.float32(1.0 / 255.0)
+        out -= _MEAN
+        out /= _STD
         
-    def _postprocess_mask(self, pred: torch.Tensor, original_size: Tuple[int, int]) -> Image.Image:
-        """Postprocess U-2-Net prediction to PIL mask."""
-        # Convert to numpy
-        pred = pred.squeeze().cpu().numpy()
+    def _preprocess_image(self, image: Image.Image) -> torch.Tensor:
+        """Preprocess image for U-2-Net."""
+        batch = np.empty((1, 3, U2NET_INPUT_SIZE, U2NET_INPUT_SIZE), dtype=np.float32)
+        self._normalize_into(image, batch[0])
+        return torch.from_numpy(batch).to(self.device)
         
+    @staticmethod
+    def _mask_from_pred(pred: np.ndarray, original_size: Tuple[int, int]) -> Image.Image:
+        """Binary mask at the original size from a 320x320 sigmoid map."""
         # Normalize to 0-255
         pred = (pred * 255).astype(np.uint8)
         
@@ -145,23 +307,24 @@ class U2NetBackgroundRemover:
         mask = mask.resize(original_size, Image.Resampling.LANCZOS)
         
         # Apply threshold
-        mask_np = np.array(mask)
-        mask_np = np.where(mask_np > 128, 255, 0).astype(np.uint8)
-        mask = Image.fromarray(mask_np, mode='L')
-        
-        return mask
+        return mask.point(lambda v: 255 if v > 128 else 0)
 
 
 class BackgroundRemoval:
     """Convenience class for background removal with U-2-Net."""
     
-    def __init__(self, model_name: str = "u2net", device: str = None):
+    def __init__(self, model_name: str = "u2net", device: str = None, batch_size: int = 8, num_workers: int = 4,
+                 mask_upsampling: str = "lanczos", soft_alpha: bool = False):
         """
         Initialize background removal with specified model.
         
         Args:
             model_name: Model to use ('u2net', 'u2netp', 'u2net_human')
             device: Device to run on (None for auto-detect)
+            batch_size: Images per forward pass for batched removal
+            num_workers: Threads for decoding and mask post-processing
+            mask_upsampling: "lanczos" or "guided" (see U2NetBackgroundRemover)
+            soft_alpha: Soft alpha matte with guided upsampling
         """
         if device is None:
             if torch.backends.mps.is_available():
@@ -185,7 +348,10 @@ class BackgroundRemoval:
         
         try:
             model_path = str(get_model_path("u2net", model_map[model_name]))
-            self.processor = U2NetBackgroundRemover(model_path=model_path, device=device)
+            self.processor = U2NetBackgroundRemover(
+                model_path=model_path, device=device, batch_size=batch_size, num_workers=num_workers,
+                mask_upsampling=mask_upsampling, soft_alpha=soft_alpha
+            )
             self.processor.load_model()
         except Exception as e:
             print(f"Failed to initialize background removal: {e}")
@@ -198,4 +364,18 @@ class BackgroundRemoval:
             mask = Image.new('L', image.size, 255)
             return image, mask
         
-        return self.processor.remove_background(image)
\ No newline at end of file
+        return self.processor.remove_background(image)
+    
+    def remove_background_batch(self, images: Sequence[Union[bytes, Image.Image]]) -> List[BatchItemResult]:
+        """Remove backgrounds from many images; see U2NetBackgroundRemover.remove_background_batch."""
+        if self.processor is None:
+            results = []
+            for source in images:
+                try:
+                    image = decode_image(source)
+                    results.append(BatchItemResult(image, Image.new('L', image.size, 255)))
+                except Exception as e:
+                    results.append(BatchItemResult(error=f"Could not decode image: {e}"))
+            return results
+        
+        return self.processor.remove_background_batch(images)
@@ -0,0 +1,140 @@
+"""
+Garment image embeddings from the CLIP image encoder of the try-on pipeline.
+
+IDM-VTON already loads `CLIPVisionModelWithProjection` as its image encoder;
+`IDMVTONSimplified.load_models` registers that instance here, so garments are
+embedded without a second copy of the weights. With
+EMBEDDING_LOAD_ENCODER set, the encoder is loaded on its own when the try-on
+pipeline has not been loaded (e.g. on an upload-only worker).
+"""
+
+import logging
+import threading
+from contextlib import nullcontext
+from typing import List, Optional
+
+import numpy as np
+import torch
+from PIL import Image
+from transformers import CLIPImageProcessor, CLIPVisionModelWithProjection
+
+from app.config.model_paths import get_model_path
+from app.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _to_rgb(image: Image.Image) -> Image.Image:
+    """RGB image, with transparent (background-removed) pixels on white."""
+    if image.mode in ('RGBA', 'LA', 'P'):
+        rgba = image.convert('RGBA')
+        background = Image.new('RGB', rgba.size, (255, 255, 255))
+        background.paste(rgba, mask=rgba.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+class GarmentEmbedder:
+    """Batched, L2-normalized CLIP image embeddings."""
+
+    def __init__(self, image_encoder: CLIPVisionModelWithProjection, device: str, dtype: torch.dtype,
+                 stager=None, batch_size: int = 16):
+        """
+        Args:
+            image_encoder: CLIP vision model with a projection head
+            device: Device the encoder runs on
+            dtype: Encoder weight dtype
+            stager: ComponentStager of a sequential try-on pipeline, when the
+                encoder weights are only materialized on demand
+            batch_size: Images per forward pass
+        """
+        self.image_encoder = image_encoder
+        self.processor = CLIPImageProcessor()
+        self.device = device
+        self.dtype = dtype
+        self.stager = stager
+        self.batch_size = batch_size
+        self.dim = image_encoder.config.projection_dim
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_pretrained(cls, model_path: Optional[str] = None, batch_size: int = 16) -> "GarmentEmbedder":
+        """Load the IDM-VTON image encoder on its own."""
+        if model_path is None:
+            model_path = str(get_model_path("idm_vton", "image_encoder"))
+        if torch.cuda.is_available():
+            device, dtype = "cuda", torch.float16
+        elif torch.backends.mps.is_available():
+            device, dtype = "mps", torch.float32
+        else:
+            device, dtype = "cpu", torch.float32
+        image_encoder = CLIPVisionModelWithProjection.from_pretrained(model_path, torch_dtype=dtype)
+        image_encoder.requires_grad_(False)
+        image_encoder.eval()
+        return cls(image_encoder.to(device), device, dtype, batch_size=batch_size)
+
+    def _staged(self):
+        """Hold the staged encoder weights so a try-on phase switch cannot release them mid-batch."""
+        if self.stager is None:
+            return nullcontext()
+        return self.stager.hold(["image_encoder"])
+
+    @torch.no_grad()
+    def embed(self, images: List[Image.Image]) -> np.ndarray:
+        """
+        Embed garment images.
+
+        Args:
+            images: PIL images, any mode
+
+        Returns:
+            (len(images), dim) float32 array of unit-length embeddings
+        """
+        if not images:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        embeddings = []
+        with self._lock, self._staged():
+            for start in range(0, len(images), self.batch_size):
+                batch = [_to_rgb(image) for image in images[start:start + self.batch_size]]
+                pixels = self.processor(images=batch, return_tensors="pt").pixel_values
+                pixels = pixels.to(self.device, dtype=self.dtype)
+                embeds = self.image_encoder(pixels).image_embeds.float()
+                embeddings.append(torch.nn.functional.normalize(embeds, dim=-1).cpu().numpy())
+        return np.concatenate(embeddings)
+
+
+_embedder: Optional[GarmentEmbedder] = None
+_load_failed = False
+_embedder_lock = threading.Lock()
+
+
+def register_image_encoder(image_encoder: CLIPVisionModelWithProjection, device: str, dtype: torch.dtype,
+                           stager=None):
+    """Use an already-loaded try-on image encoder for garment embeddings."""
+    global _embedder
+    with _embedder_lock:
+        _embedder = GarmentEmbedder(image_encoder, device, dtype, stager, settings.EMBEDDING_BATCH_SIZE)
+    logger.info("✅ Garment embeddings use the try-on image encoder")
+
+
+def get_garment_embedder(load: Optional[bool] = None) -> Optional[GarmentEmbedder]:
+    """
+    The shared embedder, or None when no encoder is available.
+
+    Args:
+        load: Load the encoder on its own if none is registered
+            (defaults to settings.EMBEDDING_LOAD_ENCODER); a failed load is
+            not retried
+    """
+    global _embedder, _load_failed
+    if load is None:
+        load = settings.EMBEDDING_LOAD_ENCODER
+    with _embedder_lock:
+        if _embedder is None and load and not _load_failed:
+            try:
+                _embedder = GarmentEmbedder.from_pretrained(batch_size=settings.EMBEDDING_BATCH_SIZE)
+                logger.info("✅ Loaded image encoder for garment embeddings")
+            except Exception as e:
+                _load_failed = True
+                logger.warning(f"⚠️  Could not load image encoder for garment embeddings: {e}")
+        return _embedder
@@ -0,0 +1,225 @@
+"""
+Sequential component staging for the IDM-VTON pipeline.
+
+A try-on request only needs each heavy component during one phase:
+
+    text    -> text_encoder, text_encoder_2
+    encode  -> image_encoder, vae (encoder half)
+    denoise -> unet, unet_encoder
+    decode  -> vae (decoder half)
+
+`ComponentStager` keeps every registered module as an empty shell on the
+``meta`` device and materializes only the components of the active phase.
+Weights are read from memory-mapped safetensors (or ``torch.load(mmap=True)``
+for ``.bin`` checkpoints), so re-staging a component is mostly page-cache
+hits instead of a full deserialization.
+
+Components are reference counted: the active phase holds its components,
+and other users of a shared module (the garment embedder borrows
+``image_encoder``) take a hold with `ComponentStager.hold`. A component is
+only released once nothing holds it.
+"""
+
+import gc
+import logging
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+# Components needed by each phase of a single try-on request
+PHASES: Dict[str, List[str]] = {
+    "text": ["text_encoder", "text_encoder_2"],
+    "encode": ["image_encoder", "vae"],
+    "denoise": ["unet", "unet_encoder"],
+    "decode": ["vae"],
+}
+
+_WEIGHT_FILE_NAMES = (
+    "diffusion_pytorch_model.safetensors",
+    "model.safetensors",
+    "diffusion_pytorch_model.fp16.safetensors",
+    "model.fp16.safetensors",
+    "diffusion_pytorch_model.bin",
+    "pytorch_model.bin",
+)
+
+
+def find_weight_file(component_dir: Path) -> Path:
+    """Return the weight file inside a diffusers/transformers component folder."""
+    for name in _WEIGHT_FILE_NAMES:
+        candidate = component_dir / name
+        if candidate.exists():
+            return candidate
+    raise FileNotFoundError(f"No weight file found in {component_dir}")
+
+
+def load_mmap_state_dict(weight_file: Path) -> Dict[str, torch.Tensor]:
+    """Load a state dict whose tensors are backed by a memory map of the file."""
+    if weight_file.suffix == ".safetensors":
+        from safetensors.torch import load_file
+        # safetensors maps the file and returns zero-copy CPU tensors
+        return load_file(str(weight_file), device="cpu")
+    return torch.load(str(weight_file), map_location="cpu", mmap=True, weights_only=True)
+
+
+def read_weight_keys(weight_file: Path) -> set:
+    """Return the tensor names stored in a checkpoint without materializing it."""
+    if weight_file.suffix == ".safetensors":
+        from safetensors import safe_open
+        with safe_open(str(weight_file), framework="pt", device="cpu") as f:
+            return set(f.keys())
+    return set(load_mmap_state_dict(weight_file).keys())
+
+
+def _set_tensor(module: torch.nn.Module, name: str, tensor: torch.Tensor):
+    """Assign a parameter or buffer by dotted name."""
+    owner_name, _, attr = name.rpartition(".")
+    owner = module.get_submodule(owner_name) if owner_name else module
+    if attr in owner._parameters:
+        owner._parameters[attr] = torch.nn.Parameter(tensor, requires_grad=False)
+    else:
+        owner._buffers[attr] = tensor
+
+
+class _StagedComponent:
+    def __init__(self, module: torch.nn.Module, weight_file: Path, dtype: torch.dtype):
+        self.module = module
+        self.weight_file = weight_file
+        self.dtype = dtype
+        self.loaded = True
+
+        # Tensors that are not in the checkpoint (non-persistent buffers, keys
+        # skipped by strict=False loads) would be lost when the module moves to
+        # meta, so they stay resident. They are small compared to the weights.
+        # Modules built under init_empty_weights() keep their buffers on the
+        # CPU; a parameter missing from the checkpoint has no values there and
+        # is zero-filled.
+        file_keys = read_weight_keys(weight_file)
+        self.resident = {}
+        for name, tensor in list(module.named_parameters()) + list(module.named_buffers()):
+            if name in file_keys:
+                continue
+            if tensor.is_meta:
+                logger.warning("%s is not in %s; zero-filling it", name, weight_file.name)
+                tensor = torch.zeros(tensor.shape, dtype=tensor.dtype)
+            if tensor.is_floating_point():
+                tensor = tensor.to(dtype)
+            self.resident[name] = tensor.detach().clone()
+
+
+class ComponentStager:
+    """Stage pipeline components in and out of memory phase by phase."""
+
+    def __init__(self, device: str, dtype: torch.dtype):
+        self.device = torch.device(device)
+        self.dtype = dtype
+        self.components: Dict[str, _StagedComponent] = {}
+        self.active_phase: Optional[str] = None
+        self.timings: Dict[str, float] = {}
+        # Holders per component: the active phase and any `hold` callers
+        self._holds: Counter = Counter()
+        self._lock = threading.RLock()
+
+    def register(self, name: str, module: torch.nn.Module, component_dir: Path):
+        """Track ``module`` and release its weights until a phase needs it.
+
+        ``module`` may be an empty shell (built under ``init_empty_weights()``);
+        its weights are then first read from disk when a phase loads it.
+        """
+        weight_file = find_weight_file(Path(component_dir))
+        self.components[name] = _StagedComponent(module, weight_file, self.dtype)
+        self.release([name])
+        logger.info("Registered %s for sequential staging (%s)", name, weight_file.name)
+
+    def load(self, names: Iterable[str]):
+        """Materialize the given components from their memory-mapped weights."""
+        with self._lock:
+            self._load(names)
+
+    def _load(self, names: Iterable[str]):
+        for name in names:
+            staged = self.components.get(name)
+            if staged is None or staged.loaded:
+                continue
+            start = time.perf_counter()
+            state_dict = load_mmap_state_dict(staged.weight_file)
+            for key, tensor in state_dict.items():
+                if tensor.is_floating_point() and tensor.dtype != staged.dtype:
+                    state_dict[key] = tensor.to(staged.dtype)
+            staged.module.load_state_dict(state_dict, strict=False, assign=True)
+            for key, tensor in staged.resident.items():
+                _set_tensor(staged.module, key, tensor)
+            staged.module.to(self.device)
+            staged.module.requires_grad_(False)
+            staged.loaded = True
+            self.timings[name] = time.perf_counter() - start
+            logger.debug("Staged in %s in %.2fs", name, self.timings[name])
+
+    def release(self, names: Iterable[str]):
+        """Drop the weights of the given components that nothing holds, keeping the module shells."""
+        with self._lock:
+            self._release(names)
+
+    def _release(self, names: Iterable[str]):
+        released = False
+        for name in names:
+            staged = self.components.get(name)
+            if staged is None or not staged.loaded or self._holds[name] > 0:
+                continue
+            staged.module.to("meta")
+            staged.loaded = False
+            released = True
+        if released:
+            gc.collect()
+            if self.device.type == "cuda":
+                torch.cuda.empty_cache()
+            elif self.device.type == "mps":
+                torch.mps.empty_cache()
+
+    def enter(self, phase: str):
+        """Switch to ``phase``: release what it does not need, load what it does."""
+        if phase not in PHASES:
+            raise ValueError(f"Unknown phase: {phase}. Choose from: {list(PHASES.keys())}")
+        wanted = PHASES[phase]
+        with self._lock:
+            self._holds.update(wanted)
+            self._drop_phase_holds()
+            self.active_phase = phase
+            self._release([name for name in self.components if name not in wanted])
+            self._load(wanted)
+
+    def release_all(self):
+        """Leave the active phase and release every component nothing else holds."""
+        with self._lock:
+            self._drop_phase_holds()
+            self.active_phase = None
+            self._release(list(self.components.keys()))
+
+    def _drop_phase_holds(self):
+        if self.active_phase is not None:
+            self._holds.subtract(PHASES[self.active_phase])
+
+    @contextmanager
+    def hold(self, names: Iterable[str]):
+        """Keep the given components loaded for the duration of the block."""
+        names = list(names)
+        with self._lock:
+            self._holds.update(names)
+            try:
+                self._load(names)
+            except Exception:
+                self._holds.subtract(names)
+                raise
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._holds.subtract(names)
+                self._release(names)
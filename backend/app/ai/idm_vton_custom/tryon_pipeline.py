@@ -420,7 +420,21 @@ class StableDiffusionXLInpaintPipeline(
         self.mask_processor = VaeImageProcessor(
             vae_scale_factor=self.vae_scale_factor, do_normalize=False, do_binarize=True, do_convert_grayscale=True
         )
+        # Optional ComponentStager for sequential offload (see component_staging.py)
+        self.component_stager = None
 
+    @property
+    def _execution_device(self):
+        # Staged components sit on the meta device between phases, so the
+        # execution device has to come from the stager instead of the modules.
+        if self.component_stager is not None:
+            return self.component_stager.device
+        return super()._execution_device
+
+    def _stage_phase(self, phase: str):
+        """Stage in the components for `phase` when sequential offload is enabled."""
+        if self.component_stager is not None:
+            self.component_stager.enter(phase)
 
 
     # Copied from diffusers.pipelines.stable_diffusion.pipeline_stable_diffusion.StableDiffusionPipeline.enable_vae_slicing
@@ -1602,6 +1616,7 @@ class StableDiffusionXLInpaintPipeline(
             masked_image = init_image * (mask < 0.5)
 
         # 6. Prepare latent variables
+        self._stage_phase("encode")
         num_channels_latents = self.vae.config.latent_channels
         num_channels_unet = self.unet.config.in_channels
         return_image_latents = num_channels_unet == 4
@@ -1722,6 +1737,9 @@ class StableDiffusionXLInpaintPipeline(
                 ip_adapter_image, device, batch_size * num_images_per_prompt
             )
 
+        self._stage_phase("denoise")
+
+        if ip_adapter_image is not None:
             # For ip_image_proj, the projection is handled inside the UNet forward pass
             # Only project here if not using ip_image_proj
             if hasattr(self.unet.config, 'encoder_hid_dim_type') and self.unet.config.encoder_hid_dim_type != "ip_image_proj":
@@ -1876,6 +1894,7 @@ class StableDiffusionXLInpaintPipeline(
                     xm.mark_step()
 
         if not output_type == "latent":
+            self._stage_phase("decode")
             # make sure the VAE is in float32 mode, as it overflows in float16
             needs_upcasting = self.vae.dtype == torch.float16 and self.vae.config.force_upcast
 
@@ -1899,6 +1918,8 @@ class StableDiffusionXLInpaintPipeline(
 
         # Offload all models
         self.maybe_free_model_hooks()
+        if self.component_stager is not None:
+            self.component_stager.release_all()
 
         # if not return_dict:
         return (image,)
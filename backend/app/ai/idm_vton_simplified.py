@@ -3,9 +3,13 @@ Simplified IDM-VTON Implementation
 Core IDM-VTON without DensePose dependency for immediate testing
 """
 
+import hashlib
+import json
+import threading
+from collections import OrderedDict
 from pathlib import Path
 
-from PIL import Image, ImageDraw
+from PIL import Image, ImageDraw, ImageFilter
 from app.ai.idm_vton_custom.tryon_pipeline import StableDiffusionXLInpaintPipeline as TryonPipeline
 from transformers import (
     CLIPImageProcessor,
@@ -14,25 +18,42 @@ from transformers import (
     CLIPTextModelWithProjection,
     AutoTokenizer,
 )
-from diffusers import DDPMScheduler, AutoencoderKL
+from diffusers import DDPMScheduler, AutoencoderKL, ModelMixin
+from accelerate import init_empty_weights
 from typing import List
 import torch
-import numpy as np
-from app.ai.utils_mask import get_mask_location
+from app.ai.utils_mask import MASK_CATEGORIES, get_category_masks, get_mask_crop_box, normalize_mask
 from torchvision import transforms
 from app.ai.preprocess.humanparsing.run_parsing import Parsing
 from app.ai.preprocess.openpose.run_openpose import OpenPose
-from app.ai.preprocess.densepose_wrapper import DensePoseProcessor
+from app.ai.preprocess.executor import PreprocessExecutor
 from torchvision.transforms.functional import to_pil_image
 from app.config.model_paths import get_model_path
+from app.config.settings import settings
+from app.ai.idm_vton_custom.component_staging import ComponentStager, find_weight_file, load_mmap_state_dict
+from app.ai.garment_embeddings import register_image_encoder
 import logging
 
 logger = logging.getLogger(__name__)
 
+EXECUTION_MODES = ("resident", "sequential")
+
+
 class IDMVTONSimplified:
     """IDM-VTON implementation with DensePose support (matching Gradio app)"""
     
-    def __init__(self, model_path: str = None, device: str = "mps"):
+    def __init__(self, model_path: str = None, device: str = "mps", execution_mode: str = "resident"):
+        """
+        Args:
+            model_path: Folder holding the IDM-VTON component subfolders
+            device: Device to run on (falls back to cpu when MPS is unavailable)
+            execution_mode: "resident" keeps every component loaded; "sequential"
+                stages each component in only for the phase that needs it, trading
+                latency for a much lower peak RSS on low-RAM nodes
+        """
+        if execution_mode not in EXECUTION_MODES:
+            raise ValueError(f"Unknown execution mode: {execution_mode}. Choose from: {list(EXECUTION_MODES)}")
+        self.execution_mode = execution_mode
         self.device = device if torch.backends.mps.is_available() else "cpu"
         # Use external drive model path if not provided
         if model_path is None:
@@ -44,9 +65,15 @@ class IDMVTONSimplified:
         else:
             self.model_path = model_path
         self.pipe = None
+        self.stager = None
         self.parsing_model = None
         self.openpose_model = None
         self.densepose_processor = None
+        # OpenPose, parsing and DensePose run side by side on this pool
+        self.preprocess_executor = PreprocessExecutor(max_workers=settings.PREPROCESS_WORKERS)
+        # Person image hash -> (keypoints, masks per category), most recent last
+        self._mask_cache = OrderedDict()
+        self._mask_cache_lock = threading.Lock()
         # Use float32 for MPS compatibility
         self.dtype = torch.float32 if self.device == "mps" else torch.float16
         self.tensor_transform = transforms.Compose([
@@ -56,51 +83,21 @@ class IDMVTONSimplified:
         
     def load_models(self):
         """Load all required models including DensePose"""
+        if self.pipe is not None:
+            return True
         try:
             logger.info("Loading IDM-VTON models with DensePose support...")
+            sequential = self.execution_mode == "sequential"
+            if sequential:
+                # Components are built as empty shells and read from disk by
+                # the stager the first time a phase needs them
+                self.stager = ComponentStager(self.device, self.dtype)
             
-            # Load custom UNet with config modifications
-            import json
-            unet_config_path = Path(self.model_path) / "unet" / "config.json"
-            with open(unet_config_path, 'r') as f:
-                unet_config = json.load(f)
-            
-            # Don't remove encoder_hid_dim_type, just load as is
+            # Load the try-on UNet and the garment encoder UNet
             from app.ai.idm_vton_custom.unet_hacked_tryon import UNet2DConditionModel as CustomUNet
-            unet = CustomUNet.from_config(unet_config)
-            
-            # Load the state dict
-            unet_path = Path(self.model_path) / "unet" / "diffusion_pytorch_model.bin"
-            if not unet_path.exists():
-                unet_path = Path(self.model_path) / "unet" / "diffusion_pytorch_model.safetensors"
-                from safetensors import safe_open
-                with safe_open(unet_path, framework="pt", device="cpu") as f:
-                    unet_state_dict = {k: f.get_tensor(k) for k in f.keys()}
-            else:
-                unet_state_dict = torch.load(unet_path, map_location='cpu')
-            unet.load_state_dict(unet_state_dict, strict=False)
-            unet = unet.to(dtype=self.dtype)
-            unet.requires_grad_(False)
-            
-            # Load encoder UNet
-            unet_encoder_config_path = Path(self.model_path) / "unet_encoder" / "config.json"
-            with open(unet_encoder_config_path, 'r') as f:
-                unet_encoder_config = json.load(f)
-            
             from app.ai.idm_vton_custom.unet_hacked_garmnet import UNet2DConditionModel as EncoderUNet
-            unet_encoder = EncoderUNet.from_config(unet_encoder_config)
-            
-            unet_encoder_path = Path(self.model_path) / "unet_encoder" / "diffusion_pytorch_model.bin"
-            if not unet_encoder_path.exists():
-                unet_encoder_path = Path(self.model_path) / "unet_encoder" / "diffusion_pytorch_model.safetensors"
-                from safetensors import safe_open
-                with safe_open(unet_encoder_path, framework="pt", device="cpu") as f:
-                    unet_encoder_state_dict = {k: f.get_tensor(k) for k in f.keys()}
-            else:
-                unet_encoder_state_dict = torch.load(unet_encoder_path, map_location='cpu')
-            unet_encoder.load_state_dict(unet_encoder_state_dict, strict=False)
-            unet_encoder = unet_encoder.to(dtype=self.dtype)
-            unet_encoder.requires_grad_(False)
+            unet = self._load_unet(CustomUNet, "unet")
+            unet_encoder = self._load_unet(EncoderUNet, "unet_encoder")
             
             # Load tokenizers
             tokenizer_one = AutoTokenizer.from_pretrained(
@@ -122,37 +119,11 @@ class IDMVTONSimplified:
                 subfolder="scheduler"
             )
             
-            # Load text encoders
-            text_encoder_one = CLIPTextModel.from_pretrained(
-                self.model_path,
-                subfolder="text_encoder",
-                torch_dtype=self.dtype,
-            )
-            text_encoder_two = CLIPTextModelWithProjection.from_pretrained(
-                self.model_path,
-                subfolder="text_encoder_2", 
-                torch_dtype=self.dtype,
-            )
-            
-            # Load image encoder
-            image_encoder = CLIPVisionModelWithProjection.from_pretrained(
-                self.model_path,
-                subfolder="image_encoder",
-                torch_dtype=self.dtype,
-            )
-            
-            # Load VAE
-            vae = AutoencoderKL.from_pretrained(
-                self.model_path,
-                subfolder="vae",
-                torch_dtype=self.dtype,
-            )
-            
-            # Set requires_grad to False
-            image_encoder.requires_grad_(False)
-            vae.requires_grad_(False)
-            text_encoder_one.requires_grad_(False)
-            text_encoder_two.requires_grad_(False)
+            # Load text encoders, image encoder and VAE
+            text_encoder_one = self._load_pretrained(CLIPTextModel, "text_encoder")
+            text_encoder_two = self._load_pretrained(CLIPTextModelWithProjection, "text_encoder_2")
+            image_encoder = self._load_pretrained(CLIPVisionModelWithProjection, "image_encoder")
+            vae = self._load_pretrained(AutoencoderKL, "vae")
             
             # Create the custom pipeline
             self.pipe = TryonPipeline.from_pretrained(
@@ -173,7 +144,10 @@ class IDMVTONSimplified:
             self.pipe.unet_encoder = unet_encoder
             
             # Move pipeline to device (handle MPS properly)
-            if self.device == "mps":
+            if sequential:
+                # Components are moved to the device by the stager when staged in
+                self.pipe.component_stager = self.stager
+            elif self.device == "mps":
                 # For MPS, move components individually
                 self.pipe.vae = self.pipe.vae.to(self.device)
                 self.pipe.text_encoder = self.pipe.text_encoder.to(self.device)
@@ -182,13 +156,38 @@ class IDMVTONSimplified:
                 self.pipe.image_encoder = self.pipe.image_encoder.to(self.device)
             else:
                 self.pipe.to(self.device)
+            # Garment embeddings reuse this encoder instead of loading their own
+            register_image_encoder(self.pipe.image_encoder, self.device, self.dtype, stager=self.stager)
             
             # Load preprocessing models  
-            self.parsing_model = Parsing(0)
-            self.openpose_model = OpenPose(0)
+            self.parsing_model = Parsing(
+                0,
+                num_threads=settings.PARSING_NUM_THREADS,
+                concurrent=settings.PARSING_CONCURRENT,
+                cache_dir=settings.ORT_CACHE_DIR,
+            )
+            self.openpose_model = OpenPose(
+                0,
+                backend=settings.OPENPOSE_BACKEND,
+                num_threads=settings.OPENPOSE_NUM_THREADS,
+                cache_dir=settings.ORT_CACHE_DIR,
+            )
             
             # Initialize DensePose processor
-            self.densepose_processor = DensePoseProcessor(device=self.device)
+            if settings.DENSEPOSE_BACKEND == "onnx":
+                # Needs only onnxruntime at serve time; detectron2 is never imported
+                from app.ai.preprocess.densepose_onnx import OnnxDensePoseProcessor
+                self.densepose_processor = OnnxDensePoseProcessor(
+                    onnx_path=settings.DENSEPOSE_ONNX_PATH,
+                    num_threads=settings.DENSEPOSE_NUM_THREADS,
+                    cache_dir=settings.ORT_CACHE_DIR,
+                    roi_min_size=settings.DENSEPOSE_ROI_MIN_SIZE,
+                )
+            else:
+                from app.ai.preprocess.densepose_wrapper import DensePoseProcessor
+                self.densepose_processor = DensePoseProcessor(
+                    device=self.device, roi_min_size=settings.DENSEPOSE_ROI_MIN_SIZE
+                )
             if self.densepose_processor.is_available():
                 logger.info("✅ DensePose processor initialized successfully")
             else:
@@ -200,6 +199,41 @@ class IDMVTONSimplified:
         except Exception as e:
             logger.error(f"❌ Failed to load IDM-VTON models: {e}")
             return False
+
+    def _load_unet(self, unet_class, subfolder: str):
+        """Build a UNet from its config and load its weights (staged in on first use in sequential mode)."""
+        component_dir = Path(self.model_path) / subfolder
+        with open(component_dir / "config.json", 'r') as f:
+            config = json.load(f)
+        if self.stager is not None:
+            with init_empty_weights():
+                unet = unet_class.from_config(config)
+            unet.requires_grad_(False)
+            self.stager.register(subfolder, unet, component_dir)
+            return unet
+        unet = unet_class.from_config(config)
+        state_dict = load_mmap_state_dict(find_weight_file(component_dir))
+        unet.load_state_dict(state_dict, strict=False)
+        del state_dict
+        unet = unet.to(dtype=self.dtype)
+        unet.requires_grad_(False)
+        return unet
+
+    def _load_pretrained(self, model_class, subfolder: str):
+        """Load a diffusers/transformers component (staged in on first use in sequential mode)."""
+        if self.stager is not None:
+            with init_empty_weights():
+                if issubclass(model_class, ModelMixin):
+                    model = model_class.from_config(model_class.load_config(self.model_path, subfolder=subfolder))
+                else:
+                    config = model_class.config_class.from_pretrained(self.model_path, subfolder=subfolder)
+                    model = model_class._from_config(config)
+            model.requires_grad_(False)
+            self.stager.register(subfolder, model, Path(self.model_path) / subfolder)
+            return model
+        model = model_class.from_pretrained(self.model_path, subfolder=subfolder, torch_dtype=self.dtype)
+        model.requires_grad_(False)
+        return model
     
     def _create_pose_visualization(self, human_img, keypoints):
         """Create a pose visualization from OpenPose keypoints"""
@@ -242,19 +276,27 @@ class IDMVTONSimplified:
         pose_pil = Image.fromarray(pose_img)
         return pose_pil.resize((768, 1024))
     
+    def person_masks(self, key):
+        """(keypoints, masks) stored for a person image, or None."""
+        with self._mask_cache_lock:
+            entry = self._mask_cache.get(key)
+            if entry is not None:
+                self._mask_cache.move_to_end(key)
+            return entry
+    
+    def store_person_masks(self, key, keypoints, masks):
+        """Cache a person image's keypoints and category masks (also used to seed them from storage)."""
+        if settings.MASK_CACHE_SIZE <= 0:
+            return
+        with self._mask_cache_lock:
+            self._mask_cache[key] = (keypoints, masks)
+            self._mask_cache.move_to_end(key)
+            while len(self._mask_cache) > settings.MASK_CACHE_SIZE:
+                self._mask_cache.popitem(last=False)
+    
     def pil_to_binary_mask(self, pil_image, threshold=0):
         """Convert PIL image to binary mask"""
-        np_image = np.array(pil_image)
-        grayscale_image = Image.fromarray(np_image).convert("L")
-        binary_mask = np.array(grayscale_image) > threshold
-        mask = np.zeros(binary_mask.shape, dtype=np.uint8)
-        for i in range(binary_mask.shape[0]):
-            for j in range(binary_mask.shape[1]):
-                if binary_mask[i, j] == True:
-                    mask[i, j] = 1
-        mask = (mask * 255).astype(np.uint8)
-        output_mask = Image.fromarray(mask)
-        return output_mask
+        return normalize_mask(pil_image, size=None, threshold=threshold)
     
     def generate_virtual_tryon(
         self,
@@ -265,33 +307,47 @@ class IDMVTONSimplified:
         auto_mask: bool = True,
         auto_crop: bool = False,
         denoise_steps: int = 30,
-        seed: int = 42
+        seed: int = 42,
+        mask_crop: bool = False,
+        category: str = "upper_body",
+        person_key: str = None
     ) -> tuple[Image.Image, Image.Image]:
         """
         Generate virtual try-on (simplified - without DensePose)
         
+        With mask_crop=True the pipeline only denoises the smallest
+        latent-aligned 3:4 crop around the inpaint mask and composites the
+        result back into the full frame, which cuts UNet cost for half-body
+        and cropped photos.
+        
+        The auto mask follows `category` ("upper_body", "lower_body" or
+        "dresses"). Masks for all three are computed together and cached per
+        person image, so trying another garment on the same photo skips
+        OpenPose and parsing. `person_key` names the cache entry (default: a
+        hash of the resized pixels), so callers can seed it with masks stored
+        for an identical or near-identical photo.
+        
         Returns:
             tuple: (result_image, mask_gray_image)
         """
         if not self.pipe:
             raise RuntimeError("Models not loaded. Call load_models() first.")
-        
-        # Move models to device (ensure all components are on the correct device)
-        try:
-            self.openpose_model.preprocessor.body_estimation.model.to(self.device)
-        except:
-            # OpenPose might not support MPS
-            pass
+        if category not in MASK_CATEGORIES:
+            raise ValueError(f"Unknown garment category: {category}. Choose from: {list(MASK_CATEGORIES)}")
         
         # Ensure pipeline components are on device
-        if self.device == "mps":
+        if self.stager is not None:
+            # Sequential mode: the stager moves each component when its phase starts
+            pass
+        elif self.device == "mps":
             # Already moved in load_models
             pass
         else:
             self.pipe.to(self.device)
         
         # Move encoder UNet
-        self.pipe.unet_encoder = self.pipe.unet_encoder.to(self.device)
+        if self.stager is None:
+            self.pipe.unet_encoder = self.pipe.unet_encoder.to(self.device)
         
         # Resize inputs with aspect ratio preservation
         def resize_preserve_aspect(img, target_size=(768, 1024)):
@@ -335,12 +391,43 @@ class IDMVTONSimplified:
         else:
             human_img, resize_info, paste_info = resize_preserve_aspect(human_img_orig)
         
+        # Run the independent preprocessing models concurrently
+        densepose_available = self.densepose_processor and self.densepose_processor.is_available()
+        person_key = (person_key or hashlib.sha1(human_img.tobytes()).hexdigest()) if auto_mask else None
+        cached = self.person_masks(person_key) if auto_mask else None
+        graph = self.preprocess_executor.graph()
+        pose_input = human_img.resize((384, 512))
+        if auto_mask and cached is None:
+            graph.add("openpose", self.openpose_model, pose_input)
+            graph.add("parsing", self.parsing_model, pose_input)
+        # The ONNX DensePose export has no RPN, so it always needs the OpenPose person box
+        densepose_roi = densepose_available and (
+            (auto_mask and settings.DENSEPOSE_ROI_MODE) or settings.DENSEPOSE_BACKEND == "onnx"
+        )
+        if densepose_roi and cached is not None:
+            graph.add("densepose", self.densepose_processor.process_image, human_img, keypoints=cached[0])
+        elif densepose_roi:
+            if not (auto_mask and cached is None):
+                graph.add("openpose", self.openpose_model, pose_input)
+            # Person box from the OpenPose keypoints replaces the R-CNN detection
+            graph.add("densepose", self.densepose_processor.process_image, human_img, deps=["openpose"])
+        elif densepose_available:
+            graph.add("densepose", self.densepose_processor.process_image, human_img)
+        preprocess = graph.run()
+        logger.info(preprocess.summary())
+        
         # Generate or process mask
         if auto_mask:
             try:
-                keypoints = self.openpose_model(human_img.resize((384, 512)))
-                model_parse, _ = self.parsing_model(human_img.resize((384, 512)))
-                mask, mask_gray = get_mask_location('hd', "upper_body", model_parse, keypoints)
+                if cached is not None:
+                    logger.info("Reusing cached person masks")
+                    _, masks = cached
+                else:
+                    keypoints = preprocess.result("openpose")
+                    model_parse, _ = preprocess.result("parsing")
+                    masks = get_category_masks('hd', model_parse, keypoints)
+                    self.store_person_masks(person_key, keypoints, masks)
+                mask, mask_gray = masks[category]
                 mask = mask.resize((768, 1024))
             except Exception as e:
                 logger.warning(f"Auto mask generation failed: {e}, using default mask")
@@ -350,8 +437,8 @@ class IDMVTONSimplified:
                 # Draw a simple upper body mask
                 draw.rectangle([200, 100, 568, 600], fill=255)
         else:
-            if mask_image:
-                mask = self.pil_to_binary_mask(mask_image.convert("RGB").resize((768, 1024)))
+            if mask_image is not None:
+                mask = normalize_mask(mask_image, size=(768, 1024))
             else:
                 # Create default mask
                 mask = Image.new('L', (768, 1024), 255)
@@ -361,9 +448,13 @@ class IDMVTONSimplified:
         mask_gray = to_pil_image((mask_gray + 1.0) / 2.0)
         
         # Generate DensePose image (matching Gradio app)
-        if self.densepose_processor and self.densepose_processor.is_available():
+        if densepose_available:
             logger.info("Using DensePose for pose estimation")
-            pose_img = self.densepose_processor.process_image(human_img)
+            if densepose_roi and "openpose" in preprocess.errors:
+                # No keypoints to take the person box from; detect it instead
+                pose_img = self.densepose_processor.process_image(human_img)
+            else:
+                pose_img = preprocess.result("densepose")
             pose_img = pose_img.resize((768, 1024))
         else:
             # For IDM-VTON, we need proper pose estimation, not fallbacks
@@ -372,9 +463,19 @@ class IDMVTONSimplified:
             pose_img = human_img.resize((768, 1024))
             # TODO: Install detectron2 and DensePose for better results
         
+        # Restrict denoising to the region around the mask
+        crop_box = get_mask_crop_box(mask) if mask_crop else None
+        if crop_box is not None:
+            logger.info(f"Mask-bounded crop inference on {crop_box}")
+            frame_img = human_img
+            human_img, mask, pose_img = (img.crop(crop_box) for img in (human_img, mask, pose_img))
+        gen_width, gen_height = human_img.size
+        
         # Generate virtual try-on
         with torch.no_grad():
             with torch.inference_mode():
+                if self.stager is not None:
+                    self.stager.enter("text")
                 # Encode prompts for human
                 prompt = f"model is wearing {garment_description}"
                 negative_prompt = "monochrome, lowres, bad anatomy, worst quality, low quality"
@@ -431,10 +532,14 @@ class IDMVTONSimplified:
                     cloth=garm_tensor.to(self.device, self.dtype),
                     mask_image=mask,
                     image=human_img,
-                    height=1024,
-                    width=768,
+                    height=gen_height,
+                    width=gen_width,
                     ip_adapter_image=garm_img.resize((768, 1024)),
                     guidance_scale=2.0,
+                    # SDXL micro-conditioning: describe the crop's place in the full frame
+                    original_size=(1024, 768),
+                    crops_coords_top_left=(crop_box[1], crop_box[0]) if crop_box else (0, 0),
+                    target_size=(gen_height, gen_width),
                 )
                 
                 # Extract images from result
@@ -462,6 +567,14 @@ class IDMVTONSimplified:
         # Ensure we have a PIL Image
         if not isinstance(out_img, Image.Image):
             raise ValueError(f"Expected PIL Image, got {type(out_img)}")
+        
+        if crop_box is not None:
+            # Composite the generated crop back through a feathered mask so
+            # pixels outside the inpaint region keep the original photo
+            blend_mask = mask.filter(ImageFilter.MaxFilter(9)).filter(ImageFilter.GaussianBlur(4))
+            composited = frame_img.copy()
+            composited.paste(out_img, crop_box[:2], blend_mask)
+            out_img = composited
             
         if auto_crop:
             # Extract the region and resize to original crop size
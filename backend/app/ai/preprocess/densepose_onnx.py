@@ -0,0 +1,149 @@
+"""
+DensePose on ONNX Runtime.
+
+Serves the backbone + DensePose head exported by
+scripts/export_densepose_onnx.py with only onnxruntime, NumPy and PIL, so
+serving skips the detectron2 import tree. The export has no RPN/box head:
+the person box comes from the OpenPose keypoints, or is the whole image
+when no keypoints are given.
+"""
+
+import json
+import logging
+from pathlib import Path
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from app.ai.preprocess.densepose_render import keypoint_person_box, render_parts
+from app.ai.preprocess.ort_session import create_session
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ONNX_PATH = '/Volumes/4TB-Z/AI-Models/virtual-closet/densepose/densepose_rcnn_R_50_FPN_s1x.onnx'
+
+
+def resize_shortest_edge(image, min_size, max_size):
+    """detectron2 ResizeShortestEdge for uint8 images (PIL bilinear).
+
+    Returns:
+        (resized image, (x scale, y scale))
+    """
+    h, w = image.shape[:2]
+    scale = min_size * 1.0 / min(h, w)
+    if h < w:
+        newh, neww = min_size, scale * w
+    else:
+        newh, neww = scale * h, min_size
+    if max(newh, neww) > max_size:
+        scale = max_size * 1.0 / max(newh, neww)
+        newh, neww = newh * scale, neww * scale
+    neww, newh = int(neww + 0.5), int(newh + 0.5)
+    resized = np.asarray(Image.fromarray(image).resize((neww, newh), Image.BILINEAR))
+    return resized, (neww / w, newh / h)
+
+
+def segm_to_labels(coarse_segm, fine_segm, box_xyxy):
+    """Part labels of one box from its coarse/fine segmentation logits.
+
+    Same as DensePose's ToChartResultConverter: both logits are resampled
+    to the box size, and fine labels are kept where the coarse segmentation
+    is foreground.
+    """
+    w = max(int(box_xyxy[2] - box_xyxy[0]), 1)
+    h = max(int(box_xyxy[3] - box_xyxy[1]), 1)
+    coarse = cv2.resize(np.ascontiguousarray(coarse_segm.transpose(1, 2, 0)), (w, h),
+                        interpolation=cv2.INTER_LINEAR).reshape(h, w, -1)
+    fine = cv2.resize(np.ascontiguousarray(fine_segm.transpose(1, 2, 0)), (w, h),
+                      interpolation=cv2.INTER_LINEAR).reshape(h, w, -1)
+    foreground = coarse.argmax(axis=2) > 0
+    return (fine.argmax(axis=2) * foreground).astype(np.uint8)
+
+
+class OnnxDensePoseProcessor:
+    """Drop-in for DensePoseProcessor that runs the exported ONNX model."""
+
+    def __init__(self, onnx_path=None, num_threads=0, cache_dir=None, roi_min_size=512):
+        """
+        Args:
+            onnx_path: Exported model; its .json sidecar holds the preprocessing config
+            num_threads: Intra-op thread budget (0 = all cores)
+            cache_dir: Folder for optimized ONNX graphs (None disables caching)
+            roi_min_size: Shortest-edge input size used when the box comes from keypoints
+        """
+        self.onnx_path = Path(onnx_path or DEFAULT_ONNX_PATH)
+        self.roi_min_size = roi_min_size
+        self.session = None
+        self.meta = None
+        try:
+            self.meta = json.loads(self.onnx_path.with_suffix('.json').read_text())
+            self.session = create_session(self.onnx_path, 0, num_threads, cache_dir)
+            logger.info(f"✅ DensePose ONNX model loaded from {self.onnx_path}")
+        except Exception as e:
+            logger.error(f"❌ Failed to load DensePose ONNX model: {e}")
+            self.session = None
+
+    def is_available(self):
+        return self.session is not None
+
+    def _preprocess(self, img_array, min_size):
+        """Resize, normalize and zero-pad like DefaultPredictor + ImageList."""
+        image = img_array
+        if self.meta["input_format"] == "RGB":
+            # Same as DefaultPredictor: input is taken as BGR and flipped for RGB models
+            image = image[:, :, ::-1]
+        image, scale = resize_shortest_edge(np.ascontiguousarray(image), min_size, self.meta["max_size"])
+        h, w = image.shape[:2]
+        divisibility = self.meta["size_divisibility"]
+        padded_h = -(-h // divisibility) * divisibility if divisibility > 1 else h
+        padded_w = -(-w // divisibility) * divisibility if divisibility > 1 else w
+
+        batch = np.zeros((1, 3, padded_h, padded_w), dtype=np.float32)
+        mean = np.asarray(self.meta["pixel_mean"], dtype=np.float32).reshape(3, 1, 1)
+        std = np.asarray(self.meta["pixel_std"], dtype=np.float32).reshape(3, 1, 1)
+        # Normalization happens before padding, so the padding stays zero
+        batch[0, :, :h, :w] = (image.transpose(2, 0, 1).astype(np.float32) - mean) / std
+        return batch, scale
+
+    def process_image(self, pil_image, keypoints=None):
+        """
+        Process PIL image to generate DensePose representation
+
+        Args:
+            pil_image: PIL Image to process
+            keypoints: Optional OpenPose keypoints (384x512 coordinates) for the person box
+
+        Returns:
+            PIL Image: DensePose visualization
+        """
+        if not self.is_available():
+            logger.warning("DensePose not available, returning original image")
+            return pil_image
+
+        try:
+            img_array = np.array(pil_image.convert("RGB"))
+            height, width = img_array.shape[:2]
+            person_box = keypoint_person_box(keypoints, pil_image.size) if keypoints else None
+            if person_box is None:
+                person_box = [0.0, 0.0, float(width), float(height)]
+                min_size = self.meta["min_size"]
+            else:
+                min_size = self.roi_min_size
+
+            batch, (sx, sy) = self._preprocess(img_array, min_size)
+            boxes = np.array([[person_box[0] * sx, person_box[1] * sy,
+                               person_box[2] * sx, person_box[3] * sy]], dtype=np.float32)
+            coarse_segm, fine_segm = self.session.run(None, {"image": batch, "boxes": boxes})
+
+            labels = segm_to_labels(coarse_segm[0], fine_segm[0], person_box)
+            logger.info("✅ DensePose processing successful")
+            return Image.fromarray(render_parts(img_array, labels, person_box))
+
+        except Exception as e:
+            logger.error(f"❌ DensePose processing failed: {e}")
+            return pil_image
+
+    def __call__(self, pil_image):
+        """Allow the processor to be called directly"""
+        return self.process_image(pil_image)
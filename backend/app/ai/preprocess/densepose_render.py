@@ -0,0 +1,85 @@
+"""
+Torch-free DensePose helpers shared by the detectron2 and ONNX Runtime
+processors: part-color rendering and the keypoint-derived person box.
+"""
+
+import numpy as np
+
+# Color per DensePose body part id, as a lookup table indexed by label
+PART_COLORS = np.array([
+    [0, 0, 0],        # Background
+    [255, 0, 0],      # Torso
+    [0, 255, 0],      # Right hand
+    [0, 0, 255],      # Left hand
+    [255, 255, 0],    # Left foot
+    [255, 0, 255],    # Right foot
+    [0, 255, 255],    # Upper leg right
+    [128, 0, 0],      # Upper leg left
+    [0, 128, 0],      # Lower leg right
+    [0, 0, 128],      # Lower leg left
+    [128, 128, 0],    # Upper arm left
+    [128, 0, 128],    # Upper arm right
+    [0, 128, 128],    # Lower arm left
+    [64, 0, 0],       # Lower arm right
+    [0, 64, 0],       # Head
+], dtype=np.uint8)
+PART_LUT = np.zeros((256, 3), dtype=np.uint8)
+PART_LUT[:len(PART_COLORS)] = PART_COLORS
+
+# Image weight of the part-color blend, as an integer fraction (0.6)
+BLEND_NUM, BLEND_DEN = 6, 10
+
+
+def render_parts(img_array, labels, box_xyxy):
+    """Blend box-sized part labels into the full frame with one LUT gather.
+
+    Args:
+        img_array: HxWx3 uint8 image
+        labels: Part ids of the person box (box height x box width)
+        box_xyxy: Box of `labels` in image coordinates
+
+    Returns:
+        HxWx3 uint8 blend of the image (60%) and the part colors (40%)
+    """
+    h, w = img_array.shape[:2]
+    label_map = np.zeros((h, w), dtype=np.uint8)
+    x0, y0 = int(box_xyxy[0]), int(box_xyxy[1])
+    # Labels are in box coordinates; paste them at the box offset, clipped to the frame
+    lx0, ly0 = max(0, -x0), max(0, -y0)
+    x0, y0 = max(0, x0), max(0, y0)
+    x1 = min(w, x0 + labels.shape[1] - lx0)
+    y1 = min(h, y0 + labels.shape[0] - ly0)
+    if x1 > x0 and y1 > y0:
+        label_map[y0:y1, x0:x1] = labels[ly0:ly0 + (y1 - y0), lx0:lx0 + (x1 - x0)]
+
+    colored_seg = PART_LUT[label_map]
+    blended = img_array.astype(np.uint16) * BLEND_NUM + colored_seg.astype(np.uint16) * (BLEND_DEN - BLEND_NUM)
+    return (blended // BLEND_DEN).astype(np.uint8)
+
+
+def keypoint_person_box(keypoints, image_size, keypoint_size=(384, 512), margin=0.2):
+    """Person box around OpenPose keypoints, padded to cover limbs and head.
+
+    Args:
+        keypoints: OpenPose output ({"pose_keypoints_2d": [[x, y], ...]})
+        image_size: (width, height) of the image DensePose runs on
+        keypoint_size: (width, height) the keypoints were detected at
+        margin: Padding on each side, as a fraction of the keypoint extent
+
+    Returns:
+        [x0, y0, x1, y1] in image coordinates, or None with fewer than 2 keypoints
+    """
+    points = np.asarray(keypoints.get("pose_keypoints_2d", []), dtype=np.float32).reshape(-1, 2)
+    points = points[(points[:, 0] > 0) | (points[:, 1] > 0)]
+    if len(points) < 2:
+        return None
+    points = points * np.array([image_size[0] / keypoint_size[0], image_size[1] / keypoint_size[1]],
+                               dtype=np.float32)
+    (x0, y0), (x1, y1) = points.min(axis=0), points.max(axis=0)
+    pad_x, pad_y = (x1 - x0) * margin, (y1 - y0) * margin
+    return [
+        float(max(0, x0 - pad_x)),
+        float(max(0, y0 - pad_y)),
+        float(min(image_size[0], x1 + pad_x)),
+        float(min(image_size[1], y1 + pad_y)),
+    ]
@@ -10,6 +10,8 @@ from PIL import Image
 import torch
 import logging
 
+from app.ai.preprocess.densepose_render import keypoint_person_box, render_parts
+
 try:
     # Import from installed DensePose package
     from densepose import add_densepose_config
@@ -17,6 +19,8 @@ try:
     from detectron2.config import get_cfg
     from detectron2.engine import DefaultPredictor
     from detectron2.data.detection_utils import convert_PIL_to_numpy, _apply_exif_orientation
+    import detectron2.data.transforms as T
+    from detectron2.structures import Boxes, Instances
     DENSEPOSE_AVAILABLE = True
 except ImportError:
     DENSEPOSE_AVAILABLE = False
@@ -24,11 +28,16 @@ except ImportError:
 
 logger = logging.getLogger(__name__)
 
-
 class DensePoseProcessor:
     """Process human images to generate DensePose representations"""
     
-    def __init__(self, device='cuda'):
+    def __init__(self, device='cuda', roi_min_size=512):
+        """
+        Args:
+            device: Device to run on (MPS falls back to cpu)
+            roi_min_size: INPUT.MIN_SIZE_TEST used when the person box comes from keypoints
+        """
+        self.roi_min_size = roi_min_size
         self.device = device if torch.cuda.is_available() else 'cpu'
         if self.device == 'cuda' and torch.backends.mps.is_available():
             self.device = 'cpu'  # DensePose doesn't support MPS yet
@@ -54,6 +63,7 @@ class DensePoseProcessor:
         
         self.predictor = None
         self.extractor = None
+        self.roi_aug = None
         
         if DENSEPOSE_AVAILABLE:
             self._setup_predictor()
@@ -81,6 +91,10 @@ class DensePoseProcessor:
             
             # Create predictor
             self.predictor = DefaultPredictor(cfg)
+            self.extractor = DensePoseResultExtractor()
+            # Smaller test resize for keypoint-guided ROI inference: the person
+            # box is known, so the image does not need RPN-friendly resolution
+            self.roi_aug = T.ResizeShortestEdge([self.roi_min_size, self.roi_min_size], cfg.INPUT.MAX_SIZE_TEST)
             
             # We'll handle extraction directly in process_image
             
@@ -95,12 +109,51 @@ class DensePoseProcessor:
         """Check if DensePose is available and initialized"""
         return DENSEPOSE_AVAILABLE and self.predictor is not None
     
-    def process_image(self, pil_image):
+    def _predict_in_box(self, img_array, person_box):
+        """Run DensePose on a known person box, skipping the RPN and box head."""
+        original_image = img_array
+        if self.predictor.input_format == "RGB":
+            # Same channel handling as DefaultPredictor
+            original_image = original_image[:, :, ::-1]
+        height, width = original_image.shape[:2]
+        transform = self.roi_aug.get_transform(original_image)
+        image = transform.apply_image(original_image)
+        image = torch.as_tensor(image.astype("float32").transpose(2, 0, 1))
+        box = transform.apply_box(np.array([person_box], dtype=np.float32))
+
+        model_device = next(self.predictor.model.parameters()).device
+        detected = Instances(tuple(image.shape[1:]))
+        detected.pred_boxes = Boxes(torch.as_tensor(box, device=model_device))
+        detected.scores = torch.ones(1, device=model_device)
+        detected.pred_classes = torch.zeros(1, dtype=torch.int64, device=model_device)
+        with torch.no_grad():
+            outputs = self.predictor.model.inference(
+                [{"image": image, "height": height, "width": width}],
+                detected_instances=[detected],
+            )
+        return outputs[0]["instances"]
+
+    def _first_person_labels(self, instances):
+        """Part labels and xyxy box of the first detected person, or None."""
+        densepose_result = instances.pred_densepose[0]
+        box = instances.pred_boxes.tensor[0].cpu().numpy()
+        if hasattr(densepose_result, 'labels'):
+            return densepose_result.labels.cpu().numpy(), box
+        # Chart predictor outputs carry coarse/fine segmentation; convert them
+        results, _ = self.extractor(instances[:1])
+        if not results:
+            return None
+        return results[0].labels.cpu().numpy(), box
+
+    def process_image(self, pil_image, keypoints=None):
         """
         Process PIL image to generate DensePose representation
         
         Args:
             pil_image: PIL Image to process
+            keypoints: Optional OpenPose keypoints (384x512 coordinates). When
+                given, the person box is taken from them and only the DensePose
+                head runs on it, at the smaller ROI input size
             
         Returns:
             PIL Image: DensePose visualization
@@ -114,64 +167,24 @@ class DensePoseProcessor:
             img_array = np.array(pil_image)
             
             # Run DensePose prediction
-            outputs = self.predictor(img_array)
-            
-            # For virtual try-on, we need the segmentation map
-            # Create a simple visualization showing detected body parts
-            instances = outputs["instances"]
+            person_box = keypoint_person_box(keypoints, pil_image.size) if keypoints else None
+            if person_box is not None:
+                instances = self._predict_in_box(img_array, person_box)
+            else:
+                instances = self.predictor(img_array)["instances"]
             
-            if len(instances) > 0:
-                # Get the DensePose output
-                if hasattr(instances, 'pred_densepose'):
-                    # Create segmentation visualization
-                    vis_img = img_array.copy()
-                    
-                    # Extract DensePose results for the first detected person
-                    densepose_result = instances.pred_densepose[0]
-                    
-                    # Create a simple visualization
-                    # DensePose outputs I (part labels) and UV (coordinates)
-                    if hasattr(densepose_result, 'labels'):
-                        # Get the body part labels
-                        labels = densepose_result.labels.cpu().numpy()
-                        
-                        # Create a colored segmentation map
-                        h, w = labels.shape
-                        colored_seg = np.zeros((h, w, 3), dtype=np.uint8)
-                        
-                        # Color map for different body parts
-                        colors = {
-                            0: [0, 0, 0],        # Background
-                            1: [255, 0, 0],      # Torso
-                            2: [0, 255, 0],      # Right hand
-                            3: [0, 0, 255],      # Left hand
-                            4: [255, 255, 0],    # Left foot
-                            5: [255, 0, 255],    # Right foot
-                            6: [0, 255, 255],    # Upper leg right
-                            7: [128, 0, 0],      # Upper leg left
-                            8: [0, 128, 0],      # Lower leg right
-                            9: [0, 0, 128],      # Lower leg left
-                            10: [128, 128, 0],   # Upper arm left
-                            11: [128, 0, 128],   # Upper arm right
-                            12: [0, 128, 128],   # Lower arm left
-                            13: [64, 0, 0],      # Lower arm right
-                            14: [0, 64, 0],      # Head
-                        }
-                        
-                        # Apply colors
-                        for part_id, color in colors.items():
-                            colored_seg[labels == part_id] = color
-                        
-                        # Blend with original image
-                        alpha = 0.6
-                        vis_img = (alpha * vis_img + (1 - alpha) * colored_seg).astype(np.uint8)
-                    
-                    # Convert back to PIL
-                    pose_img = Image.fromarray(vis_img)
+            if len(instances) > 0 and instances.has('pred_densepose'):
+                person = self._first_person_labels(instances)
+                if person is not None:
+                    labels, box = person
+                    pose_img = Image.fromarray(render_parts(img_array, labels, box))
                 else:
-                    # No DensePose output, return original
                     logger.warning("No DensePose predictions found")
                     pose_img = pil_image
+            elif len(instances) > 0:
+                # No DensePose output, return original
+                logger.warning("No DensePose predictions found")
+                pose_img = pil_image
             else:
                 # No people detected
                 logger.warning("No people detected in image")
@@ -0,0 +1,148 @@
+"""
+Small dependency-graph executor for the try-on preprocessing stages.
+
+OpenPose, human parsing and DensePose only share the input image, and their
+models spend most of their time inside ONNX Runtime / torch kernels that
+release the GIL, so running them on a thread pool brings the wall time down
+to roughly the slowest stage.
+
+    executor = PreprocessExecutor()
+    graph = executor.graph()
+    graph.add("openpose", openpose_model, pose_input)
+    graph.add("parsing", parsing_model, pose_input)
+    graph.add("mask", make_mask, deps=["openpose", "parsing"])
+    run = graph.run()
+    mask = run.result("mask")
+"""
+
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class StageTiming:
+    start: float
+    end: float
+    # Longest chain of stage durations ending with this stage
+    critical_path: float
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+
+@dataclass
+class _Stage:
+    name: str
+    fn: Callable
+    args: tuple
+    kwargs: dict
+    deps: List[str]
+
+
+@dataclass
+class PreprocessRun:
+    """Results, errors and timings of one graph run."""
+    results: Dict[str, Any] = field(default_factory=dict)
+    errors: Dict[str, BaseException] = field(default_factory=dict)
+    timings: Dict[str, StageTiming] = field(default_factory=dict)
+    wall_time: float = 0.0
+
+    def result(self, name: str):
+        """Return a stage's result, re-raising the exception if it failed."""
+        if name in self.errors:
+            raise self.errors[name]
+        return self.results[name]
+
+    def summary(self) -> str:
+        stages = ", ".join(
+            f"{name} {timing.duration * 1000:.0f}ms (critical path {timing.critical_path * 1000:.0f}ms)"
+            for name, timing in self.timings.items()
+        )
+        return f"preprocessing {self.wall_time * 1000:.0f}ms: {stages}"
+
+
+class PreprocessGraph:
+    """Stages of one preprocessing request, run by `PreprocessExecutor`."""
+
+    def __init__(self, pool: Optional[ThreadPoolExecutor]):
+        self._pool = pool
+        self._stages: Dict[str, _Stage] = {}
+
+    def add(self, name: str, fn: Callable, *args, deps: Sequence[str] = (), **kwargs) -> "PreprocessGraph":
+        """Add a stage. Results of `deps` are passed to `fn` after `args`, in order."""
+        if name in self._stages:
+            raise ValueError(f"Duplicate preprocessing stage: {name}")
+        missing = [dep for dep in deps if dep not in self._stages]
+        if missing:
+            raise ValueError(f"Stage {name} depends on unknown stages: {missing}")
+        self._stages[name] = _Stage(name, fn, args, kwargs, list(deps))
+        return self
+
+    def _call(self, stage: _Stage, run: PreprocessRun, origin: float):
+        start = time.perf_counter() - origin
+        try:
+            dep_results = [run.result(dep) for dep in stage.deps]
+            return stage.fn(*stage.args, *dep_results, **stage.kwargs)
+        finally:
+            end = time.perf_counter() - origin
+            deps_path = max((run.timings[dep].critical_path for dep in stage.deps), default=0.0)
+            run.timings[stage.name] = StageTiming(start, end, deps_path + (end - start))
+
+    def run(self) -> PreprocessRun:
+        """Run every stage once its dependencies are done.
+
+        A failing stage does not abort the others; its exception is stored and
+        re-raised by `PreprocessRun.result` (dependents fail with the same error).
+        """
+        run = PreprocessRun()
+        origin = time.perf_counter()
+        pending = dict(self._stages)
+
+        if self._pool is None:
+            # Stages were added in dependency order
+            for stage in pending.values():
+                try:
+                    run.results[stage.name] = self._call(stage, run, origin)
+                except Exception as e:
+                    run.errors[stage.name] = e
+            run.wall_time = time.perf_counter() - origin
+            return run
+
+        running = {}
+        while pending or running:
+            done_names = set(run.results) | set(run.errors)
+            for name in [n for n, s in pending.items() if all(dep in done_names for dep in s.deps)]:
+                stage = pending.pop(name)
+                running[self._pool.submit(self._call, stage, run, origin)] = name
+            finished, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                try:
+                    run.results[name] = future.result()
+                except Exception as e:
+                    run.errors[name] = e
+
+        run.wall_time = time.perf_counter() - origin
+        return run
+
+
+class PreprocessExecutor:
+    """Thread pool shared by the preprocessing graphs of every request."""
+
+    def __init__(self, max_workers: int = 3):
+        self.max_workers = max_workers
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="preprocess") \
+            if max_workers > 1 else None
+
+    def graph(self) -> PreprocessGraph:
+        return PreprocessGraph(self._pool)
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
@@ -5,13 +5,14 @@ import sys
 PROJECT_ROOT = Path(__file__).absolute().parents[0].absolute()
 sys.path.insert(0, str(PROJECT_ROOT))
 import os
+from functools import lru_cache
 import torch
 import numpy as np
 import cv2
 import torchvision.transforms as transforms
 from torch.utils.data import DataLoader
 from datasets.simple_extractor_dataset import SimpleFolderDataset
-from utils.transforms import transform_logits
+from utils.transforms import transform_logits, get_affine_transform
 from tqdm import tqdm
 from PIL import Image
 
@@ -118,6 +119,39 @@ def refine_hole(parsing_result_filled, parsing_result, arm_mask):
             cv2.drawContours(refine_hole_mask, contours, i, color=255, thickness=-1)
     return refine_hole_mask + arm_mask
 
+def refine_atr_parsing(parsing_result):
+    """Hole-fill the upper clothes of an ATR parse map, keeping arms and real holes."""
+    parsing_result = np.pad(parsing_result, pad_width=1, mode='constant', constant_values=0)
+    # try holefilling the clothes part
+    arm_mask = (parsing_result == 14).astype(np.float32) \
+               + (parsing_result == 15).astype(np.float32)
+    upper_cloth_mask = (parsing_result == 4).astype(np.float32) + arm_mask
+    img = np.where(upper_cloth_mask, 255, 0)
+    dst = hole_fill(img.astype(np.uint8))
+    parsing_result_filled = dst / 255 * 4
+    parsing_result_woarm = np.where(parsing_result_filled == 4, parsing_result_filled, parsing_result)
+    # add back arm and refined hole between arm and cloth
+    refine_hole_mask = refine_hole(parsing_result_filled.astype(np.uint8), parsing_result.astype(np.uint8),
+                                   arm_mask.astype(np.uint8))
+    parsing_result = np.where(refine_hole_mask, parsing_result, parsing_result_woarm)
+    # remove padding
+    return parsing_result[1:-1, 1:-1]
+
+
+def fuse_neck(parsing_result, parsing_result_lip):
+    """Add the LIP neck label to the ATR parse map and build the palette image."""
+    # add neck parsing result
+    neck_mask = np.logical_and(np.logical_not((parsing_result_lip == 13).astype(np.float32)),
+                               (parsing_result == 11).astype(np.float32))
+    parsing_result = np.where(neck_mask, 18, parsing_result)
+    palette = get_palette(19)
+    output_img = Image.fromarray(np.asarray(parsing_result, dtype=np.uint8))
+    output_img.putpalette(palette)
+    face_mask = torch.from_numpy((parsing_result == 11).astype(np.float32))
+
+    return output_img, face_mask
+
+
 def onnx_inference(session, lip_session, input_dir):
     transform = transforms.Compose([
         transforms.ToTensor(),
@@ -139,21 +173,7 @@ def onnx_inference(session, lip_session, input_dir):
             upsample_output = upsample_output.permute(1, 2, 0)  # CHW -> HWC
             logits_result = transform_logits(upsample_output.data.cpu().numpy(), c, s, w, h, input_size=[512, 512])
             parsing_result = np.argmax(logits_result, axis=2)
-            parsing_result = np.pad(parsing_result, pad_width=1, mode='constant', constant_values=0)
-            # try holefilling the clothes part
-            arm_mask = (parsing_result == 14).astype(np.float32) \
-                       + (parsing_result == 15).astype(np.float32)
-            upper_cloth_mask = (parsing_result == 4).astype(np.float32) + arm_mask
-            img = np.where(upper_cloth_mask, 255, 0)
-            dst = hole_fill(img.astype(np.uint8))
-            parsing_result_filled = dst / 255 * 4
-            parsing_result_woarm = np.where(parsing_result_filled == 4, parsing_result_filled, parsing_result)
-            # add back arm and refined hole between arm and cloth
-            refine_hole_mask = refine_hole(parsing_result_filled.astype(np.uint8), parsing_result.astype(np.uint8),
-                                           arm_mask.astype(np.uint8))
-            parsing_result = np.where(refine_hole_mask, parsing_result, parsing_result_woarm)
-            # remove padding
-            parsing_result = parsing_result[1:-1, 1:-1]
+            parsing_result = refine_atr_parsing(parsing_result)
 
         dataset_lip = SimpleFolderDataset(root=input_dir, input_size=[473, 473], transform=transform)
         dataloader_lip = DataLoader(dataset_lip)
@@ -173,16 +193,161 @@ def onnx_inference(session, lip_session, input_dir):
                 logits_result_lip = transform_logits(upsample_output_lip.data.cpu().numpy(), c, s, w, h,
                                                      input_size=[473, 473])
                 parsing_result_lip = np.argmax(logits_result_lip, axis=2)
-    # add neck parsing result
-    neck_mask = np.logical_and(np.logical_not((parsing_result_lip == 13).astype(np.float32)),
-                               (parsing_result == 11).astype(np.float32))
-    parsing_result = np.where(neck_mask, 18, parsing_result)
-    palette = get_palette(19)
-    output_img = Image.fromarray(np.asarray(parsing_result, dtype=np.uint8))
-    output_img.putpalette(palette)
-    face_mask = torch.from_numpy((parsing_result == 11).astype(np.float32))
+    return fuse_neck(parsing_result, parsing_result_lip)
+
+
+# ---------------------------------------------------------------------------
+# Lean single-image path: same numerics as onnx_inference, without the
+# Dataset/DataLoader/tqdm machinery, torch round-trips or per-call modules.
+# ---------------------------------------------------------------------------
+
+ATR_INPUT_SIZE = (512, 512)
+LIP_INPUT_SIZE = (473, 473)
+_MEAN = np.array([0.406, 0.456, 0.485], dtype=np.float32).reshape(3, 1, 1)
+_STD = np.array([0.225, 0.224, 0.229], dtype=np.float32).reshape(3, 1, 1)
+# cv2.warpAffine takes a different interpolation path for 2 and for more
+# than 4 channels, so logits are warped in groups of 4 (or 3/1 for the
+# remainder) to stay bit-identical with the per-channel transform_logits.
+_WARP_GROUP = 4
 
-    return output_img, face_mask
 
+def _center_scale(width, height, input_size):
+    """Person center and scale for the full-image box (SimpleFolderDataset._xywh2cs)."""
+    aspect_ratio = input_size[1] * 1.0 / input_size[0]
+    w, h = width - 1, height - 1
+    center = np.array([w * 0.5, h * 0.5], dtype=np.float32)
+    if w > aspect_ratio * h:
+        h = w * 1.0 / aspect_ratio
+    elif w < aspect_ratio * h:
+        w = h * aspect_ratio
+    return center, np.array([w, h], dtype=np.float32)
 
 
+@lru_cache(maxsize=8)
+def _align_corners_taps(in_size, out_size):
+    """Source indices and weights of torch's bilinear upsample with align_corners=True."""
+    scale = np.float32(in_size - 1) / np.float32(out_size - 1) if out_size > 1 else np.float32(0)
+    real = scale * np.arange(out_size, dtype=np.float32)
+    i0 = np.minimum(real.astype(np.int64), in_size - 1)
+    i1 = i0 + (i0 < in_size - 1)
+    l1 = np.clip(real - i0.astype(np.float32), 0, 1).astype(np.float32)
+    l0 = np.float32(1) - l1
+    return i0, i1, l0, l1
+
+
+def upsample_logits(logits, out_size):
+    """Bilinearly upsample CHW logits to HWC at `out_size` (align_corners=True)."""
+    hwc = logits.transpose(1, 2, 0)
+    y0, y1, ly0, ly1 = _align_corners_taps(hwc.shape[0], out_size[0])
+    x0, x1, lx0, lx1 = _align_corners_taps(hwc.shape[1], out_size[1])
+    lx0, lx1 = lx0[None, :, None], lx1[None, :, None]
+    top, bottom = hwc[y0], hwc[y1]
+    top = top[:, x0] * lx0 + top[:, x1] * lx1
+    bottom = bottom[:, x0] * lx0 + bottom[:, x1] * lx1
+    return top * ly0[:, None, None] + bottom * ly1[:, None, None]
+
+
+def warp_logits(logits, center, scale, width, height, input_size, out=None):
+    """Multi-channel transform_logits: warp HWC logits back to the image frame."""
+    trans = get_affine_transform(center, scale, 0, input_size, inv=1)
+    channels = logits.shape[2]
+    if out is None:
+        out = np.empty((int(height), int(width), channels), dtype=np.float32)
+    start = 0
+    while start < channels:
+        count = min(_WARP_GROUP, channels - start)
+        if count == 2:
+            count = 1
+        group = np.ascontiguousarray(logits[:, :, start:start + count])
+        out[:, :, start:start + count] = cv2.warpAffine(
+            group,
+            trans,
+            (int(width), int(height)),
+            flags=cv2.INTER_LINEAR,
+            borderMode=cv2.BORDER_CONSTANT,
+            borderValue=(0)).reshape(int(height), int(width), -1)
+        start += count
+    return out
+
+
+def to_bgr(input_image):
+    """Contiguous BGR uint8 array of a PIL image, as SimpleFolderDataset reads it."""
+    return np.ascontiguousarray(np.asarray(input_image.convert("RGB"))[:, :, ::-1])
+
+
+def _normalize_into(bgr, input_size, chw):
+    """Affine-crop a BGR image to `input_size` and normalize it into `chw` in place."""
+    h, w, _ = bgr.shape
+    center, scale = _center_scale(w, h, input_size)
+    trans = get_affine_transform(center, scale, 0, np.asarray(input_size))
+    warped = cv2.warpAffine(
+        bgr,
+        trans,
+        (int(input_size[1]), int(input_size[0])),
+        flags=cv2.INTER_LINEAR,
+        borderMode=cv2.BORDER_CONSTANT,
+        borderValue=(0, 0, 0))
+    np.divide(warped.transpose(2, 0, 1), np.float32(255), out=chw, dtype=np.float32)
+    np.subtract(chw, _MEAN, out=chw)
+    np.divide(chw, _STD, out=chw)
+    return center, scale
+
+
+def preprocess_image(bgr, input_size, buffers=None):
+    """Affine-crop and normalize a BGR image into a reusable NCHW float32 buffer."""
+    key = tuple(input_size)
+    if buffers is None:
+        buffers = {}
+    if key not in buffers:
+        buffers[key] = np.empty((1, 3, input_size[0], input_size[1]), dtype=np.float32)
+    batch = buffers[key]
+    center, scale = _normalize_into(bgr, input_size, batch[0])
+    return batch, center, scale
+
+
+def _postprocess(logits, center, scale, width, height, input_size):
+    logits = upsample_logits(logits, input_size)
+    logits = warp_logits(logits, center, scale, width, height, input_size)
+    return np.argmax(logits, axis=2)
+
+
+def run_parsing_session(session, bgr, input_size, buffers=None):
+    """Run one parsing model on a BGR image and return its parse map in image space."""
+    h, w, _ = bgr.shape
+    batch, center, scale = preprocess_image(bgr, input_size, buffers)
+    output = session.run(None, {"input.1": batch})
+    return _postprocess(output[1][0], center, scale, w, h, input_size)
+
+
+def run_parsing_batch(session, bgrs, input_size):
+    """Run one parsing model on several BGR images through the ONNX batch axis.
+
+    Models exported with a fixed batch size of 1 fall back to one run per image.
+    """
+    batch_dim = session.get_inputs()[0].shape[0]
+    if isinstance(batch_dim, int) and batch_dim == 1:
+        return [run_parsing_session(session, bgr, input_size) for bgr in bgrs]
+
+    batch = np.empty((len(bgrs), 3, input_size[0], input_size[1]), dtype=np.float32)
+    metas = [_normalize_into(bgr, input_size, batch[i]) for i, bgr in enumerate(bgrs)]
+    output = session.run(None, {"input.1": batch})
+    return [_postprocess(output[1][i], center, scale, bgr.shape[1], bgr.shape[0], input_size)
+            for i, (bgr, (center, scale)) in enumerate(zip(bgrs, metas))]
+
+
+def numpy_inference(session, lip_session, input_image, buffers=None):
+    """Lean equivalent of onnx_inference for a single PIL image.
+
+    Args:
+        session: ATR parsing ONNX session
+        lip_session: LIP parsing ONNX session
+        input_image: PIL image of the person
+        buffers: Optional dict of reusable preprocessing buffers keyed by input size
+
+    Returns:
+        Tuple of (palette parse image, face mask tensor)
+    """
+    bgr = to_bgr(input_image)
+    parsing_result = refine_atr_parsing(run_parsing_session(session, bgr, ATR_INPUT_SIZE, buffers))
+    parsing_result_lip = run_parsing_session(lip_session, bgr, LIP_INPUT_SIZE, buffers)
+    return fuse_neck(parsing_result, parsing_result_lip)
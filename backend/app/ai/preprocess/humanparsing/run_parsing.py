@@ -2,37 +2,77 @@ import pdb
 from pathlib import Path
 import sys
 import os
-import onnxruntime as ort
+import threading
+from concurrent.futures import ThreadPoolExecutor
 PROJECT_ROOT = Path(__file__).absolute().parents[0].absolute()
 sys.path.insert(0, str(PROJECT_ROOT))
-from parsing_api import onnx_inference
+from parsing_api import (numpy_inference, run_parsing_session, run_parsing_batch, refine_atr_parsing,
+                         fuse_neck, to_bgr, ATR_INPUT_SIZE, LIP_INPUT_SIZE)
+from app.ai.preprocess.ort_session import create_session
 import torch
 
 
 class Parsing:
-    def __init__(self, gpu_id: int):
+    def __init__(self, gpu_id: int, num_threads: int = 0, concurrent: bool = True, cache_dir: str = None):
+        """
+        Args:
+            gpu_id: GPU index passed to the sessions
+            num_threads: Total intra-op thread budget (0 = all cores)
+            concurrent: Run the ATR and LIP models at the same time, each with
+                half of the thread budget
+            cache_dir: Folder for optimized ONNX graphs (None disables caching)
+        """
         self.gpu_id = gpu_id
         # Don't set CUDA device on non-CUDA systems
         if torch.cuda.is_available():
             torch.cuda.set_device(gpu_id)
-        session_options = ort.SessionOptions()
-        session_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
-        session_options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
-        session_options.add_session_config_entry('gpu_id', str(gpu_id))
         # Try external drive first, then local path
         external_path = Path('/Volumes/4TB-Z/AI-Models/virtual-closet/idm-vton/model_weights/humanparsing')
         local_path = Path(__file__).absolute().parents[2].absolute() / 'ckpt/humanparsing'
         
         atr_path = external_path / 'parsing_atr.onnx' if (external_path / 'parsing_atr.onnx').exists() else local_path / 'parsing_atr.onnx'
         lip_path = external_path / 'parsing_lip.onnx' if (external_path / 'parsing_lip.onnx').exists() else local_path / 'parsing_lip.onnx'
-        
-        self.session = ort.InferenceSession(str(atr_path),
-                                            sess_options=session_options, providers=['CPUExecutionProvider'])
-        self.lip_session = ort.InferenceSession(str(lip_path),
-                                                sess_options=session_options, providers=['CPUExecutionProvider'])
-        
+
+        total_threads = num_threads or os.cpu_count() or 1
+        self.concurrent = concurrent
+        session_threads = max(1, total_threads // 2) if concurrent else total_threads
+        self.session = create_session(atr_path, gpu_id, session_threads, cache_dir)
+        self.lip_session = create_session(lip_path, gpu_id, session_threads, cache_dir)
+        self.executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="parsing") if concurrent else None
+        # Preprocessing buffers reused across calls, keyed by network input size
+        self.buffers = {}
+        self._buffers_lock = threading.Lock()
 
     def __call__(self, input_image):
         # torch.cuda.set_device(self.gpu_id)
-        parsed_image, face_mask = onnx_inference(self.session, self.lip_session, input_image)
+        with self._buffers_lock:
+            return self._parse(input_image)
+
+    def _parse(self, input_image):
+        if self.executor is None:
+            parsed_image, face_mask = numpy_inference(self.session, self.lip_session, input_image, self.buffers)
+            return parsed_image, face_mask
+
+        # ATR and LIP are independent until the neck fusion; ORT releases the
+        # GIL, so both sessions run side by side on their half of the threads
+        bgr = to_bgr(input_image)
+        atr_future = self.executor.submit(run_parsing_session, self.session, bgr, ATR_INPUT_SIZE, self.buffers)
+        lip_future = self.executor.submit(run_parsing_session, self.lip_session, bgr, LIP_INPUT_SIZE, self.buffers)
+        parsed_image, face_mask = fuse_neck(refine_atr_parsing(atr_future.result()), lip_future.result())
         return parsed_image, face_mask
+
+    def batch(self, input_images):
+        """Parse several person images, batching them on the ONNX batch axis.
+
+        Returns:
+            List of (palette parse image, face mask tensor) tuples
+        """
+        bgrs = [to_bgr(image) for image in input_images]
+        if self.executor is None:
+            atr_results = run_parsing_batch(self.session, bgrs, ATR_INPUT_SIZE)
+            lip_results = run_parsing_batch(self.lip_session, bgrs, LIP_INPUT_SIZE)
+        else:
+            atr_future = self.executor.submit(run_parsing_batch, self.session, bgrs, ATR_INPUT_SIZE)
+            lip_future = self.executor.submit(run_parsing_batch, self.lip_session, bgrs, LIP_INPUT_SIZE)
+            atr_results, lip_results = atr_future.result(), lip_future.result()
+        return [fuse_neck(refine_atr_parsing(atr), lip) for atr, lip in zip(atr_results, lip_results)]
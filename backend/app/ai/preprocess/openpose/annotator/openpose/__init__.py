@@ -12,7 +12,7 @@ os.environ["KMP_DUPLICATE_LIB_OK"] = "TRUE"
 import torch
 import numpy as np
 from . import util
-from .body import Body
+from .body import Body, OnnxBody
 from .hand import Hand
 from .face import Face
 from pathlib import Path
@@ -47,8 +47,30 @@ def draw_pose(pose, H, W, draw_body=True, draw_hand=True, draw_face=True):
     return canvas
 
 
+BODY_BACKENDS = ("torch", "onnx")
+
+
 class OpenposeDetector:
-    def __init__(self):
+    def __init__(self, backend="torch", num_threads=0, cache_dir=None):
+        """
+        Args:
+            backend: "torch" runs the body network eagerly, "onnx" runs the
+                exported body_pose_model.onnx on ONNX Runtime
+            num_threads: Intra-op thread budget for the ONNX session (0 = all cores)
+            cache_dir: Folder for optimized ONNX graphs (None disables caching)
+        """
+        if backend not in BODY_BACKENDS:
+            raise ValueError(f"Unknown OpenPose backend: {backend}. Choose from: {list(BODY_BACKENDS)}")
+        self.backend = backend
+        if backend == "onnx":
+            onnx_modelpath = os.path.join(annotator_ckpts_path, "body_pose_model.onnx")
+            if not os.path.exists(onnx_modelpath):
+                raise FileNotFoundError(
+                    f"ONNX body pose model not found at {onnx_modelpath}. "
+                    f"Export it with scripts/export_openpose_onnx.py")
+            self.body_estimation = OnnxBody(onnx_modelpath, num_threads=num_threads, cache_dir=cache_dir)
+            return
+
         body_modelpath = os.path.join(annotator_ckpts_path, "body_pose_model.pth")
         # hand_modelpath = os.path.join(annotator_ckpts_path, "hand_pose_model.pth")
         # face_modelpath = os.path.join(annotator_ckpts_path, "facenet.pth")
@@ -5,7 +5,6 @@ PROJECT_ROOT = Path(__file__).absolute().parents[3].absolute()
 
 import cv2
 import numpy as np
-import math
 import time
 from scipy.ndimage.filters import gaussian_filter
 import matplotlib.pyplot as plt
@@ -42,13 +41,30 @@ class Body(object):
 
 
     def __call__(self, oriImg):
+        heatmap_avg, paf_avg = self.forward(oriImg)
+        return postprocess(heatmap_avg, paf_avg, oriImg.shape[0])
+
+    def run_network(self, im):
+        """Run the body network on a normalized NCHW float32 batch.
+
+        Returns:
+            (PAF, heatmap) stage-6 outputs as NumPy arrays
+        """
+        data = torch.from_numpy(im).float()
+        # Move data to the same device as the model
+        data = data.to(self.device)
+        # data = data.permute([2, 0, 1]).unsqueeze(0).float()
+        with torch.no_grad():
+            Mconv7_stage6_L1, Mconv7_stage6_L2 = self.model(data)
+        return Mconv7_stage6_L1.cpu().numpy(), Mconv7_stage6_L2.cpu().numpy()
+
+    def forward(self, oriImg):
+        """Run the network and return the (heatmap, PAF) maps at image resolution."""
         # scale_search = [0.5, 1.0, 1.5, 2.0]
         scale_search = [0.5]
         boxsize = 368
         stride = 8
         padValue = 128
-        thre1 = 0.1
-        thre2 = 0.05
         multiplier = [x * boxsize / oriImg.shape[0] for x in scale_search]
         heatmap_avg = np.zeros((oriImg.shape[0], oriImg.shape[1], 19))
         paf_avg = np.zeros((oriImg.shape[0], oriImg.shape[1], 38))
@@ -60,15 +76,7 @@ class Body(object):
             im = np.transpose(np.float32(imageToTest_padded[:, :, :, np.newaxis]), (3, 2, 0, 1)) / 256 - 0.5
             im = np.ascontiguousarray(im)
 
-            data = torch.from_numpy(im).float()
-            # Move data to the same device as the model
-            data = data.to(self.device)
-            # data = data.permute([2, 0, 1]).unsqueeze(0).float()
-            with torch.no_grad():
-                Mconv7_stage6_L1, Mconv7_stage6_L2 = self.model(data)
-
-            Mconv7_stage6_L1 = Mconv7_stage6_L1.cpu().numpy()
-            Mconv7_stage6_L2 = Mconv7_stage6_L2.cpu().numpy()
+            Mconv7_stage6_L1, Mconv7_stage6_L2 = self.run_network(im)
 
             # extract outputs, resize, and remove padding
             # heatmap = np.transpose(np.squeeze(net.blobs[output_blobs.keys()[1]].data), (1, 2, 0))  # output 1 is heatmaps
@@ -86,149 +94,201 @@ class Body(object):
             heatmap_avg += heatmap_avg + heatmap / len(multiplier)
             paf_avg += + paf / len(multiplier)
 
-        all_peaks = []
-        peak_counter = 0
-
-        for part in range(18):
-            map_ori = heatmap_avg[:, :, part]
-            one_heatmap = gaussian_filter(map_ori, sigma=3)
-
-            map_left = np.zeros(one_heatmap.shape)
-            map_left[1:, :] = one_heatmap[:-1, :]
-            map_right = np.zeros(one_heatmap.shape)
-            map_right[:-1, :] = one_heatmap[1:, :]
-            map_up = np.zeros(one_heatmap.shape)
-            map_up[:, 1:] = one_heatmap[:, :-1]
-            map_down = np.zeros(one_heatmap.shape)
-            map_down[:, :-1] = one_heatmap[:, 1:]
-
-            peaks_binary = np.logical_and.reduce(
-                (one_heatmap >= map_left, one_heatmap >= map_right, one_heatmap >= map_up, one_heatmap >= map_down,
-                 one_heatmap > thre1))
-            peaks = list(zip(np.nonzero(peaks_binary)[1], np.nonzero(peaks_binary)[0]))  # note reverse
-            peaks_with_score = [x + (map_ori[x[1], x[0]],) for x in peaks]
-            peak_id = range(peak_counter, peak_counter + len(peaks))
-            peaks_with_score_and_id = [peaks_with_score[i] + (peak_id[i],) for i in range(len(peak_id))]
-
-            all_peaks.append(peaks_with_score_and_id)
-            peak_counter += len(peaks)
-
-        # find connection in the specified sequence, center 29 is in the position 15
-        limbSeq = [[2, 3], [2, 6], [3, 4], [4, 5], [6, 7], [7, 8], [2, 9], [9, 10], \
-                   [10, 11], [2, 12], [12, 13], [13, 14], [2, 1], [1, 15], [15, 17], \
-                   [1, 16], [16, 18], [3, 17], [6, 18]]
-        # the middle joints heatmap correpondence
-        mapIdx = [[31, 32], [39, 40], [33, 34], [35, 36], [41, 42], [43, 44], [19, 20], [21, 22], \
-                  [23, 24], [25, 26], [27, 28], [29, 30], [47, 48], [49, 50], [53, 54], [51, 52], \
-                  [55, 56], [37, 38], [45, 46]]
-
-        connection_all = []
-        special_k = []
-        mid_num = 10
-
-        for k in range(len(mapIdx)):
-            score_mid = paf_avg[:, :, [x - 19 for x in mapIdx[k]]]
-            candA = all_peaks[limbSeq[k][0] - 1]
-            candB = all_peaks[limbSeq[k][1] - 1]
-            nA = len(candA)
-            nB = len(candB)
-            indexA, indexB = limbSeq[k]
-            if (nA != 0 and nB != 0):
-                connection_candidate = []
-                for i in range(nA):
-                    for j in range(nB):
-                        vec = np.subtract(candB[j][:2], candA[i][:2])
-                        norm = math.sqrt(vec[0] * vec[0] + vec[1] * vec[1])
-                        norm = max(0.001, norm)
-                        vec = np.divide(vec, norm)
-
-                        startend = list(zip(np.linspace(candA[i][0], candB[j][0], num=mid_num), \
-                                            np.linspace(candA[i][1], candB[j][1], num=mid_num)))
-
-                        vec_x = np.array([score_mid[int(round(startend[I][1])), int(round(startend[I][0])), 0] \
-                                          for I in range(len(startend))])
-                        vec_y = np.array([score_mid[int(round(startend[I][1])), int(round(startend[I][0])), 1] \
-                                          for I in range(len(startend))])
-
-                        score_midpts = np.multiply(vec_x, vec[0]) + np.multiply(vec_y, vec[1])
-                        score_with_dist_prior = sum(score_midpts) / len(score_midpts) + min(
-                            0.5 * oriImg.shape[0] / norm - 1, 0)
-                        criterion1 = len(np.nonzero(score_midpts > thre2)[0]) > 0.8 * len(score_midpts)
-                        criterion2 = score_with_dist_prior > 0
-                        if criterion1 and criterion2:
-                            connection_candidate.append(
-                                [i, j, score_with_dist_prior, score_with_dist_prior + candA[i][2] + candB[j][2]])
-
-                connection_candidate = sorted(connection_candidate, key=lambda x: x[2], reverse=True)
-                connection = np.zeros((0, 5))
-                for c in range(len(connection_candidate)):
-                    i, j, s = connection_candidate[c][0:3]
-                    if (i not in connection[:, 3] and j not in connection[:, 4]):
-                        connection = np.vstack([connection, [candA[i][3], candB[j][3], s, i, j]])
-                        if (len(connection) >= min(nA, nB)):
-                            break
-
-                connection_all.append(connection)
-            else:
-                special_k.append(k)
-                connection_all.append([])
-
-        # last number in each row is the total parts number of that person
-        # the second last number in each row is the score of the overall configuration
-        subset = -1 * np.ones((0, 20))
-        candidate = np.array([item for sublist in all_peaks for item in sublist])
-
-        for k in range(len(mapIdx)):
-            if k not in special_k:
-                partAs = connection_all[k][:, 0]
-                partBs = connection_all[k][:, 1]
-                indexA, indexB = np.array(limbSeq[k]) - 1
-
-                for i in range(len(connection_all[k])):  # = 1:size(temp,1)
-                    found = 0
-                    subset_idx = [-1, -1]
-                    for j in range(len(subset)):  # 1:size(subset,1):
-                        if subset[j][indexA] == partAs[i] or subset[j][indexB] == partBs[i]:
-                            subset_idx[found] = j
-                            found += 1
-
-                    if found == 1:
-                        j = subset_idx[0]
-                        if subset[j][indexB] != partBs[i]:
-                            subset[j][indexB] = partBs[i]
-                            subset[j][-1] += 1
-                            subset[j][-2] += candidate[partBs[i].astype(int), 2] + connection_all[k][i][2]
-                    elif found == 2:  # if found 2 and disjoint, merge them
-                        j1, j2 = subset_idx
-                        membership = ((subset[j1] >= 0).astype(int) + (subset[j2] >= 0).astype(int))[:-2]
-                        if len(np.nonzero(membership == 2)[0]) == 0:  # merge
-                            subset[j1][:-2] += (subset[j2][:-2] + 1)
-                            subset[j1][-2:] += subset[j2][-2:]
-                            subset[j1][-2] += connection_all[k][i][2]
-                            subset = np.delete(subset, j2, 0)
-                        else:  # as like found == 1
-                            subset[j1][indexB] = partBs[i]
-                            subset[j1][-1] += 1
-                            subset[j1][-2] += candidate[partBs[i].astype(int), 2] + connection_all[k][i][2]
-
-                    # if find no partA in the subset, create a new subset
-                    elif not found and k < 17:
-                        row = -1 * np.ones(20)
-                        row[indexA] = partAs[i]
-                        row[indexB] = partBs[i]
-                        row[-1] = 2
-                        row[-2] = sum(candidate[connection_all[k][i, :2].astype(int), 2]) + connection_all[k][i][2]
-                        subset = np.vstack([subset, row])
-        # delete some rows of subset which has few parts occur
-        deleteIdx = []
-        for i in range(len(subset)):
-            if subset[i][-1] < 4 or subset[i][-2] / subset[i][-1] < 0.4:
-                deleteIdx.append(i)
-        subset = np.delete(subset, deleteIdx, axis=0)
-
-        # subset: n*20 array, 0-17 is the index in candidate, 18 is the total score, 19 is the total parts
-        # candidate: x, y, score, id
-        return candidate, subset
+        return heatmap_avg, paf_avg
+
+
+class OnnxBody(Body):
+    """Body estimator that runs the exported body network on ONNX Runtime.
+
+    Export the model with scripts/export_openpose_onnx.py; the graph has a
+    dynamic spatial size, so the padded input of any image size can be fed.
+    """
+
+    def __init__(self, onnx_path, num_threads=0, cache_dir=None):
+        from app.ai.preprocess.ort_session import create_session
+
+        self.device = 'cpu'
+        self.session = create_session(onnx_path, 0, num_threads, cache_dir)
+        self.input_name = self.session.get_inputs()[0].name
+
+    def run_network(self, im):
+        paf, heatmap = self.session.run(None, {self.input_name: im.astype(np.float32, copy=False)})
+        return paf, heatmap
+
+
+# find connection in the specified sequence, center 29 is in the position 15
+LIMB_SEQ = [[2, 3], [2, 6], [3, 4], [4, 5], [6, 7], [7, 8], [2, 9], [9, 10],
+            [10, 11], [2, 12], [12, 13], [13, 14], [2, 1], [1, 15], [15, 17],
+            [1, 16], [16, 18], [3, 17], [6, 18]]
+# the middle joints heatmap correpondence
+MAP_IDX = [[31, 32], [39, 40], [33, 34], [35, 36], [41, 42], [43, 44], [19, 20], [21, 22],
+           [23, 24], [25, 26], [27, 28], [29, 30], [47, 48], [49, 50], [53, 54], [51, 52],
+           [55, 56], [37, 38], [45, 46]]
+PEAK_THRESHOLD = 0.1
+PAF_THRESHOLD = 0.05
+MID_NUM = 10
+
+
+def find_peaks(heatmap_avg):
+    """Per-part peaks as arrays of (x, y, score, id) rows.
+
+    All 18 part maps are smoothed in one gaussian_filter call (sigma 0 on the
+    channel axis) and compared against their 4-neighbourhood at once.
+    """
+    maps = heatmap_avg[:, :, :18]
+    smoothed = gaussian_filter(maps, sigma=(3, 3, 0))
+
+    # a peak must be >= its up/down/left/right neighbours (zero outside the map)
+    peaks_binary = smoothed > PEAK_THRESHOLD
+    peaks_binary[1:, :] &= smoothed[1:, :] >= smoothed[:-1, :]
+    peaks_binary[:1, :] &= smoothed[:1, :] >= 0
+    peaks_binary[:-1, :] &= smoothed[:-1, :] >= smoothed[1:, :]
+    peaks_binary[-1:, :] &= smoothed[-1:, :] >= 0
+    peaks_binary[:, 1:] &= smoothed[:, 1:] >= smoothed[:, :-1]
+    peaks_binary[:, :1] &= smoothed[:, :1] >= 0
+    peaks_binary[:, :-1] &= smoothed[:, :-1] >= smoothed[:, 1:]
+    peaks_binary[:, -1:] &= smoothed[:, -1:] >= 0
+
+    # part-major, then row-major order, like np.nonzero on each part map
+    parts, ys, xs = np.nonzero(peaks_binary.transpose(2, 0, 1))
+    scores = maps[ys, xs, parts]
+    peaks = np.stack([xs, ys, scores, np.arange(len(xs))], axis=1).astype(np.float64)
+    bounds = np.searchsorted(parts, np.arange(19))
+    return [peaks[bounds[part]:bounds[part + 1]] for part in range(18)]
+
+
+def score_limb(candA, candB, score_mid, image_height):
+    """Score every candA x candB pair by sampling the PAF along the segment.
+
+    Returns the (i, j, score, total) candidates sorted by score, descending,
+    in the same order the pairwise loop produced.
+    """
+    nA, nB = len(candA), len(candB)
+    ax, ay = candA[:, 0][:, None], candA[:, 1][:, None]
+    bx, by = candB[:, 0][None, :], candB[:, 1][None, :]
+    dx, dy = bx - ax, by - ay
+    norm = np.maximum(np.sqrt(dx * dx + dy * dy), 0.001)
+    ux, uy = dx / norm, dy / norm
+
+    # np.linspace(a, b, MID_NUM) for every pair: start + t * step, end pinned
+    t = np.arange(MID_NUM, dtype=np.float64)
+    xs = ax[..., None] + t * (dx / (MID_NUM - 1))[..., None]
+    ys = ay[..., None] + t * (dy / (MID_NUM - 1))[..., None]
+    xs[..., -1] = np.broadcast_to(bx, (nA, nB))
+    ys[..., -1] = np.broadcast_to(by, (nA, nB))
+    xi = np.round(xs).astype(np.intp)
+    yi = np.round(ys).astype(np.intp)
+
+    score_midpts = score_mid[yi, xi, 0] * ux[..., None] + score_mid[yi, xi, 1] * uy[..., None]
+    # left-to-right sum, matching the builtin sum() of the loop version
+    total = score_midpts[..., 0].copy()
+    for step in range(1, MID_NUM):
+        total += score_midpts[..., step]
+    score_with_dist_prior = total / MID_NUM + np.minimum(0.5 * image_height / norm - 1, 0)
+    criterion1 = np.count_nonzero(score_midpts > PAF_THRESHOLD, axis=2) > 0.8 * MID_NUM
+    criterion2 = score_with_dist_prior > 0
+
+    i, j = np.nonzero(criterion1 & criterion2)
+    scores = score_with_dist_prior[i, j]
+    order = np.argsort(-scores, kind='stable')
+    i, j, scores = i[order], j[order], scores[order]
+    return i, j, scores
+
+
+def select_connections(candA, candB, i, j, scores):
+    """Greedily keep the best-scoring pairs that reuse no part."""
+    limit = min(len(candA), len(candB))
+    used_a, used_b = set(), set()
+    rows = []
+    for a, b, s in zip(i.tolist(), j.tolist(), scores.tolist()):
+        if a in used_a or b in used_b:
+            continue
+        used_a.add(a)
+        used_b.add(b)
+        rows.append([candA[a, 3], candB[b, 3], s, a, b])
+        if len(rows) >= limit:
+            break
+    return np.array(rows, dtype=np.float64).reshape(-1, 5)
+
+
+def assemble_subsets(candidate, connection_all, special_k):
+    """Group limb connections into people (same rules as the loop version)."""
+    subset = -1 * np.ones((0, 20))
+
+    for k in range(len(MAP_IDX)):
+        if k in special_k:
+            continue
+        connection = connection_all[k]
+        partAs = connection[:, 0]
+        partBs = connection[:, 1]
+        indexA, indexB = np.array(LIMB_SEQ[k]) - 1
+
+        for i in range(len(connection)):
+            subset_idx = np.nonzero((subset[:, indexA] == partAs[i]) | (subset[:, indexB] == partBs[i]))[0]
+            found = len(subset_idx)
+
+            if found == 1:
+                j = subset_idx[0]
+                if subset[j][indexB] != partBs[i]:
+                    subset[j][indexB] = partBs[i]
+                    subset[j][-1] += 1
+                    subset[j][-2] += candidate[partBs[i].astype(int), 2] + connection[i][2]
+            elif found == 2:  # if found 2 and disjoint, merge them
+                j1, j2 = subset_idx
+                membership = ((subset[j1] >= 0).astype(int) + (subset[j2] >= 0).astype(int))[:-2]
+                if len(np.nonzero(membership == 2)[0]) == 0:  # merge
+                    subset[j1][:-2] += (subset[j2][:-2] + 1)
+                    subset[j1][-2:] += subset[j2][-2:]
+                    subset[j1][-2] += connection[i][2]
+                    subset = np.delete(subset, j2, 0)
+                else:  # as like found == 1
+                    subset[j1][indexB] = partBs[i]
+                    subset[j1][-1] += 1
+                    subset[j1][-2] += candidate[partBs[i].astype(int), 2] + connection[i][2]
+
+            # if find no partA in the subset, create a new subset
+            elif not found and k < 17:
+                row = -1 * np.ones(20)
+                row[indexA] = partAs[i]
+                row[indexB] = partBs[i]
+                row[-1] = 2
+                row[-2] = sum(candidate[connection[i, :2].astype(int), 2]) + connection[i][2]
+                subset = np.vstack([subset, row])
+
+    # delete some rows of subset which has few parts occur
+    keep = ~((subset[:, -1] < 4) | (subset[:, -2] / subset[:, -1] < 0.4))
+    return subset[keep]
+
+
+def postprocess(heatmap_avg, paf_avg, image_height):
+    """Vectorized peak detection, PAF scoring and person assembly.
+
+    Produces the same candidate/subset arrays as the original loop implementation
+    (kept in scripts/benchmark_openpose_postprocess.py).
+
+    Returns:
+        candidate: x, y, score, id per detected part
+        subset: n*20 array, 0-17 is the index in candidate, 18 is the total score, 19 is the total parts
+    """
+    all_peaks = find_peaks(heatmap_avg)
+
+    connection_all = []
+    special_k = []
+    for k in range(len(MAP_IDX)):
+        score_mid = paf_avg[:, :, [x - 19 for x in MAP_IDX[k]]]
+        candA = all_peaks[LIMB_SEQ[k][0] - 1]
+        candB = all_peaks[LIMB_SEQ[k][1] - 1]
+        if len(candA) != 0 and len(candB) != 0:
+            i, j, scores = score_limb(candA, candB, score_mid, image_height)
+            connection_all.append(select_connections(candA, candB, i, j, scores))
+        else:
+            special_k.append(k)
+            connection_all.append([])
+
+    candidate = np.concatenate(all_peaks, axis=0)
+    if len(candidate) == 0:
+        candidate = np.array([])
+    return candidate, assemble_subsets(candidate, connection_all, special_k)
 
 
 # if __name__ == "__main__":
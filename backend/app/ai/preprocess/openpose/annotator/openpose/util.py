@@ -14,8 +14,11 @@ def smart_resize(x, s):
         Co = 1
     else:
         Ho, Wo, Co = x.shape
-    if Co == 3 or Co == 1:
-        k = float(Ht + Wt) / float(Ho + Wo)
+    k = float(Ht + Wt) / float(Ho + Wo)
+    # LANCZOS4 upscaling of a multi-channel map is bit-identical to resizing each
+    # channel on its own, so the 19/38-channel heatmaps and PAFs go in one call.
+    # INTER_AREA is not (and rejects more than 4 channels), so it stays per channel.
+    if Co == 3 or Co == 1 or k >= 1:
         return cv2.resize(x, (int(Wt), int(Ht)), interpolation=cv2.INTER_AREA if k < 1 else cv2.INTER_LANCZOS4)
     else:
         return np.stack([smart_resize(x[:, :, i], s) for i in range(Co)], axis=2)
@@ -28,8 +31,9 @@ def smart_resize_k(x, fx, fy):
     else:
         Ho, Wo, Co = x.shape
     Ht, Wt = Ho * fy, Wo * fx
-    if Co == 3 or Co == 1:
-        k = float(Ht + Wt) / float(Ho + Wo)
+    k = float(Ht + Wt) / float(Ho + Wo)
+    # See smart_resize: one call for LANCZOS4, per channel for INTER_AREA
+    if Co == 3 or Co == 1 or k >= 1:
         return cv2.resize(x, (int(Wt), int(Ht)), interpolation=cv2.INTER_AREA if k < 1 else cv2.INTER_LANCZOS4)
     else:
         return np.stack([smart_resize_k(x[:, :, i], fx, fy) for i in range(Co)], axis=2)
@@ -27,12 +27,12 @@ import pdb
 # os.environ['CUDA_VISIBLE_DEVICES'] = '0,1,2,3'
 
 class OpenPose:
-    def __init__(self, gpu_id: int):
+    def __init__(self, gpu_id: int, backend: str = "torch", num_threads: int = 0, cache_dir: str = None):
         self.gpu_id = gpu_id
         # Don't set CUDA device on non-CUDA systems
         if torch.cuda.is_available():
             torch.cuda.set_device(gpu_id)
-        self.preprocessor = OpenposeDetector()
+        self.preprocessor = OpenposeDetector(backend=backend, num_threads=num_threads, cache_dir=cache_dir)
 
     def __call__(self, input_image, resolution=384):
         # Don't set CUDA device on non-CUDA systems
@@ -0,0 +1,63 @@
+"""
+ONNX Runtime session helper shared by the preprocessing models
+(human parsing, OpenPose) so they all use the same session conventions.
+"""
+
+import hashlib
+import os
+import uuid
+from pathlib import Path
+
+import onnxruntime as ort
+
+
+def _cache_key(source_path: Path) -> str:
+    """Identity of a model file: resolved path, size, mtime and the ORT version that optimizes it."""
+    st = source_path.stat()
+    identity = f"{source_path.resolve()}|{st.st_size}|{st.st_mtime_ns}|{ort.__version__}"
+    return hashlib.sha256(identity.encode()).hexdigest()[:16]
+
+
+def create_session(model_path: Path, gpu_id: int, num_threads: int = 0, cache_dir: Path = None):
+    """Create an ONNX Runtime session with an explicit thread budget.
+
+    When `cache_dir` is set, the graph optimized at ORT_ENABLE_ALL is saved
+    there on first load and reused on later startups, so graph optimization
+    is not redone every time. The cached file is keyed by the source's
+    resolved path, size and mtime, so a replaced model is optimized again.
+    It is written to a temporary file and renamed into place, so a crash or
+    a concurrent startup never leaves a truncated graph under the cache name.
+    """
+    session_options = ort.SessionOptions()
+    session_options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    session_options.intra_op_num_threads = num_threads
+    session_options.inter_op_num_threads = 1
+    session_options.add_session_config_entry('gpu_id', str(gpu_id))
+    session_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+
+    source_path = Path(model_path)
+    cached_path = tmp_path = None
+    if cache_dir is not None:
+        cache_dir = Path(cache_dir)
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        cached_path = cache_dir / f"{source_path.stem}.{_cache_key(source_path)}.optimized.onnx"
+        if cached_path.exists():
+            # Already optimized; skip the optimizer passes
+            session_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+            source_path = cached_path
+        else:
+            # ORT writes the optimized graph while building the session; write it under a
+            # per-process name and move it into place only once the session is built
+            tmp_path = cached_path.with_name(f"{cached_path.name}.{uuid.uuid4().hex}.tmp")
+            session_options.optimized_model_filepath = str(tmp_path)
+
+    try:
+        session = ort.InferenceSession(str(source_path), sess_options=session_options,
+                                       providers=['CPUExecutionProvider'])
+    except Exception:
+        if tmp_path is not None and tmp_path.exists():
+            tmp_path.unlink()
+        raise
+    if tmp_path is not None and tmp_path.exists():
+        os.replace(tmp_path, cached_path)
+    return session
@@ -1,3 +1,5 @@
+import io
+
 import numpy as np
 import cv2
 from PIL import Image, ImageDraw
@@ -165,3 +167,209 @@ def get_mask_location(model_type, category, model_parse: Image.Image, keypoint:
     mask_gray = Image.fromarray(inpaint_mask.astype(np.uint8) * 127)
 
     return mask, mask_gray
+
+
+def normalize_mask(mask, size=(768, 1024), threshold=0, dilate=0, feather=0):
+    """Binary inpaint mask ("L", 0/255) from a user-supplied mask.
+
+    Args:
+        mask: PIL image, NumPy array (bool, grayscale or RGB) or encoded image bytes
+        size: Output (width, height); the mask is resized once, at any input resolution
+        threshold: Gray levels above this are masked
+        dilate: Grow the mask by this many pixels
+        feather: Gaussian sigma for a soft edge (the result is no longer binary)
+
+    Returns:
+        PIL Image: Mask in mode "L"
+    """
+    if isinstance(mask, (bytes, bytearray, memoryview)):
+        mask = Image.open(io.BytesIO(mask))
+    elif isinstance(mask, np.ndarray):
+        if mask.dtype == bool:
+            mask = mask.astype(np.uint8) * 255
+        mask = Image.fromarray(np.clip(mask, 0, 255).astype(np.uint8))
+
+    # RGB -> resize -> L, like the former mask path, so thresholds see the same gray levels
+    mask = mask.convert("RGB")
+    if size is not None and mask.size != tuple(size):
+        mask = mask.resize(size)
+    gray = np.asarray(mask.convert("L"))
+    binary = np.where(gray > threshold, 255, 0).astype(np.uint8)
+
+    if dilate > 0:
+        kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (2 * dilate + 1, 2 * dilate + 1))
+        binary = cv2.dilate(binary, kernel)
+    if feather > 0:
+        binary = cv2.GaussianBlur(binary, (0, 0), feather)
+    return Image.fromarray(binary)
+
+
+def get_mask_crop_box(mask: Image.Image, pad: int = 32, unit=(192, 256), min_units: int = 2, align: int = 8):
+    """Smallest latent-aligned crop at the model's aspect ratio that covers the inpaint mask.
+
+    Crop sizes are multiples of `unit` (3:4, divisible by the VAE and UNet
+    downsampling factors), so a 768x1024 frame offers 384x512 and 576x768
+    crops. Returns (left, top, right, bottom), or None when the mask is
+    empty or only the full frame would cover it.
+    """
+    bbox = mask.getbbox()
+    if bbox is None:
+        return None
+
+    frame_w, frame_h = mask.size
+    left, top, right, bottom = bbox
+    left, top = max(0, left - pad), max(0, top - pad)
+    right, bottom = min(frame_w, right + pad), min(frame_h, bottom + pad)
+
+    max_units = min(frame_w // unit[0], frame_h // unit[1])
+    units = next((m for m in range(min_units, max_units)
+                  if unit[0] * m >= right - left and unit[1] * m >= bottom - top), None)
+    if units is None:
+        return None
+
+    crop_w, crop_h = unit[0] * units, unit[1] * units
+    # Center the crop on the mask, keep it inside the frame and on the latent grid
+    x0 = int(np.clip((left + right - crop_w) // 2, 0, frame_w - crop_w)) // align * align
+    y0 = int(np.clip((top + bottom - crop_h) // 2, 0, frame_h - crop_h)) // align * align
+    return x0, y0, x0 + crop_w, y0 + crop_h
+
+
+# Mask engine: every parse label is mapped once, through a lookup table, to
+# bit flags for all of the planes get_mask_location builds per category
+MASK_CATEGORIES = ("upper_body", "lower_body", "dresses")
+
+FLAG_HEAD = 1 << 0
+FLAG_FIXED = 1 << 1
+FLAG_ARM_LEFT = 1 << 2
+FLAG_ARM_RIGHT = 1 << 3
+FLAG_NECK = 1 << 4
+FLAG_UPPER_MASK = 1 << 5
+FLAG_LOWER_MASK = 1 << 6
+FLAG_DRESS_MASK = 1 << 7
+FLAG_UPPER_FIXED = 1 << 8
+FLAG_LOWER_FIXED = 1 << 9
+
+_LABEL_FLAGS = {
+    FLAG_HEAD: (label_map["hat"], label_map["sunglasses"], label_map["head"]),
+    FLAG_FIXED: (label_map["left_shoe"], label_map["right_shoe"], label_map["hat"],
+                 label_map["sunglasses"], label_map["bag"]),
+    FLAG_ARM_LEFT: (label_map["left_arm"],),
+    FLAG_ARM_RIGHT: (label_map["right_arm"],),
+    FLAG_NECK: (18,),
+    FLAG_UPPER_MASK: (label_map["upper_clothes"], label_map["dress"]),
+    FLAG_LOWER_MASK: (label_map["pants"], label_map["left_leg"], label_map["right_leg"], label_map["skirt"]),
+    FLAG_DRESS_MASK: (label_map["dress"], label_map["upper_clothes"], label_map["skirt"], label_map["pants"]),
+    FLAG_UPPER_FIXED: (label_map["skirt"], label_map["pants"]),
+    FLAG_LOWER_FIXED: (label_map["upper_clothes"], label_map["left_arm"], label_map["right_arm"]),
+}
+
+LABEL_FLAGS_LUT = np.zeros(256, dtype=np.uint16)
+for _flag, _labels in _LABEL_FLAGS.items():
+    LABEL_FLAGS_LUT[list(_labels)] |= _flag
+
+# (garment plane, extra fixed plane, arms and neck are cut out of the mask)
+_CATEGORY_FLAGS = {
+    "upper_body": (FLAG_UPPER_MASK, FLAG_UPPER_FIXED, True),
+    "lower_body": (FLAG_LOWER_MASK, FLAG_LOWER_FIXED, False),
+    "dresses": (FLAG_DRESS_MASK, 0, True),
+}
+
+_MORPH_KERNEL = np.ones((5, 5), np.uint8)
+
+
+def _draw_arms(pose_data, arm_width, width, height, arms_left, arms_right):
+    """Arm masks drawn from the pose, as in get_mask_location.
+
+    An arm whose wrist was not detected falls back to its parse label.
+    """
+    im_arms_left = Image.new('L', (width, height))
+    im_arms_right = Image.new('L', (width, height))
+    arms_draw_left = ImageDraw.Draw(im_arms_left)
+    arms_draw_right = ImageDraw.Draw(im_arms_right)
+    shoulder_right = np.multiply(tuple(pose_data[2][:2]), height / 512.0)
+    shoulder_left = np.multiply(tuple(pose_data[5][:2]), height / 512.0)
+    elbow_right = np.multiply(tuple(pose_data[3][:2]), height / 512.0)
+    elbow_left = np.multiply(tuple(pose_data[6][:2]), height / 512.0)
+    wrist_right = np.multiply(tuple(pose_data[4][:2]), height / 512.0)
+    wrist_left = np.multiply(tuple(pose_data[7][:2]), height / 512.0)
+    ARM_LINE_WIDTH = int(arm_width / 512 * height)
+    size_left = [shoulder_left[0] - ARM_LINE_WIDTH // 2, shoulder_left[1] - ARM_LINE_WIDTH // 2,
+                 shoulder_left[0] + ARM_LINE_WIDTH // 2, shoulder_left[1] + ARM_LINE_WIDTH // 2]
+    size_right = [shoulder_right[0] - ARM_LINE_WIDTH // 2, shoulder_right[1] - ARM_LINE_WIDTH // 2,
+                  shoulder_right[0] + ARM_LINE_WIDTH // 2, shoulder_right[1] + ARM_LINE_WIDTH // 2]
+
+    if wrist_right[0] <= 1. and wrist_right[1] <= 1.:
+        right = arms_right
+    else:
+        wrist_right = extend_arm_mask(wrist_right, elbow_right, 1.2)
+        arms_draw_right.line(np.concatenate((shoulder_right, elbow_right, wrist_right)).astype(np.uint16).tolist(), 'white', ARM_LINE_WIDTH, 'curve')
+        arms_draw_right.arc(size_right, 0, 360, 'white', ARM_LINE_WIDTH // 2)
+        right = np.asarray(im_arms_right) > 0
+
+    if wrist_left[0] <= 1. and wrist_left[1] <= 1.:
+        left = arms_left
+    else:
+        wrist_left = extend_arm_mask(wrist_left, elbow_left, 1.2)
+        arms_draw_left.line(np.concatenate((wrist_left, elbow_left, shoulder_left)).astype(np.uint16).tolist(), 'white', ARM_LINE_WIDTH, 'curve')
+        arms_draw_left.arc(size_left, 0, 360, 'white', ARM_LINE_WIDTH // 2)
+        left = np.asarray(im_arms_left) > 0
+
+    return left, right
+
+
+def get_category_masks(model_type, model_parse: Image.Image, keypoint: dict, width=384, height=512,
+                       categories=MASK_CATEGORIES):
+    """Inpaint masks for several garment categories from one parse.
+
+    Produces the same masks as calling get_mask_location once per category,
+    but the label planes come from a single lookup-table gather, the arms
+    are drawn once, and the garment planes of all categories are dilated
+    together in one uint8 pass.
+
+    Returns:
+        dict: category -> (mask, mask_gray)
+    """
+    if model_type == 'hd':
+        arm_width = 60
+    elif model_type == 'dc':
+        arm_width = 45
+    else:
+        raise ValueError("model_type must be \'hd\' or \'dc\'!")
+    unknown = [c for c in categories if c not in _CATEGORY_FLAGS]
+    if unknown:
+        raise NotImplementedError(f"Unsupported mask categories: {unknown}")
+
+    parse_array = np.asarray(model_parse.resize((width, height), Image.NEAREST), dtype=np.uint8)
+    flags = LABEL_FLAGS_LUT[parse_array]
+    head = (flags & FLAG_HEAD) != 0
+
+    # One dilation for every category's garment plane
+    planes = np.stack([(flags & _CATEGORY_FLAGS[c][0]) != 0 for c in categories], axis=2).astype(np.uint8)
+    dilated = cv2.dilate(planes, _MORPH_KERNEL, iterations=5).reshape(height, width, len(categories)) > 0
+
+    if any(_CATEGORY_FLAGS[c][2] for c in categories):
+        pose_data = np.array(keypoint["pose_keypoints_2d"]).reshape((-1, 2))
+        arms_left = (flags & FLAG_ARM_LEFT) != 0
+        arms_right = (flags & FLAG_ARM_RIGHT) != 0
+        im_arms_left, im_arms_right = _draw_arms(pose_data, arm_width, width, height, arms_left, arms_right)
+        hands = (arms_left & ~im_arms_left) | (arms_right & ~im_arms_right)
+        neck = cv2.dilate(((flags & FLAG_NECK) != 0).astype(np.uint8), _MORPH_KERNEL, iterations=1) > 0
+        arms = cv2.dilate((im_arms_left | im_arms_right).astype(np.uint8), _MORPH_KERNEL, iterations=4) > 0
+        upper_cutout = (neck & ~head) | arms
+
+    masks = {}
+    for index, category in enumerate(categories):
+        _, fixed_flag, cut_arms = _CATEGORY_FLAGS[category]
+        fixed = (flags & (FLAG_FIXED | fixed_flag)) != 0
+        # Everything that is not fixed for this category may change
+        changeable = ~fixed
+        parse_mask = dilated[:, :, index]
+        if cut_arms:
+            parse_mask = parse_mask | upper_cutout
+            fixed = fixed | hands
+        keep = (changeable & ~parse_mask) | fixed | head
+
+        dst = hole_fill(np.where(keep, 0, 255).astype(np.uint8))
+        inpaint_mask = refine_mask(dst) // 255
+        masks[category] = (Image.fromarray(inpaint_mask * 255), Image.fromarray(inpaint_mask * 127))
+    return masks
@@ -10,6 +10,14 @@ class ClothingCategory(str, Enum):
     BAGS = "bags"
     JEWELRY = "jewelry"
 
+# Try-on inpaint mask category for each clothing category (others use upper_body)
+TRYON_MASK_CATEGORIES = {
+    ClothingCategory.TOPS: "upper_body",
+    ClothingCategory.OUTERWEAR: "upper_body",
+    ClothingCategory.BOTTOMS: "lower_body",
+    ClothingCategory.DRESSES: "dresses",
+}
+
 class Season(str, Enum):
     SPRING = "spring"
     SUMMER = "summer"
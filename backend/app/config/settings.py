@@ -16,9 +16,82 @@ class Settings(BaseSettings):
     UPLOAD_FOLDER: str = "app/data/uploads"
     MAX_UPLOAD_SIZE: int = 10 * 1024 * 1024  # 10MB
     ALLOWED_EXTENSIONS: set = {".jpg", ".jpeg", ".png", ".webp"}
+    # Bulk wardrobe import: files per request, U-2-Net batch size and
+    # decode/post-processing threads
+    BULK_IMPORT_MAX_FILES: int = 200
+    BG_REMOVAL_BATCH_SIZE: int = 8
+    BG_REMOVAL_WORKERS: int = 4
+    # U-2-Net mask upsampling: "lanczos" or "guided" (guided filter on the
+    # photo); BG_REMOVAL_SOFT_ALPHA keeps a soft matte with "guided"
+    BG_REMOVAL_UPSAMPLING: str = "lanczos"
+    BG_REMOVAL_SOFT_ALPHA: bool = False
+    # Garment visual embeddings (CLIP image encoder of the try-on pipeline):
+    # per-user matrices folder, images per forward pass, and whether uploads
+    # load the encoder on their own when the try-on models are not loaded
+    EMBEDDINGS_DIR: str = "app/data/embeddings"
+    EMBEDDING_BATCH_SIZE: int = 16
+    EMBEDDING_LOAD_ENCODER: bool = False
+    # Cosine similarity above which two garments are reported as near-duplicates
+    DUPLICATE_SIMILARITY: float = 0.95
+    # Per-user preference weights learned from recommendation feedback
+    PREFERENCE_DB: str = "app/data/preferences.db"
+    # Materialized wardrobe analytics, one SQLite row per item
+    ANALYTICS_DB: str = "app/data/analytics.db"
+    # Wear-event log: SQLite file, group-commit window and maximum events per commit
+    WEAR_LOG_DB: str = "app/data/wear_log.db"
+    WEAR_LOG_COMMIT_INTERVAL_MS: int = 50
+    WEAR_LOG_MAX_BATCH: int = 512
+    # Outfit collages: cache directory (served under /api/v1/uploads), "webp" or "png", decode threads
+    COLLAGE_DIR: str = "app/data/uploads/collages"
+    COLLAGE_FORMAT: str = "webp"
+    COLLAGE_QUALITY: int = 90
+    COLLAGE_WORKERS: int = 4
+    # Image renditions: content-addressed store, sizes (longest edge, px), formats and encoder quality
+    RENDITION_DIR: str = "app/data/renditions"
+    RENDITION_SIZES: list[int] = [150, 300, 400, 800]
+    RENDITION_FORMATS: list[str] = ["webp", "jpeg"]
+    RENDITION_QUALITY: int = 82
+    # Upload fingerprints: SQLite index of hashes and reusable artifacts, and the pHash/dHash
+    # Hamming distance (of 64 bits) up to which two uploads count as the same photo
+    FINGERPRINT_DB: str = "app/data/fingerprints.db"
+    FINGERPRINT_MAX_DISTANCE: int = 6
+    # Try-on file lifecycle: access-time index, per-user quota, days without access
+    # before eviction (0 = never) and the in-process sweep interval (0 = disabled)
+    STORAGE_DB: str = "app/data/storage.db"
+    STORAGE_USER_QUOTA_MB: int = 500
+    STORAGE_IDLE_DAYS: int = 7
+    STORAGE_SWEEP_INTERVAL_MINUTES: int = 60
     
     OPENAI_API_KEY: Optional[str] = None
     
+    # "resident" keeps all IDM-VTON components loaded, "sequential" stages them per phase
+    IDM_VTON_EXECUTION_MODE: str = "resident"
+    # Denoise only the latent-aligned crop around the inpaint mask
+    TRYON_MASK_CROP: bool = False
+    # Person images whose keypoints and garment masks are kept for reuse
+    MASK_CACHE_SIZE: int = 32
+    # Human parsing: total ONNX Runtime thread budget (0 = all cores), split
+    # between the ATR and LIP sessions when they run concurrently
+    PARSING_NUM_THREADS: int = 0
+    PARSING_CONCURRENT: bool = True
+    # OpenPose body network runtime: "torch" (eager) or "onnx" (needs
+    # body_pose_model.onnx from scripts/export_openpose_onnx.py)
+    OPENPOSE_BACKEND: str = "torch"
+    OPENPOSE_NUM_THREADS: int = 0
+    # DensePose runtime: "detectron2" (eager DefaultPredictor) or "onnx"
+    # (scripts/export_densepose_onnx.py; serves without importing detectron2)
+    DENSEPOSE_BACKEND: str = "detectron2"
+    DENSEPOSE_ONNX_PATH: Optional[str] = None
+    DENSEPOSE_NUM_THREADS: int = 0
+    # Run DensePose on the person box from the OpenPose keypoints (skips the
+    # RPN) at a lower INPUT.MIN_SIZE_TEST; always on with the "onnx" backend
+    DENSEPOSE_ROI_MODE: bool = False
+    DENSEPOSE_ROI_MIN_SIZE: int = 512
+    # Worker threads for the try-on preprocessing graph (1 = run stages in order)
+    PREPROCESS_WORKERS: int = 3
+    # Optimized ONNX graphs are cached here so startup skips graph optimization
+    ORT_CACHE_DIR: str = "app/data/models/ort_cache"
+    
     class Config:
         env_file = ".env"
         case_sensitive = True
@@ -4,7 +4,10 @@ from fastapi.openapi.docs import get_swagger_ui_html
 from fastapi.responses import HTMLResponse
 from fastapi.staticfiles import StaticFiles
 from app.config import settings
-from app.routers import auth, users, clothing, outfits, recommendations
+from app.routers import auth, users, clothing, outfits, recommendations, renditions
+from app.services.storage_manager import storage_manager
+from app.services.wear_log import wear_log
+import asyncio
 import os
 
 app = FastAPI(
@@ -26,8 +29,17 @@ app.add_middleware(
 uploads_dir = "app/data/uploads"
 os.makedirs(uploads_dir, exist_ok=True)
 
+class AccessTrackingStaticFiles(StaticFiles):
+    """Static files that report reads of try-on files to the storage manager (for LRU eviction)."""
+
+    async def get_response(self, path: str, scope):
+        response = await super().get_response(path, scope)
+        if response.status_code in (200, 206, 304):
+            storage_manager.touch_upload_path(path)
+        return response
+
 # Mount static files for uploaded images at the API path
-app.mount("/api/v1/uploads", StaticFiles(directory=uploads_dir), name="uploads")
+app.mount("/api/v1/uploads", AccessTrackingStaticFiles(directory=uploads_dir), name="uploads")
 
 # Include routers
 app.include_router(auth.router, prefix="/api/v1/auth", tags=["Authentication"])
@@ -35,6 +47,25 @@ app.include_router(users.router, prefix="/api/v1/users", tags=["Users"])
 app.include_router(clothing.router, prefix="/api/v1/clothing", tags=["Clothing"])
 app.include_router(outfits.router, prefix="/api/v1/outfits", tags=["Outfits"])
 app.include_router(recommendations.router, prefix="/api/v1/ai", tags=["AI & Recommendations"])
+app.include_router(renditions.router, prefix="/api/v1/renditions", tags=["Images"])
+
+@app.on_event("startup")
+async def start_storage_sweeps():
+    if settings.STORAGE_SWEEP_INTERVAL_MINUTES > 0:
+        app.state.storage_sweeps = asyncio.create_task(
+            storage_manager.run_periodic(settings.STORAGE_SWEEP_INTERVAL_MINUTES)
+        )
+
+@app.on_event("shutdown")
+async def stop_storage_sweeps():
+    task = getattr(app.state, "storage_sweeps", None)
+    if task:
+        task.cancel()
+    storage_manager.flush()
+
+@app.on_event("shutdown")
+async def flush_wear_log():
+    await asyncio.to_thread(wear_log.flush)
 
 @app.get("/")
 async def root():
@@ -1,16 +1,33 @@
 from datetime import datetime
 from typing import List, Optional, Dict
-from pydantic import BaseModel
+from pydantic import BaseModel, computed_field
+from app.config import settings
 from app.config.constants import ClothingCategory, Season, Occasion
 
+class PaletteColor(BaseModel):
+    hex: str
+    weight: float  # share of the garment's pixels
+
 class ColorInfo(BaseModel):
     primary: str
     secondary: Optional[List[str]] = None
+    palette: Optional[List[PaletteColor]] = None  # extracted from the image at ingest
 
 class ImageInfo(BaseModel):
     original: Optional[str] = None  # base64 encoded image data
     processed: Optional[str] = None  # base64 encoded processed image data
     thumbnail: Optional[str] = None  # base64 encoded thumbnail data
+    key: Optional[str] = None  # content hash of the display image; renditions at /api/v1/renditions/{key}/{size}.{format}
+
+    @computed_field
+    @property
+    def renditions(self) -> Optional[Dict[str, str]]:
+        """URL path of each configured rendition size (WebP when enabled), so clients never hardcode sizes."""
+        if not self.key:
+            return None
+        fmt = "webp" if "webp" in settings.RENDITION_FORMATS else settings.RENDITION_FORMATS[0]
+        return {str(size): f"{settings.API_V1_STR}/renditions/{self.key}/{size}.{fmt}"
+                for size in sorted(settings.RENDITION_SIZES)}
 
 class ClothingItem(BaseModel):
     id: str
@@ -1,6 +1,13 @@
+import asyncio
+from datetime import date
 from typing import List, Optional
-from fastapi import APIRouter, Depends, UploadFile, File, Query, HTTPException
-from app.schemas.clothing_schemas import ClothingItemResponse, ClothingItemCreate, ClothingItemUpdate, ClothingItemFilter
+from fastapi import APIRouter, Depends, UploadFile, File, Form, Query, HTTPException
+from app.config import settings
+from app.config.constants import ClothingCategory
+from app.schemas.clothing_schemas import (
+    ClothingItemResponse, ClothingItemCreate, ClothingItemUpdate, ClothingItemFilter, BulkImportResponse,
+    ColorMatch, VisualMatch, DuplicatePair, ItemWearHistory
+)
 from app.models.user import User
 from app.services.clothing_service import ClothingService
 from app.routers.auth import get_current_user
@@ -29,6 +36,50 @@ async def add_clothing(
 ):
     return clothing_service.create_clothing_item(current_user.id, item)
 
+@router.post("/bulk-import", response_model=BulkImportResponse)
+async def bulk_import_clothing(
+    files: List[UploadFile] = File(..., description="Garment images"),
+    category: ClothingCategory = Form(ClothingCategory.TOPS),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Import many garment photos at once. Backgrounds are removed in batches
+    and every file gets its own status in the response.
+    """
+    return await clothing_service.bulk_import(current_user.id, files, category)
+
+@router.get("/search", response_model=List[ColorMatch])
+async def search_clothing_by_color(
+    color: str = Query(..., description="Hex color, e.g. #aabbcc"),
+    k: int = Query(20, ge=1, le=200),
+    mode: str = Query("similar", description="similar, complementary, analogous or triadic"),
+    category: Optional[ClothingCategory] = Query(None),
+    current_user: User = Depends(get_current_user)
+):
+    """Items whose colors are closest to `color`, or to its color harmonies."""
+    matches = clothing_service.search_by_color(current_user.id, color, k, mode, category)
+    return [ColorMatch(item=item, distance=round(distance, 2)) for item, distance in matches]
+
+@router.post("/similar", response_model=List[VisualMatch])
+async def find_similar_to_photo(
+    file: UploadFile = File(..., description="Photo of a garment"),
+    k: int = Query(10, ge=1, le=100),
+    current_user: User = Depends(get_current_user)
+):
+    """Wardrobe items that look most like the photo."""
+    contents = await file.read()
+    matches = await asyncio.to_thread(clothing_service.find_similar_to_image, current_user.id, contents, k)
+    return [VisualMatch(item=item, similarity=round(score, 4)) for item, score in matches]
+
+@router.get("/duplicates", response_model=List[DuplicatePair])
+async def find_duplicate_clothing(
+    threshold: float = Query(settings.DUPLICATE_SIMILARITY, ge=0.5, le=1.0),
+    current_user: User = Depends(get_current_user)
+):
+    """Pairs of items that look like the same garment."""
+    pairs = clothing_service.find_duplicates(current_user.id, threshold)
+    return [DuplicatePair(first=a, second=b, similarity=round(score, 4)) for a, b, score in pairs]
+
 @router.get("/{item_id}", response_model=ClothingItemResponse)
 async def get_clothing_item(
     item_id: str,
@@ -67,6 +118,27 @@ async def process_clothing_image(
 ):
     return await clothing_service.process_image(current_user.id, item_id)
 
+@router.get("/{item_id}/similar", response_model=List[VisualMatch])
+async def find_similar_clothing(
+    item_id: str,
+    k: int = Query(10, ge=1, le=100),
+    current_user: User = Depends(get_current_user)
+):
+    """Items that look most like this one (by image embedding)."""
+    matches = clothing_service.find_similar(current_user.id, item_id, k)
+    return [VisualMatch(item=item, similarity=round(score, 4)) for item, score in matches]
+
+@router.get("/{item_id}/wear-history", response_model=ItemWearHistory)
+async def get_wear_history(
+    item_id: str,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    granularity: str = Query("month", description="day or month"),
+    current_user: User = Depends(get_current_user)
+):
+    """Wears per day or month with running totals and cost per wear."""
+    return clothing_service.get_wear_history(current_user.id, item_id, start, end, granularity)
+
 @router.post("/{item_id}/wear")
 async def mark_as_worn(
     item_id: str,
@@ -9,13 +9,16 @@ from app.schemas.recommendation_schemas import (
     VirtualTryOnFileResponse
 )
 from app.models.user import User
+from app.config.constants import TRYON_MASK_CATEGORIES
 from app.services.ai_service import AIService
+from app.services.storage_manager import storage_manager
 from app.routers.auth import get_current_user
 import tempfile
 import os
 from pathlib import Path
 import uuid
 import time
+import hashlib
 
 router = APIRouter()
 ai_service = AIService()
@@ -54,7 +57,7 @@ async def submit_feedback(
     feedback: RecommendationFeedback,
     current_user: User = Depends(get_current_user)
 ):
-    return await ai_service.submit_recommendation_feedback(feedback)
+    return ai_service.save_recommendation_feedback(current_user.id, feedback)
 
 @router.post("/virtual-tryon", response_model=VirtualTryOnResponse)
 async def virtual_tryon(
@@ -151,17 +154,24 @@ async def virtual_tryon(
             # Handle legacy file path (for backward compatibility)
             garment_path_str = str(garment_data)
         
+        # Mark the inputs as in use so a storage sweep keeps them while the try-on runs
+        for path in (person_path, garment_local_path):
+            storage_manager.touch(current_user.id, path.name)
+        
         # Process virtual try-on with real AI
         result = await ai_service.generate_virtual_tryon_from_files(
             person_image_path=str(person_path),
             garment_image_path=garment_path_str,
             output_path=str(result_path),
-            user_id=current_user.id
+            user_id=current_user.id,
+            category=TRYON_MASK_CATEGORIES.get(clothing_item.category, "upper_body")
         )
         
         if not result["success"]:
             raise HTTPException(status_code=500, detail=f"Virtual try-on failed: {result.get('error', 'Unknown error')}")
         
+        storage_manager.touch(current_user.id, result_path.name)
+        
         # Return response with URL
         return VirtualTryOnResponse(
             original_image=f"/uploads/{current_user.id}/virtual_tryon/{person_filename}",
@@ -203,26 +213,28 @@ async def virtual_tryon_upload(
     upload_dir = Path("app/data/uploads") / current_user.id / "virtual_tryon"
     upload_dir.mkdir(parents=True, exist_ok=True)
     
+    session_id = str(uuid.uuid4())
+    result_filename = f"result_{session_id}.jpg"
+    result_path = upload_dir / result_filename
+    
     try:
-        # Generate unique filenames
-        session_id = str(uuid.uuid4())
-        person_filename = f"person_{session_id}.jpg"
-        garment_filename = f"garment_{session_id}.jpg"
-        result_filename = f"result_{session_id}.jpg"
+        # Inputs are named by content, so a photo sent again reuses its file
+        person_content = await person_image.read()
+        garment_content = await garment_image.read()
+        person_filename = f"person_{hashlib.sha256(person_content).hexdigest()[:32]}.jpg"
+        garment_filename = f"garment_{hashlib.sha256(garment_content).hexdigest()[:32]}.jpg"
         
-        # Save uploaded files
         person_path = upload_dir / person_filename
         garment_path = upload_dir / garment_filename
-        result_path = upload_dir / result_filename
         
-        # Write uploaded files
-        with open(person_path, "wb") as f:
-            content = await person_image.read()
-            f.write(content)
-            
-        with open(garment_path, "wb") as f:
-            content = await garment_image.read()
-            f.write(content)
+        # Write uploaded files (atomically, as concurrent requests may share them)
+        for path, content in ((person_path, person_content), (garment_path, garment_content)):
+            if not path.exists():
+                tmp_path = path.with_name(f"{path.name}.{session_id}.tmp")
+                tmp_path.write_bytes(content)
+                os.replace(tmp_path, path)
+            # Reused inputs keep their old mtime: mark them as in use so a storage sweep keeps them
+            storage_manager.touch(current_user.id, path.name)
         
         # Process virtual try-on
         result = await ai_service.generate_virtual_tryon_from_files(
@@ -235,6 +247,8 @@ async def virtual_tryon_upload(
         if not result["success"]:
             raise HTTPException(status_code=500, detail=f"Virtual try-on failed: {result.get('error', 'Unknown error')}")
         
+        storage_manager.touch(current_user.id, result_path.name)
+        
         processing_time = time.time() - start_time
         
         # Return URLs to the generated images
@@ -247,9 +261,8 @@ async def virtual_tryon_upload(
         )
         
     except Exception as e:
-        # Clean up uploaded files on error
-        for path in [person_path, garment_path, result_path]:
-            if path.exists():
-                path.unlink()
+        # Clean up the result on error; the inputs are kept for the next try
+        if result_path.exists():
+            result_path.unlink()
         
         raise HTTPException(status_code=500, detail=f"Virtual try-on failed: {str(e)}")
\ No newline at end of file
@@ -0,0 +1,22 @@
+import asyncio
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import FileResponse
+from app.services.rendition_service import rendition_service, is_rendition_key, RENDITION_MEDIA_TYPES
+
+router = APIRouter()
+
+# Renditions are addressed by content, so a URL's bytes never change
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+@router.get("/{key}/{name}")
+async def get_rendition(key: str, name: str):
+    """One size/format of a stored image, e.g. /renditions/{key}/300.webp; generated on first request."""
+    size, _, fmt = name.partition(".")
+    if not is_rendition_key(key) or not size.isdigit() or fmt not in RENDITION_MEDIA_TYPES:
+        raise HTTPException(status_code=404, detail="Rendition not found")
+    try:
+        path = await asyncio.to_thread(rendition_service.get, key, int(size), fmt)
+    except (ValueError, FileNotFoundError):
+        raise HTTPException(status_code=404, detail="Rendition not found")
+    return FileResponse(path, media_type=RENDITION_MEDIA_TYPES[fmt],
+                        headers={"Cache-Control": IMMUTABLE_CACHE_CONTROL})
@@ -1,5 +1,7 @@
-from fastapi import APIRouter, Depends
-from app.schemas.user_schemas import UserResponse, UserUpdate, UserPreferencesUpdate, UserAnalytics
+from datetime import date
+from typing import Optional
+from fastapi import APIRouter, Depends, Query
+from app.schemas.user_schemas import UserResponse, UserUpdate, UserPreferencesUpdate, UserAnalytics, WearSeries
 from app.models.user import User
 from app.services.user_service import UserService
 from app.routers.auth import get_current_user
@@ -27,4 +29,15 @@ async def update_preferences(
 
 @router.get("/analytics", response_model=UserAnalytics)
 async def get_analytics(current_user: User = Depends(get_current_user)):
-    return user_service.get_user_analytics(current_user.id)
\ No newline at end of file
+    return user_service.get_user_analytics(current_user.id)
+
+@router.get("/analytics/wear", response_model=WearSeries)
+async def get_wear_analytics(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    granularity: str = Query("month", description="day or month"),
+    kind: str = Query("item", description="item or outfit"),
+    current_user: User = Depends(get_current_user)
+):
+    """Wears per day or month; defaults to the last 30 days or 12 months."""
+    return user_service.get_wear_series(current_user.id, start, end, granularity, kind)
\ No newline at end of file
@@ -57,4 +57,39 @@ class ClothingItemFilter(BaseModel):
     color: Optional[str] = None
     brand: Optional[str] = None
     tags: Optional[List[str]] = None
-    is_favorite: Optional[bool] = None
\ No newline at end of file
+    is_favorite: Optional[bool] = None
+
+class BulkImportItemResult(BaseModel):
+    filename: str
+    status: str  # "imported" or "failed"
+    item_id: Optional[str] = None
+    error: Optional[str] = None
+
+class BulkImportResponse(BaseModel):
+    imported: int
+    failed: int
+    items: List[BulkImportItemResult]
+
+class ColorMatch(BaseModel):
+    item: ClothingItemResponse
+    distance: float  # CIELAB distance to the query color
+
+class VisualMatch(BaseModel):
+    item: ClothingItemResponse
+    similarity: float  # cosine similarity of the image embeddings
+
+class DuplicatePair(BaseModel):
+    first: ClothingItemResponse
+    second: ClothingItemResponse
+    similarity: float
+
+class ItemWearPeriod(BaseModel):
+    period: str  # YYYY-MM-DD or YYYY-MM
+    count: int
+    cumulative: int  # wears up to the end of the period
+    cost_per_wear: Optional[float] = None
+
+class ItemWearHistory(BaseModel):
+    item_id: str
+    granularity: str
+    periods: List[ItemWearPeriod]
\ No newline at end of file
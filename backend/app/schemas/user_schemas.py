@@ -41,4 +41,13 @@ class UserAnalytics(BaseModel):
     least_worn_items: List[dict]
     cost_per_wear: dict
     favorite_colors: List[dict]
-    wardrobe_value: float
\ No newline at end of file
+    wardrobe_value: float
+
+class WearPeriod(BaseModel):
+    period: str  # YYYY-MM-DD or YYYY-MM
+    count: int
+
+class WearSeries(BaseModel):
+    granularity: str
+    kind: str
+    periods: List[WearPeriod]
\ No newline at end of file
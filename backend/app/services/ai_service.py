@@ -1,10 +1,15 @@
+import io
 import json
 import uuid
+import base64
 import asyncio
+from collections import OrderedDict
 from typing import List, Dict, Optional
 from datetime import datetime
+from fastapi import HTTPException
 from app.models.user import User
 from app.models.recommendation import Recommendation
+from app.models.clothing import ClothingItem
 from app.schemas.recommendation_schemas import (
     RecommendationRequest,
     RecommendationResponse,
@@ -14,19 +19,57 @@ from app.schemas.recommendation_schemas import (
 )
 from app.services.clothing_service import ClothingService
 from app.services.outfit_service import OutfitService
-from app.config import settings
+from app.services.embedding_index import embedding_index
+from app.services.outfit_scoring import item_features, unary_scores, rank_outfits
+from app.services.preference_model import preference_model
+from app.services.fingerprint_index import fingerprint_index
+from app.services.storage_manager import storage_manager
+from app.config import settings, ClothingCategory
 from app.config.model_paths import verify_models
+from app.utils.image_hash import fingerprint
 from app.ai.virtual_tryon.idm_vton_processor import IDMVTONProcessor
 from app.ai.virtual_tryon.gradio_idm_vton_processor import GradioIDMVTONProcessor
 import random
 from pathlib import Path
 import tempfile
 
+# Upper bound on outfits returned by one recommendation request
+MAX_RECOMMENDATIONS = 20
+# Recently generated recommendations kept in memory for feedback lookups
+RECENT_RECOMMENDATIONS = 1024
+
+def _encode_person_masks(keypoints: dict, masks: dict) -> bytes:
+    """Serialize try-on keypoints and {category: (mask, mask_gray)} for the fingerprint index."""
+    from PIL import Image
+    
+    def png(image: Image.Image) -> str:
+        output = io.BytesIO()
+        image.save(output, format="PNG")
+        return base64.b64encode(output.getvalue()).decode('utf-8')
+    
+    return json.dumps({
+        "keypoints": keypoints,
+        "masks": {category: [png(mask), png(mask_gray)] for category, (mask, mask_gray) in masks.items()}
+    }, default=float).encode('utf-8')
+
+
+def _decode_person_masks(data: bytes) -> tuple:
+    from PIL import Image
+    
+    stored = json.loads(data)
+    load = lambda value: Image.open(io.BytesIO(base64.b64decode(value))).copy()
+    return stored["keypoints"], {category: (load(m), load(g)) for category, (m, g) in stored["masks"].items()}
+
+
 class AIService:
     def __init__(self):
         self.clothing_service = ClothingService()
         self.outfit_service = OutfitService()
         self.recommendations_file = "app/data/mock/recommendations.json"
+        # Append-only feedback log (one JSON object per line)
+        self.feedback_file = "app/data/mock/recommendation_feedback.jsonl"
+        # Recommendation id -> (user id, item ids), most recent last
+        self._recent_recommendations = OrderedDict()
         self.vton_processor = IDMVTONProcessor()
         self.gradio_idm_vton = GradioIDMVTONProcessor()
         # Initialize IDM-VTON implementations lazily
@@ -60,7 +103,8 @@ class AIService:
                 from app.ai.idm_vton_simplified import IDMVTONSimplified
                 self.simplified_idm_vton = IDMVTONSimplified(
                     model_path="/Volumes/4TB-Z/AI-Models/virtual-closet/idm-vton/model_weights",
-                    device=device  # Use MPS on Apple Silicon
+                    device=device,  # Use MPS on Apple Silicon
+                    execution_mode=settings.IDM_VTON_EXECUTION_MODE
                 )
                 print("✅ Loaded simplified IDM-VTON implementation")
             except Exception as e:
@@ -83,70 +127,65 @@ class AIService:
                 self.official_idm_vton = False  # Mark as failed
     
     async def get_outfit_recommendations(self, user: User, request: RecommendationRequest) -> List[RecommendationResponse]:
-        # Get user's clothing items
-        user_clothing = self.clothing_service.get_user_clothing(user.id)
+        context = request.context
+        occasion = context.occasion.value if context.occasion else None
+        season = context.season.value if context.season else None
+        exclude = set(request.exclude_items or [])
         
-        if not user_clothing:
+        # Candidate sets are bitset intersections from the wardrobe index
+        slots = [
+            self.clothing_service.get_candidates(user.id, ClothingCategory.TOPS, season, occasion),
+            self.clothing_service.get_candidates(user.id, ClothingCategory.BOTTOMS, season, occasion),
+        ]
+        if context.weather in ["cold", "snowy"] or (context.temperature and context.temperature < 60):
+            slots.append(self.clothing_service.get_candidates(user.id, ClothingCategory.OUTERWEAR))
+        slots = [[item for item in items if item['id'] not in exclude] for items in slots]
+        slots = [items for items in slots if items]
+        if not slots:
             return []
         
+        # Score every top x bottom (x outerwear) combination and keep the best
+        features = []
+        for items in slots:
+            embeddings, has_embedding = embedding_index.vectors(user.id, [item['id'] for item in items])
+            features.append(item_features(items, embeddings, has_embedding))
+        unary = [
+            unary_scores(f, season, occasion, request.style_preferences, preference_model.item_scores(user.id, items))
+            for f, items in zip(features, slots)
+        ]
+        outfits = rank_outfits(features, unary, k=min(request.max_results, MAX_RECOMMENDATIONS))
+        
         recommendations = []
+        saved = []
+        for indices, score in outfits:
+            selected_items = [ClothingItem(**slots[s][i]) for s, i in enumerate(indices)]
+            recommendation = RecommendationResponse(
+                id=str(uuid.uuid4()),
+                item_ids=[item.id for item in selected_items],
+                items=[item.dict() for item in selected_items],
+                score=round(score, 4),
+                reason=self._generate_recommendation_reason(context),
+                styling_tips=self._generate_styling_tips(selected_items)
+            )
+            recommendations.append(recommendation)
+            saved.append({
+                "id": recommendation.id,
+                "user_id": user.id,
+                "item_ids": recommendation.item_ids,
+                "context": context.dict(),
+                "score": recommendation.score,
+                "reason": recommendation.reason,
+                "styling_tips": recommendation.styling_tips,
+                "created_at": datetime.utcnow().isoformat()
+            })
         
-        # Simple recommendation algorithm based on context
-        for _ in range(min(request.max_results, 5)):
-            # Select items based on occasion and season
-            selected_items = []
-            
-            # Select a top
-            tops = [item for item in user_clothing if item.category == "tops"]
-            if request.context.occasion:
-                tops = [t for t in tops if request.context.occasion in [o.value for o in t.occasion]]
-            if request.context.season:
-                tops = [t for t in tops if request.context.season in [s.value for s in t.season]]
-            
-            if tops:
-                selected_items.append(random.choice(tops))
-            
-            # Select a bottom
-            bottoms = [item for item in user_clothing if item.category == "bottoms"]
-            if request.context.occasion:
-                bottoms = [b for b in bottoms if request.context.occasion in [o.value for o in b.occasion]]
-            if request.context.season:
-                bottoms = [b for b in bottoms if request.context.season in [s.value for s in b.season]]
-            
-            if bottoms:
-                selected_items.append(random.choice(bottoms))
-            
-            # Add outerwear if cold weather
-            if request.context.weather in ["cold", "snowy"] or (request.context.temperature and request.context.temperature < 60):
-                outerwear = [item for item in user_clothing if item.category == "outerwear"]
-                if outerwear:
-                    selected_items.append(random.choice(outerwear))
-            
-            if selected_items:
-                recommendation = RecommendationResponse(
-                    id=str(uuid.uuid4()),
-                    item_ids=[item.id for item in selected_items],
-                    items=[item.dict() for item in selected_items],
-                    score=random.uniform(0.7, 0.95),
-                    reason=self._generate_recommendation_reason(request.context),
-                    styling_tips=self._generate_styling_tips(selected_items)
-                )
-                recommendations.append(recommendation)
-                
-                # Save recommendation
-                rec_dict = {
-                    "id": recommendation.id,
-                    "user_id": user.id,
-                    "item_ids": recommendation.item_ids,
-                    "context": request.context.dict(),
-                    "score": recommendation.score,
-                    "reason": recommendation.reason,
-                    "styling_tips": recommendation.styling_tips,
-                    "created_at": datetime.utcnow().isoformat()
-                }
-                saved_recs = self._load_recommendations()
-                saved_recs.append(rec_dict)
-                self._save_recommendations(saved_recs)
+        # One write for the whole batch
+        if saved:
+            saved_recs = self._load_recommendations()
+            saved_recs.extend(saved)
+            self._save_recommendations(saved_recs)
+            for rec in saved:
+                self._remember_recommendation(rec['id'], user.id, rec['item_ids'])
         
         return recommendations
     
@@ -205,16 +244,42 @@ class AIService:
         )
         return await self.get_outfit_recommendations(user, request)
     
+    def _remember_recommendation(self, recommendation_id: str, user_id: str, item_ids: List[str]):
+        self._recent_recommendations[recommendation_id] = (user_id, item_ids)
+        self._recent_recommendations.move_to_end(recommendation_id)
+        while len(self._recent_recommendations) > RECENT_RECOMMENDATIONS:
+            self._recent_recommendations.popitem(last=False)
+    
+    def _recommendation_item_ids(self, user_id: str, recommendation_id: str) -> Optional[List[str]]:
+        entry = self._recent_recommendations.get(recommendation_id)
+        if entry is None:
+            # Older than the in-memory window (or from before a restart)
+            rec = next((r for r in self._load_recommendations() if r['id'] == recommendation_id), None)
+            if rec is None:
+                return None
+            entry = (rec['user_id'], rec['item_ids'])
+            self._remember_recommendation(recommendation_id, *entry)
+        owner, item_ids = entry
+        return item_ids if owner == user_id else None
+    
     def save_recommendation_feedback(self, user_id: str, feedback: RecommendationFeedback) -> dict:
-        recommendations = self._load_recommendations()
+        """Log feedback and take one online step of the user's preference model."""
+        item_ids = self._recommendation_item_ids(user_id, feedback.recommendation_id)
+        if item_ids is None:
+            raise HTTPException(status_code=404, detail="Recommendation not found")
         
-        for rec in recommendations:
-            if rec['id'] == feedback.recommendation_id and rec['user_id'] == user_id:
-                rec['is_accepted'] = feedback.is_accepted
-                rec['user_feedback'] = feedback.feedback
-                break
+        with open(self.feedback_file, 'a') as f:
+            f.write(json.dumps({
+                "recommendation_id": feedback.recommendation_id,
+                "user_id": user_id,
+                "is_accepted": feedback.is_accepted,
+                "feedback": feedback.feedback,
+                "created_at": datetime.utcnow().isoformat()
+            }) + "\n")
         
-        self._save_recommendations(recommendations)
+        items = self.clothing_service.get_item_records(user_id, item_ids)
+        if items:
+            preference_model.update(user_id, items, feedback.is_accepted)
         
         return {"message": "Feedback saved successfully"}
     
@@ -281,6 +346,7 @@ class AIService:
                     
                     # Save the result
                     result_image.save(output_path)
+                    storage_manager.touch(user_id, output_path.name)
                     result = type('obj', (object,), {
                         'success': True, 
                         'processing_time': time.time() - start_time
@@ -315,6 +381,37 @@ class AIService:
                 processing_time=processing_time
             )
 
+    def _seed_person_masks(self, user_id: str, person_bytes: bytes) -> Optional[str]:
+        """
+        Fingerprint a person photo and seed the try-on mask cache with the
+        keypoints and masks stored for it or a near-identical earlier photo.
+        
+        Returns:
+            The photo's SHA-256 (its mask cache key), or None if it cannot be decoded
+        """
+        try:
+            fp = fingerprint(person_bytes)
+        except Exception:
+            return None
+        fingerprint_index.add(user_id, "person", fp)
+        if self.simplified_idm_vton.person_masks(fp.sha256) is None:
+            stored = fingerprint_index.reuse(user_id, "person", fp, "person_masks")
+            if stored is not None:
+                print("♻️ Reusing masks and keypoints of a matching person photo")
+                self.simplified_idm_vton.store_person_masks(fp.sha256, *_decode_person_masks(stored))
+        return fp.sha256
+    
+    def _save_person_masks(self, person_key: Optional[str]):
+        """Store newly computed person masks and keypoints for later uploads of the same photo."""
+        if person_key is None or fingerprint_index.get_artifact(person_key, "person_masks") is not None:
+            return
+        entry = self.simplified_idm_vton.person_masks(person_key)
+        if entry is not None:
+            try:
+                fingerprint_index.set_artifact(person_key, "person_masks", _encode_person_masks(*entry))
+            except Exception as e:
+                print(f"Could not store person masks: {e}")
+    
     async def generate_virtual_tryon_from_files(
         self, 
         person_image_path: str, 
@@ -354,6 +451,7 @@ class AIService:
                 
                 person_image = Image.open(person_image_path)
                 garment_image = Image.open(garment_image_path)
+                person_key = self._seed_person_masks(user_id, Path(person_image_path).read_bytes())
                 
                 result_image, mask_image = self.simplified_idm_vton.generate_virtual_tryon(
                     person_image=person_image,
@@ -361,8 +459,12 @@ class AIService:
                     garment_description="a stylish garment",
                     auto_mask=True,
                     denoise_steps=30,
-                    seed=42
+                    seed=42,
+                    mask_crop=settings.TRYON_MASK_CROP,
+                    category=kwargs.get("category", "upper_body"),
+                    person_key=person_key
                 )
+                self._save_person_masks(person_key)
                 
                 # Save the result
                 result_image.save(output_path)
@@ -1,18 +1,85 @@
 import os
 import json
+import asyncio
 import uuid
 import base64
-from datetime import datetime
+from datetime import date, datetime
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Optional
 from pathlib import Path
 from fastapi import HTTPException, status, UploadFile
 from app.models.clothing import ClothingItem, ImageInfo
-from app.schemas.clothing_schemas import ClothingItemCreate, ClothingItemUpdate, ClothingItemFilter
-from app.config import settings
+from app.schemas.clothing_schemas import (
+    ClothingItemCreate, ClothingItemUpdate, ClothingItemFilter, BulkImportItemResult, BulkImportResponse
+)
+from app.config import settings, ClothingCategory
 from app.services.image_service import ImageService
+from app.services.color_index import color_index, is_hex_color, COLOR_MODES
+from app.services.embedding_index import embedding_index
+from app.services.wardrobe_index import wardrobe_index
+from app.services.wardrobe_analytics import wardrobe_analytics
+from app.services.wear_log import wear_log, default_range
+from app.services.rendition_service import rendition_service, RENDITION_MEDIA_TYPES
+from app.services.fingerprint_index import fingerprint_index
+from app.utils.color import extract_palette
+from app.utils.image_hash import ImageFingerprint, fingerprint
 from PIL import Image
+import numpy as np
 import io
 
+PALETTE_SIZE = 5
+
+
+def _palette_dicts(palette: list) -> List[dict]:
+    return [{"hex": hex_color, "weight": weight} for hex_color, weight in palette]
+
+
+def item_palette(images: dict) -> Optional[List[dict]]:
+    """Palette of an item's processed image (the original until it is processed), or None."""
+    data_uri = images.get('processed') or images.get('original')
+    if not data_uri or not data_uri.startswith('data:'):
+        return None
+    try:
+        image_bytes = base64.b64decode(data_uri.split(',', 1)[1])
+        return _palette_dicts(extract_palette(image_bytes, PALETTE_SIZE)) or None
+    except Exception as e:
+        print(f"Color extraction failed: {e}")
+        return None
+
+
+def recompute_palettes(clothing: list, user_id: Optional[str] = None, force: bool = False, workers: int = 4) -> int:
+    """Fill in color palettes of clothing records in place.
+    
+    Only records without a palette are processed unless `force` is set.
+    Returns the number of records updated.
+    """
+    targets = [
+        c for c in clothing
+        if (user_id is None or c.get('user_id') == user_id)
+        and (force or not (c.get('color') or {}).get('palette'))
+    ]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        palettes = list(pool.map(lambda c: item_palette(c.get('images') or {}), targets))
+    
+    updated = 0
+    for item, palette in zip(targets, palettes):
+        if palette:
+            item.setdefault('color', {})['palette'] = palette
+            updated += 1
+    return updated
+
+
+def embed_images(images: List[Image.Image]):
+    """(n, dim) garment embeddings, or None when no image encoder is available."""
+    try:
+        from app.ai.garment_embeddings import get_garment_embedder
+        embedder = get_garment_embedder()
+        return embedder.embed(images) if embedder is not None else None
+    except Exception as e:
+        print(f"Garment embedding failed: {e}")
+        return None
+
+
 class ClothingService:
     def __init__(self):
         self.clothing_file = "app/data/mock/clothing.json"
@@ -35,6 +102,17 @@ class ClothingService:
         with open(self.clothing_file, 'w') as f:
             json.dump(clothing, f, indent=2, default=str)
     
+    def _index_item(self, user_id: str, item: dict):
+        """Refresh an item in the color and wardrobe indexes and the analytics aggregates."""
+        color_index.upsert(user_id, item)
+        wardrobe_index.upsert(user_id, item)
+        wardrobe_analytics.upsert_item(user_id, item)
+    
+    def _unindex_item(self, user_id: str, item_id: str):
+        color_index.remove(user_id, item_id)
+        wardrobe_index.remove(user_id, item_id)
+        wardrobe_analytics.remove_item(user_id, item_id)
+    
     def get_user_clothing(self, user_id: str, filters: Optional[ClothingItemFilter] = None) -> List[ClothingItem]:
         clothing = self._load_clothing()
         user_items = [c for c in clothing if c.get('user_id') == user_id and c.get('is_active', True)]
@@ -72,6 +150,7 @@ class ClothingService:
         
         clothing.append(item_dict)
         self._save_clothing(clothing)
+        self._index_item(user_id, item_dict)
         
         return ClothingItem(**item_dict)
     
@@ -87,6 +166,128 @@ class ClothingService:
         
         return ClothingItem(**item)
     
+    def _ensure_wardrobe_index(self, user_id: str):
+        if not wardrobe_index.is_built(user_id):
+            wardrobe_index.build(user_id, [c for c in self._load_clothing() if c.get('user_id') == user_id])
+    
+    def get_item_records(self, user_id: str, item_ids: List[str]) -> List[dict]:
+        """Active item records by id from the wardrobe index (unknown or deleted ids are skipped)."""
+        self._ensure_wardrobe_index(user_id)
+        return wardrobe_index.get(user_id, item_ids)
+    
+    def get_candidates(self, user_id: str, category: ClothingCategory, season: Optional[str] = None,
+                       occasion: Optional[str] = None) -> List[dict]:
+        """Active item records of a category, optionally for a season and an occasion (index lookup)."""
+        self._ensure_wardrobe_index(user_id)
+        return wardrobe_index.candidates(user_id, category, season, occasion)
+    
+    def search_by_color(self, user_id: str, color: str, k: int = 20, mode: str = "similar",
+                        category: Optional[ClothingCategory] = None) -> List[tuple]:
+        """Items closest to a color (or its complementary/analogous/triadic hues), closest first."""
+        if not is_hex_color(color):
+            raise HTTPException(status_code=400, detail="color must be a hex color like #aabbcc")
+        if mode not in COLOR_MODES:
+            raise HTTPException(status_code=400, detail=f"mode must be one of {list(COLOR_MODES)}")
+        
+        if not color_index.is_built(user_id):
+            color_index.build(user_id, [c for c in self._load_clothing() if c.get('user_id') == user_id])
+        matches = color_index.search(user_id, color, k, mode, category.value if category else None)
+        return [(ClothingItem(**item), distance) for item, distance in matches]
+    
+    def _index_embeddings(self, user_id: str, item_ids: List[str], images: List[Image.Image],
+                          fingerprints: Optional[List[Optional[ImageFingerprint]]] = None,
+                          artifact: str = "embedding"):
+        """
+        Embed item images and store the embeddings.
+        
+        With fingerprints, an embedding stored as `artifact` for the same or a
+        near-identical upload is reused instead of running the encoder, and
+        new embeddings are stored for later uploads.
+        
+        Returns:
+            (n, dim) embeddings, or None if some image has none (no encoder)
+        """
+        fingerprints = fingerprints or [None] * len(images)
+        vectors = [None] * len(images)
+        for i, fp in enumerate(fingerprints):
+            stored = fingerprint_index.reuse(user_id, "garment", fp, artifact)
+            if stored is not None:
+                vectors[i] = np.frombuffer(stored, dtype=np.float32)
+        todo = [i for i, vector in enumerate(vectors) if vector is None]
+        computed = embed_images([images[i] for i in todo]) if todo else None
+        if computed is not None:
+            for i, vector in zip(todo, computed):
+                vectors[i] = vector
+                if fingerprints[i] is not None:
+                    fingerprint_index.set_artifact(fingerprints[i].sha256, artifact,
+                                                   np.asarray(vector, dtype=np.float32).tobytes())
+        present = [i for i, vector in enumerate(vectors) if vector is not None]
+        if not present:
+            return None
+        embedding_index.upsert(user_id, [item_ids[i] for i in present], np.stack([vectors[i] for i in present]))
+        return np.stack(vectors) if len(present) == len(vectors) else None
+    
+    def _fingerprint(self, user_id: str, image_bytes: bytes) -> Optional[ImageFingerprint]:
+        """Fingerprint and record a garment upload; None if it cannot be decoded."""
+        try:
+            fp = fingerprint(image_bytes)
+        except Exception:
+            return None
+        fingerprint_index.add(user_id, "garment", fp)
+        return fp
+    
+    def _reused_cutout(self, user_id: str, fp: Optional[ImageFingerprint]) -> Optional[bytes]:
+        """PNG cut-out already computed for this upload or a near-identical one."""
+        key = fingerprint_index.reuse(user_id, "garment", fp, "processed")
+        if key is None:
+            return None
+        path = rendition_service.source_path(key.decode())
+        return path.read_bytes() if path.exists() else None
+    
+    def _matched_items(self, user_id: str, item_ids: set) -> dict:
+        return {
+            c['id']: ClothingItem(**c) for c in self._load_clothing()
+            if c.get('user_id') == user_id and c['id'] in item_ids and c.get('is_active', True)
+        }
+    
+    def _visual_matches(self, user_id: str, vector, k: int, exclude: Optional[set] = None) -> List[tuple]:
+        matches = embedding_index.search(user_id, vector, k, exclude)
+        items = self._matched_items(user_id, {item_id for item_id, _ in matches})
+        return [(items[item_id], score) for item_id, score in matches if item_id in items]
+    
+    def find_similar(self, user_id: str, item_id: str, k: int = 10) -> List[tuple]:
+        """Items that look most like an item, by image embedding, most similar first."""
+        self.get_clothing_item(user_id, item_id)
+        vector = embedding_index.vector(user_id, item_id)
+        if vector is None:
+            raise HTTPException(status_code=409, detail="This item has no image embedding yet")
+        return self._visual_matches(user_id, vector, k, exclude={item_id})
+    
+    def find_similar_to_image(self, user_id: str, image_bytes: bytes, k: int = 10) -> List[tuple]:
+        """Items that look most like an uploaded photo; only the photo goes through the encoder."""
+        try:
+            image = Image.open(io.BytesIO(image_bytes))
+            image.load()
+        except Exception:
+            raise HTTPException(status_code=400, detail="Invalid image")
+        vectors = embed_images([image])
+        if vectors is None:
+            raise HTTPException(status_code=503, detail="Image encoder is not available")
+        return self._visual_matches(user_id, vectors[0], k)
+    
+    def find_duplicates(self, user_id: str, threshold: float = settings.DUPLICATE_SIMILARITY) -> List[tuple]:
+        """Pairs of items that look like the same garment, most similar first."""
+        pairs = embedding_index.duplicates(user_id, threshold)
+        items = self._matched_items(user_id, {item_id for pair in pairs for item_id in pair[:2]})
+        return [(items[a], items[b], score) for a, b, score in pairs if a in items and b in items]
+    
+    def _possible_duplicates(self, user_id: str, item_id: str, vector) -> List[dict]:
+        matches = embedding_index.search(user_id, vector, 5, exclude={item_id})
+        return [
+            {"item_id": other_id, "similarity": round(score, 4)}
+            for other_id, score in matches if score >= settings.DUPLICATE_SIMILARITY
+        ]
+    
     def update_clothing_item(self, user_id: str, item_id: str, update_data: ClothingItemUpdate) -> ClothingItem:
         clothing = self._load_clothing()
         item_index = next((i for i, c in enumerate(clothing) if c['id'] == item_id and c['user_id'] == user_id), None)
@@ -103,6 +304,7 @@ class ClothingService:
         
         clothing[item_index]['updated_at'] = datetime.utcnow().isoformat()
         self._save_clothing(clothing)
+        self._index_item(user_id, clothing[item_index])
         
         return ClothingItem(**clothing[item_index])
     
@@ -120,6 +322,8 @@ class ClothingService:
         clothing[item_index]['is_active'] = False
         clothing[item_index]['updated_at'] = datetime.utcnow().isoformat()
         self._save_clothing(clothing)
+        self._unindex_item(user_id, item_id)
+        embedding_index.remove(user_id, item_id)
     
     async def upload_image(self, user_id: str, item_id: str, file: UploadFile) -> dict:
         # Validate file
@@ -151,8 +355,13 @@ class ClothingService:
         
         original_data_uri = f"data:{mime_type};base64,{original_base64}"
         
-        # Generate thumbnail
-        thumbnail_data_uri = self._generate_thumbnail(contents, mime_type)
+        # Store the image for renditions (one decode makes every size, the thumbnail included) and extract colors
+        display = await asyncio.to_thread(self._store_display_image, contents)
+        fp = await asyncio.to_thread(self._fingerprint, user_id, contents)
+        try:
+            palette = _palette_dicts(extract_palette(contents, PALETTE_SIZE)) or None
+        except Exception:
+            palette = None
         
         # Update clothing item
         clothing = self._load_clothing()
@@ -165,38 +374,175 @@ class ClothingService:
             )
         
         clothing[item_index]['images']['original'] = original_data_uri
-        clothing[item_index]['images']['thumbnail'] = thumbnail_data_uri
+        clothing[item_index]['images']['thumbnail'] = display['thumbnail']
+        clothing[item_index]['images']['key'] = display['key']
+        if palette:
+            clothing[item_index]['color']['palette'] = palette
         clothing[item_index]['updated_at'] = datetime.utcnow().isoformat()
         self._save_clothing(clothing)
+        self._index_item(user_id, clothing[item_index])
         
-        return {"message": "Image uploaded successfully", "data_uri": original_data_uri}
-    
-    def _generate_thumbnail(self, image_bytes: bytes, mime_type: str, size: tuple = (150, 150)) -> str:
-        """Generate a thumbnail from image bytes and return as base64 data URI"""
+        # Embed the garment for visual search and flag look-alikes already in the wardrobe
         try:
-            # Open image from bytes
-            image = Image.open(io.BytesIO(image_bytes))
-            
-            # Convert to RGB if necessary (for JPEG)
-            if image.mode in ('RGBA', 'P'):
-                image = image.convert('RGB')
-            
-            # Generate thumbnail
-            image.thumbnail(size, Image.Resampling.LANCZOS)
-            
-            # Save to bytes
-            output = io.BytesIO()
-            format_name = 'JPEG' if mime_type == 'image/jpeg' else mime_type.split('/')[-1].upper()
-            image.save(output, format=format_name, quality=85)
-            
-            # Convert to base64
-            thumbnail_bytes = output.getvalue()
-            thumbnail_base64 = base64.b64encode(thumbnail_bytes).decode('utf-8')
-            
-            return f"data:{mime_type};base64,{thumbnail_base64}"
+            image = Image.open(io.BytesIO(contents))
         except Exception:
-            # If thumbnail generation fails, return None
-            return None
+            image = None
+        vectors = await asyncio.to_thread(
+            self._index_embeddings, user_id, [item_id], [image] if image else [], [fp] if image else None
+        )
+        possible_duplicates = self._possible_duplicates(user_id, item_id, vectors[0]) if vectors is not None else []
+        
+        return {
+            "message": "Image uploaded successfully",
+            "data_uri": original_data_uri,
+            "possible_duplicates": possible_duplicates
+        }
+    
+    async def bulk_import(self, user_id: str, files: List[UploadFile], category: ClothingCategory) -> BulkImportResponse:
+        """Create one clothing item per uploaded image, removing backgrounds in batches.
+        
+        Every file gets a status entry; a bad file fails on its own and the
+        rest are still imported.
+        """
+        if not files:
+            raise HTTPException(status_code=400, detail="No files provided")
+        if len(files) > settings.BULK_IMPORT_MAX_FILES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Too many files. At most {settings.BULK_IMPORT_MAX_FILES} per import"
+            )
+        
+        statuses = []
+        uploads = []  # (index into statuses, contents, mime type)
+        for file in files:
+            filename = file.filename or "image"
+            file_ext = Path(filename).suffix.lower()
+            contents = await file.read()
+            if file_ext not in settings.ALLOWED_EXTENSIONS:
+                statuses.append(BulkImportItemResult(filename=filename, status="failed", error="File type not allowed"))
+            elif len(contents) > settings.MAX_UPLOAD_SIZE:
+                statuses.append(BulkImportItemResult(filename=filename, status="failed", error="File too large"))
+            else:
+                mime_type = {'.png': 'image/png', '.webp': 'image/webp'}.get(file_ext, 'image/jpeg')
+                uploads.append((len(statuses), contents, mime_type))
+                statuses.append(BulkImportItemResult(filename=filename, status="pending"))
+        
+        items = await asyncio.to_thread(self._build_imported_items, user_id, uploads, statuses, category)
+        if items:
+            clothing = self._load_clothing()
+            clothing.extend(items)
+            self._save_clothing(clothing)
+            for item in items:
+                self._index_item(user_id, item)
+        
+        imported = sum(1 for s in statuses if s.status == "imported")
+        return BulkImportResponse(imported=imported, failed=len(statuses) - imported, items=statuses)
+    
+    def _build_imported_items(self, user_id: str, uploads: list, statuses: List[BulkImportItemResult],
+                              category: ClothingCategory) -> list:
+        """
+        Run batched background removal and encode the item images on a thread pool.
+        
+        Photos already cut out before (the same file or a near-identical one)
+        reuse the stored cut-out and embedding instead of going through the models.
+        """
+        from app.ai.background_removal import BatchItemResult
+        
+        with ThreadPoolExecutor(max_workers=settings.BG_REMOVAL_WORKERS) as pool:
+            fingerprints = list(pool.map(lambda upload: self._fingerprint(user_id, upload[1]), uploads))
+        cutouts = [self._reused_cutout(user_id, fp) for fp in fingerprints]
+        todo = [i for i, cutout in enumerate(cutouts) if cutout is None]
+        removed = iter(self.image_service.remove_background_batch([uploads[i][1] for i in todo]))
+        results = []
+        for cutout in cutouts:
+            if cutout is None:
+                results.append(next(removed))
+            else:
+                image = Image.open(io.BytesIO(cutout)).convert("RGBA")
+                results.append(BatchItemResult(image, image.getchannel("A")))
+        
+        def build(upload, result, fp, cutout):
+            index, contents, mime_type = upload
+            if not result.ok:
+                statuses[index].status, statuses[index].error = "failed", result.error
+                return None
+            try:
+                if cutout is None:
+                    processed = io.BytesIO()
+                    result.image.save(processed, format="PNG")
+                    cutout = processed.getvalue()
+                palette = _palette_dicts(extract_palette(result.image, PALETTE_SIZE, mask=result.mask))
+                display = self._store_display_image(cutout)
+                if fp is not None and display["key"]:
+                    fingerprint_index.set_artifact(fp.sha256, "processed", display["key"].encode())
+                now = datetime.utcnow().isoformat()
+                item = {
+                    "id": str(uuid.uuid4()),
+                    "user_id": user_id,
+                    "name": Path(statuses[index].filename).stem,
+                    "category": category.value,
+                    "subcategory": None,
+                    "brand": None,
+                    "color": {
+                        "primary": palette[0]["hex"] if palette else "unknown",
+                        "secondary": [c["hex"] for c in palette[1:3]] or None,
+                        "palette": palette or None
+                    },
+                    "season": [],
+                    "occasion": [],
+                    "size": None,
+                    "purchase_date": None,
+                    "cost": None,
+                    "tags": [],
+                    "notes": None,
+                    "images": {
+                        "original": f"data:{mime_type};base64,{base64.b64encode(contents).decode('utf-8')}",
+                        "processed": f"data:image/png;base64,{base64.b64encode(cutout).decode('utf-8')}",
+                        "thumbnail": display["thumbnail"],
+                        "key": display["key"]
+                    },
+                    "wear_count": 0,
+                    "last_worn": None,
+                    "is_active": True,
+                    "is_favorite": False,
+                    "created_at": now,
+                    "updated_at": now
+                }
+            except Exception as e:
+                statuses[index].status, statuses[index].error = "failed", f"Processing failed: {e}"
+                return None
+            statuses[index].status, statuses[index].item_id = "imported", item["id"]
+            return item
+        
+        with ThreadPoolExecutor(max_workers=settings.BG_REMOVAL_WORKERS) as pool:
+            items = list(pool.map(build, uploads, results, fingerprints, cutouts))
+        
+        # One batched encoder pass over the cut-out garments that have no stored embedding
+        imported = [(item["id"], result.image, fp) for item, result, fp in zip(items, results, fingerprints)
+                    if item is not None]
+        self._index_embeddings(user_id, [item_id for item_id, _, _ in imported], [image for _, image, _ in imported],
+                               [fp for _, _, fp in imported], "processed_embedding")
+        return [item for item in items if item is not None]
+    
+    def _store_display_image(self, image_bytes: bytes) -> dict:
+        """
+        Store an item's display image in the rendition store and build its thumbnail.
+        
+        Returns:
+            {"key": content hash, "thumbnail": smallest rendition as a data URI};
+            both None if the image cannot be decoded
+        """
+        key = rendition_service.store(image_bytes)
+        fmt = "jpeg" if "jpeg" in rendition_service.formats else rendition_service.formats[0]
+        try:
+            thumbnail = rendition_service.get(key, rendition_service.sizes[-1], fmt).read_bytes()
+        except Exception as e:
+            print(f"Rendition generation failed: {e}")
+            return {"key": None, "thumbnail": None}
+        return {
+            "key": key,
+            "thumbnail": f"data:{RENDITION_MEDIA_TYPES[fmt]};base64,{base64.b64encode(thumbnail).decode('utf-8')}"
+        }
     
     async def process_image(self, user_id: str, item_id: str) -> dict:
         item = self.get_clothing_item(user_id, item_id)
@@ -219,20 +565,39 @@ class ClothingService:
                 detail="Invalid image format"
             )
         
-        # Process image (background removal)
-        processed_image_bytes = await self.image_service.process_clothing_image_bytes(image_bytes)
+        # Process image (background removal), unless this photo or a near-identical one already was
+        fp = await asyncio.to_thread(self._fingerprint, user_id, image_bytes)
+        processed_image_bytes = await asyncio.to_thread(self._reused_cutout, user_id, fp)
+        if processed_image_bytes is None:
+            processed_image_bytes = await self.image_service.process_clothing_image_bytes(image_bytes)
         
         # Convert processed image to base64 data URI
         processed_base64 = base64.b64encode(processed_image_bytes).decode('utf-8')
         processed_data_uri = f"data:{mime_type};base64,{processed_base64}"
         
+        display = await asyncio.to_thread(self._store_display_image, processed_image_bytes)
+        if fp and display['key']:
+            fingerprint_index.set_artifact(fp.sha256, "processed", display['key'].encode())
+        
         # Update clothing item with processed image
         clothing = self._load_clothing()
         item_index = next((i for i, c in enumerate(clothing) if c['id'] == item_id), None)
         
         clothing[item_index]['images']['processed'] = processed_data_uri
+        if display['key']:
+            clothing[item_index]['images']['thumbnail'] = display['thumbnail']
+            clothing[item_index]['images']['key'] = display['key']
+        # The background is gone now, so the palette only covers the garment
+        palette = item_palette(clothing[item_index]['images'])
+        if palette:
+            clothing[item_index]['color']['palette'] = palette
         clothing[item_index]['updated_at'] = datetime.utcnow().isoformat()
         self._save_clothing(clothing)
+        self._index_item(user_id, clothing[item_index])
+        await asyncio.to_thread(
+            self._index_embeddings, user_id, [item_id], [Image.open(io.BytesIO(processed_image_bytes))],
+            [fp], "processed_embedding"
+        )
         
         return {
             "processed_data_uri": processed_data_uri,
@@ -253,5 +618,40 @@ class ClothingService:
         clothing[item_index]['last_worn'] = datetime.utcnow().isoformat()
         clothing[item_index]['updated_at'] = datetime.utcnow().isoformat()
         self._save_clothing(clothing)
+        self._index_item(user_id, clothing[item_index])
+        wear_log.record(user_id, "item", item_id)
         
-        return ClothingItem(**clothing[item_index])
\ No newline at end of file
+        return ClothingItem(**clothing[item_index])
+
+    def get_wear_history(self, user_id: str, item_id: str, start: Optional[date] = None,
+                         end: Optional[date] = None, granularity: str = "month") -> dict:
+        """
+        Wears of one item per day or month, with running totals and cost per wear.
+
+        Wears counted before the wear log existed form a baseline ahead of the
+        first period.
+        """
+        item = self.get_clothing_item(user_id, item_id)
+        if start is None:
+            start, end = default_range(granularity, end)
+        end = end or datetime.utcnow().date()
+        if start > end:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="start must be on or before end")
+        try:
+            counts = wear_log.wear_counts(user_id, start, end, granularity, "item", item_id)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+        logged_total = wear_log.total_before(user_id, "item", item_id, date.max)
+        baseline = max((item.wear_count or 0) - logged_total, 0)
+        cumulative = baseline + wear_log.total_before(user_id, "item", item_id, start)
+        periods = []
+        for period, count in counts:
+            cumulative += count
+            periods.append({
+                "period": period,
+                "count": count,
+                "cumulative": cumulative,
+                "cost_per_wear": round(item.cost / cumulative, 2) if item.cost and cumulative else None,
+            })
+        return {"item_id": item_id, "granularity": granularity, "periods": periods}
\ No newline at end of file
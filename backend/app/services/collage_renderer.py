@@ -0,0 +1,143 @@
+"""
+Outfit collage rendering with a content-addressed cache.
+
+Item images may be data URIs, upload URLs (/api/v1/uploads/...) or paths
+inside UPLOAD_FOLDER. On a thread pool they are read and stored in the
+rendition store. Each cell is read from the image's WebP rendition when
+the cell size is one of RENDITION_SIZES; otherwise it is decoded from the
+source, in draft mode for JPEGs. Cells are pasted onto one preallocated
+canvas.
+
+A collage is stored as `<COLLAGE_DIR>/<key>.<format>`, where the key hashes
+the ordered item image hashes, the layout and the output format. Rendering
+an unchanged outfit again returns the existing file without decoding
+anything.
+"""
+
+import base64
+import hashlib
+import io
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from PIL import Image
+
+from app.config import settings
+from app.services.rendition_service import rendition_service
+
+UPLOADS_URL_PREFIX = "/api/v1/uploads/"
+COLLAGE_FORMATS = {"webp": "WEBP", "png": "PNG"}
+
+
+@dataclass(frozen=True)
+class CollageLayout:
+    """A grid of square cells; each image is fitted and centered in its cell."""
+    cell: int = 400
+    gap: int = 20
+    columns: int = 3
+
+    def canvas_size(self, n_items: int) -> Tuple[int, int]:
+        cols = min(self.columns, n_items)
+        rows = (n_items + cols - 1) // cols
+        return cols * self.cell + (cols - 1) * self.gap, rows * self.cell + (rows - 1) * self.gap
+
+    def position(self, index: int, size: Tuple[int, int]) -> Tuple[int, int]:
+        row, col = divmod(index, self.columns)
+        return (col * (self.cell + self.gap) + (self.cell - size[0]) // 2,
+                row * (self.cell + self.gap) + (self.cell - size[1]) // 2)
+
+    def key(self) -> str:
+        return f"{self.cell}:{self.gap}:{self.columns}"
+
+
+DEFAULT_LAYOUT = CollageLayout()
+
+
+def read_image_ref(ref: str) -> bytes:
+    """Encoded bytes of a data URI, upload URL or path inside UPLOAD_FOLDER."""
+    if ref.startswith("data:"):
+        return base64.b64decode(ref.split(",", 1)[1])
+    upload_root = Path(settings.UPLOAD_FOLDER).resolve()
+    path = upload_root / ref[len(UPLOADS_URL_PREFIX):] if ref.startswith(UPLOADS_URL_PREFIX) else Path(ref)
+    path = path.resolve()
+    if not path.is_relative_to(upload_root):
+        raise ValueError(f"Image is outside the upload folder: {ref}")
+    return path.read_bytes()
+
+
+def decode_cell(data: bytes, cell: int) -> Image.Image:
+    """Decode an image scaled to fit a cell x cell square, as RGBA."""
+    img = Image.open(io.BytesIO(data))
+    if img.format == "JPEG":
+        # DCT scaling picks the smallest 1/2^n size that still covers the cell
+        img.draft("RGB", (cell, cell))
+    img.thumbnail((cell, cell), Image.Resampling.LANCZOS)
+    return img.convert("RGBA")
+
+
+class CollageRenderer:
+    """Parallel collage renderer with an on-disk cache keyed by content."""
+
+    def __init__(self, cache_dir: str = settings.COLLAGE_DIR, output_format: str = settings.COLLAGE_FORMAT,
+                 workers: int = settings.COLLAGE_WORKERS, quality: int = settings.COLLAGE_QUALITY):
+        if output_format not in COLLAGE_FORMATS:
+            raise ValueError(f"Unknown collage format: {output_format}. Choose from: {list(COLLAGE_FORMATS)}")
+        self.cache_dir = Path(cache_dir)
+        self.output_format = output_format
+        self.quality = quality
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="collage")
+
+    def cache_key(self, image_keys: List[str], layout: CollageLayout = DEFAULT_LAYOUT) -> str:
+        """Hash of the item image hashes (rendition keys) in order, the layout and the format."""
+        digest = hashlib.sha256(f"{layout.key()}|{self.output_format}".encode())
+        for key in image_keys:
+            digest.update(bytes.fromhex(key))
+        return digest.hexdigest()
+
+    @staticmethod
+    def _cell(image_key: str, cell: int) -> Image.Image:
+        if cell in rendition_service.sizes and "webp" in rendition_service.formats:
+            with Image.open(rendition_service.get(image_key, cell, "webp")) as img:
+                return img.convert("RGBA")
+        return decode_cell(rendition_service.source_path(image_key).read_bytes(), cell)
+
+    def cached_path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.{self.output_format}"
+
+    def render(self, image_refs: List[str], layout: Optional[CollageLayout] = None) -> Path:
+        """
+        Render the collage of the given images, or return the cached one.
+
+        Args:
+            image_refs: Item images in display order
+            layout: Grid layout (DEFAULT_LAYOUT if omitted)
+
+        Returns:
+            Path of the collage file
+        """
+        layout = layout or DEFAULT_LAYOUT
+        image_keys = list(self._pool.map(lambda ref: rendition_service.store(read_image_ref(ref)), image_refs))
+        path = self.cached_path(self.cache_key(image_keys, layout))
+        if path.exists():
+            return path
+
+        cells = list(self._pool.map(lambda key: self._cell(key, layout.cell), image_keys))
+        canvas = Image.new("RGBA", layout.canvas_size(len(cells)), (255, 255, 255, 0))
+        for index, img in enumerate(cells):
+            canvas.paste(img, layout.position(index, img.size))
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f".{uuid.uuid4().hex}.tmp")
+        if self.output_format == "webp":
+            canvas.save(tmp_path, COLLAGE_FORMATS["webp"], quality=self.quality, method=4)
+        else:
+            canvas.save(tmp_path, COLLAGE_FORMATS["png"])
+        os.replace(tmp_path, path)
+        return path
+
+
+collage_renderer = CollageRenderer()
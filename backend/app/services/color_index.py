@@ -0,0 +1,182 @@
+"""
+In-memory color similarity index over each user's wardrobe.
+
+Every item is a fixed-size row of palette colors in CIELAB (padded, so one
+vectorized distance pass ranks the whole wardrobe). A user's index is built
+from the clothing store on first query and kept current by the clothing
+service on create/update/delete, so queries never re-read the store.
+"""
+
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.utils.color import hex_to_lab, hexes_to_lab
+
+# Palette entries kept per item
+COLORS_PER_ITEM = 5
+# Palette colors covering less of the garment than this are ignored
+MIN_COLOR_WEIGHT = 0.05
+# Hue rotations (degrees in the a*b* plane) matched for each query mode
+COLOR_MODES = {
+    "similar": (0.0,),
+    "complementary": (180.0,),
+    "analogous": (-30.0, 0.0, 30.0),
+    "triadic": (-120.0, 120.0),
+}
+_HEX_RE = re.compile(r"^#?[0-9a-fA-F]{6}$")
+# Distance of padding slots; larger than any real Lab distance
+_FAR = 1e4
+
+
+def is_hex_color(value: str) -> bool:
+    return bool(value) and bool(_HEX_RE.match(value))
+
+
+def item_hex_colors(item: dict) -> List[str]:
+    """Hex colors indexed for an item: its palette, or the primary color when it is a hex."""
+    color = item.get('color') or {}
+    palette = [c for c in (color.get('palette') or []) if c.get('weight', 0) >= MIN_COLOR_WEIGHT]
+    hexes = [c['hex'] for c in palette[:COLORS_PER_ITEM] if is_hex_color(c.get('hex', ''))]
+    if not hexes and is_hex_color(color.get('primary', '')):
+        hexes = [color['primary']]
+    return hexes
+
+
+def rotate_hue(lab: np.ndarray, degrees: float) -> np.ndarray:
+    """Rotate a Lab color around the L axis, keeping lightness and chroma."""
+    theta = np.deg2rad(degrees)
+    a, b = lab[1], lab[2]
+    return np.array([lab[0], a * np.cos(theta) - b * np.sin(theta), a * np.sin(theta) + b * np.cos(theta)],
+                    dtype=np.float32)
+
+
+class _UserColorIndex:
+    """Padded (items, COLORS_PER_ITEM, 3) Lab array with free-row reuse."""
+
+    def __init__(self, capacity: int = 64):
+        self.colors = np.full((capacity, COLORS_PER_ITEM, 3), _FAR, dtype=np.float32)
+        # Squared norms of the colors, for the matmul form of the distance
+        self.sqnorms = (self.colors ** 2).sum(axis=2)
+        self.active = np.zeros(capacity, dtype=bool)
+        self.categories = np.full(capacity, None, dtype=object)
+        self.items: List[Optional[dict]] = [None] * capacity
+        self.rows: Dict[str, int] = {}
+        self.free: List[int] = list(range(capacity - 1, -1, -1))
+
+    def _grow(self):
+        capacity = len(self.items)
+        self.colors = np.concatenate([self.colors, np.full_like(self.colors, _FAR)])
+        self.sqnorms = np.concatenate([self.sqnorms, np.full_like(self.sqnorms, self.sqnorms.max())])
+        self.active = np.concatenate([self.active, np.zeros(capacity, dtype=bool)])
+        self.categories = np.concatenate([self.categories, np.full(capacity, None, dtype=object)])
+        self.items.extend([None] * capacity)
+        self.free.extend(range(2 * capacity - 1, capacity - 1, -1))
+
+    def upsert(self, item: dict, lab: Optional[np.ndarray] = None):
+        if lab is None:
+            lab = hexes_to_lab(item_hex_colors(item))
+        if not item.get('is_active', True) or len(lab) == 0:
+            self.remove(item['id'])
+            return
+        row = self.rows.get(item['id'])
+        if row is None:
+            if not self.free:
+                self._grow()
+            row = self.free.pop()
+            self.rows[item['id']] = row
+        self.colors[row] = _FAR
+        self.colors[row, :len(lab)] = lab
+        self.sqnorms[row] = (self.colors[row] ** 2).sum(axis=1)
+        self.active[row] = True
+        self.categories[row] = item.get('category')
+        self.items[row] = item
+
+    def remove(self, item_id: str):
+        row = self.rows.pop(item_id, None)
+        if row is not None:
+            self.colors[row] = _FAR
+            self.active[row] = False
+            self.categories[row] = None
+            self.items[row] = None
+            self.free.append(row)
+
+    def query(self, targets: np.ndarray, k: int, category: Optional[str]) -> List[Tuple[dict, float]]:
+        # Squared distance from every palette color to every target as
+        # |c|^2 - 2 c.t + |t|^2, then the closest per item
+        cross = self.colors.reshape(-1, 3) @ targets.T
+        distances = (self.sqnorms.reshape(-1, 1) - 2.0 * cross + (targets ** 2).sum(axis=1))
+        distances = distances.reshape(len(self.items), -1).min(axis=1)
+        distances[~self.active] = np.inf
+        if category is not None:
+            distances[self.categories != category] = np.inf
+
+        candidates = int(np.count_nonzero(np.isfinite(distances)))
+        k = min(k, candidates)
+        if k <= 0:
+            return []
+        top = np.argpartition(distances, k - 1)[:k]
+        top = top[np.argsort(distances[top], kind='stable')]
+        return [(self.items[row], float(np.sqrt(max(distances[row], 0.0)))) for row in top]
+
+
+class ColorIndex:
+    """Per-user color indexes, shared by the clothing service instances."""
+
+    def __init__(self):
+        self._users: Dict[str, _UserColorIndex] = {}
+        self._lock = threading.Lock()
+
+    def is_built(self, user_id: str) -> bool:
+        return user_id in self._users
+
+    def build(self, user_id: str, items: List[dict]):
+        index = _UserColorIndex(capacity=max(64, 1 << max(len(items) - 1, 0).bit_length()))
+        hexes = [item_hex_colors(item) for item in items]
+        # One color conversion for the whole wardrobe
+        lab = hexes_to_lab([h for item_hexes in hexes for h in item_hexes])
+        offsets = np.cumsum([0] + [len(item_hexes) for item_hexes in hexes])
+        for i, item in enumerate(items):
+            index.upsert(item, lab[offsets[i]:offsets[i + 1]])
+        with self._lock:
+            self._users[user_id] = index
+
+    def upsert(self, user_id: str, item: dict):
+        """Add or refresh an item; a no-op until the user's index is built."""
+        with self._lock:
+            index = self._users.get(user_id)
+            if index is not None:
+                index.upsert(item)
+
+    def remove(self, user_id: str, item_id: str):
+        with self._lock:
+            index = self._users.get(user_id)
+            if index is not None:
+                index.remove(item_id)
+
+    def search(self, user_id: str, hex_color: str, k: int = 20, mode: str = "similar",
+               category: Optional[str] = None) -> List[Tuple[dict, float]]:
+        """
+        Items whose palette is closest to a color, or to its harmonies.
+
+        Args:
+            user_id: Owner of the wardrobe (the index must be built)
+            hex_color: Query color, '#rrggbb'
+            k: Maximum number of items
+            mode: One of COLOR_MODES
+            category: Optional category filter
+
+        Returns:
+            [(item record, Lab distance)], closest first
+        """
+        if mode not in COLOR_MODES:
+            raise ValueError(f"Unknown color mode: {mode}. Choose from: {list(COLOR_MODES)}")
+        base = hex_to_lab(hex_color if hex_color.startswith('#') else f'#{hex_color}')
+        targets = np.stack([rotate_hue(base, degrees) for degrees in COLOR_MODES[mode]])
+        with self._lock:
+            return self._users[user_id].query(targets, k, category)
+
+
+color_index = ColorIndex()
@@ -0,0 +1,221 @@
+"""
+Per-user garment embedding matrices, memory-mapped from disk.
+
+Each user has `<user_id>.f16`, a (capacity, dim) float16 matrix of unit-length
+embeddings, and `<user_id>.json` with the dimension and the item id stored in
+each row (null for free rows). Rows of removed items are zeroed and reused.
+Similarity search is one matmul over the mapped matrix, so only the query
+embedding ever needs the model.
+"""
+
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.config import settings
+
+# Rows converted to float32 and scored per matmul (cache-sized blocks)
+SEARCH_CHUNK_ROWS = 2048
+# Rows per block when comparing a wardrobe against itself
+DUPLICATE_BLOCK_ROWS = 1024
+_INITIAL_CAPACITY = 64
+
+
+class _UserEmbeddings:
+    def __init__(self, base: Path):
+        self.matrix_path = base.with_suffix('.f16')
+        self.meta_path = base.with_suffix('.json')
+        self.dim: Optional[int] = None
+        self.ids: List[Optional[str]] = []
+        self.matrix: Optional[np.memmap] = None
+        if self.meta_path.exists() and self.matrix_path.exists():
+            meta = json.loads(self.meta_path.read_text())
+            self.dim, self.ids = meta['dim'], meta['ids']
+            self.matrix = np.memmap(self.matrix_path, dtype=np.float16, mode='r+').reshape(-1, self.dim)
+        self.rows: Dict[str, int] = {item_id: row for row, item_id in enumerate(self.ids) if item_id}
+        self.free: List[int] = [row for row, item_id in enumerate(self.ids) if not item_id]
+        self.active = np.zeros(0 if self.matrix is None else len(self.matrix), dtype=bool)
+        self.active[list(self.rows.values())] = True
+
+    def _open(self, dim: int, capacity: int):
+        """(Re)create the matrix file with `capacity` rows, keeping the stored rows."""
+        tmp_path = self.matrix_path.with_suffix('.f16.tmp')
+        matrix = np.memmap(tmp_path, dtype=np.float16, mode='w+', shape=(capacity, dim))
+        if self.matrix is not None:
+            matrix[:len(self.matrix)] = self.matrix
+        matrix.flush()
+        del matrix
+        self.matrix = None
+        os.replace(tmp_path, self.matrix_path)
+        self.matrix = np.memmap(self.matrix_path, dtype=np.float16, mode='r+').reshape(-1, dim)
+        self.dim = dim
+        self.active = np.concatenate([self.active, np.zeros(capacity - len(self.active), dtype=bool)])
+
+    def _save_meta(self):
+        tmp_path = self.meta_path.with_suffix('.json.tmp')
+        tmp_path.write_text(json.dumps({'dim': self.dim, 'ids': self.ids}))
+        os.replace(tmp_path, self.meta_path)
+
+    def _row_for(self, item_id: str) -> int:
+        row = self.rows.get(item_id)
+        if row is not None:
+            return row
+        if self.free:
+            row = self.free.pop()
+        else:
+            row = len(self.ids)
+            self.ids.append(None)
+            if row >= len(self.matrix):
+                self._open(self.dim, 2 * len(self.matrix))
+        self.ids[row] = item_id
+        self.rows[item_id] = row
+        self.active[row] = True
+        return row
+
+    def upsert(self, item_ids: List[str], vectors: np.ndarray):
+        if self.matrix is None:
+            self._open(vectors.shape[1], max(_INITIAL_CAPACITY, len(item_ids)))
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match the stored {self.dim}")
+        for item_id, vector in zip(item_ids, vectors):
+            row = self._row_for(item_id)  # may grow (and remap) the matrix
+            self.matrix[row] = vector
+        self.matrix.flush()
+        self._save_meta()
+
+    def remove(self, item_id: str):
+        row = self.rows.pop(item_id, None)
+        if row is None:
+            return
+        self.matrix[row] = 0
+        self.matrix.flush()
+        self.ids[row] = None
+        self.active[row] = False
+        self.free.append(row)
+        self._save_meta()
+
+    def active_rows(self) -> np.ndarray:
+        return np.flatnonzero(self.active)
+
+
+class EmbeddingIndex:
+    """Garment embeddings of every user, loaded on first use."""
+
+    def __init__(self, root: str = settings.EMBEDDINGS_DIR):
+        self.root = Path(root)
+        self._users: Dict[str, _UserEmbeddings] = {}
+        self._lock = threading.Lock()
+
+    def _user(self, user_id: str) -> _UserEmbeddings:
+        index = self._users.get(user_id)
+        if index is None:
+            self.root.mkdir(parents=True, exist_ok=True)
+            index = self._users[user_id] = _UserEmbeddings(self.root / user_id)
+        return index
+
+    def upsert(self, user_id: str, item_ids: List[str], vectors: np.ndarray):
+        """Store (or replace) one unit-length embedding per item."""
+        if not item_ids:
+            return
+        with self._lock:
+            self._user(user_id).upsert(item_ids, np.asarray(vectors, dtype=np.float16))
+
+    def remove(self, user_id: str, item_id: str):
+        with self._lock:
+            self._user(user_id).remove(item_id)
+
+    def item_ids(self, user_id: str) -> set:
+        with self._lock:
+            return set(self._user(user_id).rows)
+
+    def vector(self, user_id: str, item_id: str) -> Optional[np.ndarray]:
+        with self._lock:
+            index = self._user(user_id)
+            row = index.rows.get(item_id)
+            return None if row is None else np.array(index.matrix[row], dtype=np.float32)
+
+    def vectors(self, user_id: str, item_ids: List[str]) -> Tuple[Optional[np.ndarray], np.ndarray]:
+        """(n, dim) float32 embeddings of the given items (zero rows where missing) and a has-embedding mask."""
+        with self._lock:
+            index = self._user(user_id)
+            rows = np.array([index.rows.get(item_id, -1) for item_id in item_ids], dtype=np.intp)
+            present = rows >= 0
+            if index.matrix is None or not present.any():
+                return None, present
+            vectors = np.zeros((len(item_ids), index.dim), dtype=np.float32)
+            vectors[present] = index.matrix[rows[present]]
+            return vectors, present
+
+    def search(self, user_id: str, query: np.ndarray, k: int = 10,
+               exclude: Optional[set] = None) -> List[Tuple[str, float]]:
+        """
+        Items with the most similar embeddings.
+
+        Args:
+            user_id: Owner of the wardrobe
+            query: Unit-length query embedding
+            k: Maximum number of items
+            exclude: Item ids left out (e.g. the query item itself)
+
+        Returns:
+            [(item id, cosine similarity)], most similar first
+        """
+        with self._lock:
+            index = self._user(user_id)
+            if index.matrix is None:
+                return []
+            query = np.asarray(query, dtype=np.float32)
+            used = len(index.ids)
+            scores = np.empty(used, dtype=np.float32)
+            block = np.empty((min(SEARCH_CHUNK_ROWS, used), index.dim), dtype=np.float32)
+            for start in range(0, used, SEARCH_CHUNK_ROWS):
+                end = min(start + SEARCH_CHUNK_ROWS, used)
+                chunk = block[:end - start]
+                chunk[...] = index.matrix[start:end]
+                np.dot(chunk, query, out=scores[start:end])
+            valid = index.active[:used].copy()
+            for item_id in exclude or ():
+                row = index.rows.get(item_id)
+                if row is not None:
+                    valid[row] = False
+            ids = list(index.ids)
+
+        scores[~valid] = -np.inf
+        k = min(k, int(valid.sum()))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        # float16 rounding can put a score a hair above 1
+        return [(ids[row], min(float(scores[row]), 1.0)) for row in top]
+
+    def duplicates(self, user_id: str, threshold: float = settings.DUPLICATE_SIMILARITY) -> List[Tuple[str, str, float]]:
+        """
+        Pairs of items whose embeddings are at least `threshold` similar.
+
+        Returns:
+            [(item id, item id, cosine similarity)], most similar first
+        """
+        with self._lock:
+            index = self._user(user_id)
+            if index.matrix is None:
+                return []
+            rows = index.active_rows()
+            vectors = np.asarray(index.matrix[rows], dtype=np.float32)
+            ids = [index.ids[row] for row in rows]
+
+        pairs = []
+        for start in range(0, len(rows), DUPLICATE_BLOCK_ROWS):
+            block = vectors[start:start + DUPLICATE_BLOCK_ROWS] @ vectors[start:].T
+            # Each pair once: only columns after the row's own
+            for i, j in zip(*np.nonzero(np.triu(block >= threshold, k=1))):
+                pairs.append((ids[start + i], ids[start + j], min(float(block[i, j]), 1.0)))
+        pairs.sort(key=lambda pair: -pair[2])
+        return pairs
+
+
+embedding_index = EmbeddingIndex()
@@ -0,0 +1,175 @@
+"""
+Upload fingerprints and the derived artifacts they link to.
+
+Every ingested garment or person photo is fingerprinted (SHA-256, pHash and
+dHash; see app/utils/image_hash.py) and recorded per user and kind.
+Expensive results computed from an upload -- the background-removed
+cut-out, garment embeddings, person masks and keypoints -- are stored as
+artifacts under the upload's SHA-256. A later upload that is identical, or
+within FINGERPRINT_MAX_DISTANCE bits on both perceptual hashes with the same
+aspect ratio, reuses those artifacts instead of recomputing them.
+
+Fingerprints are stored in SQLite and mirrored per user and kind in numpy
+arrays, so matching is one vectorized XOR/popcount over the user's uploads.
+"""
+
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.config import settings
+from app.utils.image_hash import ImageFingerprint, hamming_distances
+
+FINGERPRINT_KINDS = ("garment", "person")
+# Relative aspect-ratio difference still treated as the same photo (masks and keypoints are spatial)
+ASPECT_TOLERANCE = 0.01
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS fingerprints (
+    user_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    sha256 TEXT NOT NULL,
+    phash INTEGER NOT NULL,
+    dhash INTEGER NOT NULL,
+    width INTEGER NOT NULL,
+    height INTEGER NOT NULL,
+    PRIMARY KEY (user_id, kind, sha256)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS artifacts (
+    sha256 TEXT NOT NULL,
+    name TEXT NOT NULL,
+    value BLOB NOT NULL,
+    PRIMARY KEY (sha256, name)
+) WITHOUT ROWID;
+"""
+
+
+def _to_signed(h: int) -> int:
+    """SQLite integers are signed 64-bit."""
+    return h - (1 << 64) if h >= 1 << 63 else h
+
+
+class _UserFingerprints:
+    def __init__(self):
+        self.shas: List[str] = []
+        self.positions: Dict[str, int] = {}
+        self._rows: List[Tuple[int, int, float]] = []  # (phash, dhash, aspect)
+        self._arrays: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None
+
+    def add(self, sha256: str, phash: int, dhash: int, aspect: float):
+        if sha256 in self.positions:
+            return
+        self.positions[sha256] = len(self.shas)
+        self.shas.append(sha256)
+        self._rows.append((phash, dhash, aspect))
+        self._arrays = None
+
+    def matches(self, fp: ImageFingerprint, max_distance: int) -> List[Tuple[str, int]]:
+        if self._arrays is None:
+            self._arrays = (np.array([r[0] for r in self._rows], dtype=np.uint64),
+                            np.array([r[1] for r in self._rows], dtype=np.uint64),
+                            np.array([r[2] for r in self._rows], dtype=np.float64))
+        phashes, dhashes, aspects = self._arrays
+        distance = np.maximum(hamming_distances(phashes, fp.phash), hamming_distances(dhashes, fp.dhash))
+        aspect = fp.width / fp.height
+        close = (distance <= max_distance) & (np.abs(aspects / aspect - 1.0) <= ASPECT_TOLERANCE)
+        found = [(self.shas[i], int(distance[i])) for i in np.flatnonzero(close)]
+        # Byte-identical first, then nearest
+        return sorted(found, key=lambda m: (m[0] != fp.sha256, m[1]))
+
+
+class FingerprintIndex:
+    """Per-user upload fingerprints and per-content artifacts in SQLite."""
+
+    def __init__(self, db_path: str = settings.FINGERPRINT_DB,
+                 max_distance: int = settings.FINGERPRINT_MAX_DISTANCE):
+        self.db_path = db_path
+        self.max_distance = max_distance
+        self._conn: Optional[sqlite3.Connection] = None
+        self._users: Dict[Tuple[str, str], _UserFingerprints] = {}
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+        return self._conn
+
+    def _user(self, user_id: str, kind: str) -> _UserFingerprints:
+        if kind not in FINGERPRINT_KINDS:
+            raise ValueError(f"Unknown fingerprint kind: {kind}. Choose from: {list(FINGERPRINT_KINDS)}")
+        index = self._users.get((user_id, kind))
+        if index is None:
+            index = self._users[(user_id, kind)] = _UserFingerprints()
+            rows = self._connection().execute(
+                "SELECT sha256, phash, dhash, width, height FROM fingerprints WHERE user_id = ? AND kind = ?",
+                (user_id, kind),
+            )
+            for sha256, p, d, width, height in rows:
+                index.add(sha256, p & (2 ** 64 - 1), d & (2 ** 64 - 1), width / height)
+        return index
+
+    def add(self, user_id: str, kind: str, fp: ImageFingerprint):
+        """Record an upload's fingerprint (idempotent)."""
+        with self._lock:
+            index = self._user(user_id, kind)
+            if fp.sha256 in index.positions:
+                return
+            conn = self._connection()
+            with conn:
+                conn.execute(
+                    "INSERT OR IGNORE INTO fingerprints VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (user_id, kind, fp.sha256, _to_signed(fp.phash), _to_signed(fp.dhash), fp.width, fp.height),
+                )
+            index.add(fp.sha256, fp.phash, fp.dhash, fp.width / fp.height)
+
+    def matches(self, user_id: str, kind: str, fp: ImageFingerprint) -> List[Tuple[str, int]]:
+        """(sha256, Hamming distance) of the user's identical or near-identical uploads, closest first."""
+        with self._lock:
+            return self._user(user_id, kind).matches(fp, self.max_distance)
+
+    def set_artifact(self, sha256: str, name: str, value: bytes):
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.execute("INSERT OR REPLACE INTO artifacts VALUES (?, ?, ?)", (sha256, name, value))
+
+    def get_artifact(self, sha256: str, name: str) -> Optional[bytes]:
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT value FROM artifacts WHERE sha256 = ? AND name = ?", (sha256, name)
+            ).fetchone()
+        return row[0] if row else None
+
+    def reuse(self, user_id: str, kind: str, fp: Optional[ImageFingerprint], name: str) -> Optional[bytes]:
+        """
+        An artifact computed for this upload or the closest matching earlier one.
+
+        Args:
+            user_id: Uploader
+            kind: "garment" or "person"
+            fp: Fingerprint of the new upload (None: nothing to match)
+            name: Artifact name
+
+        Returns:
+            The artifact value, or None when no match has it
+        """
+        if fp is None:
+            return None
+        candidates = [sha for sha, _ in self.matches(user_id, kind, fp)]
+        if fp.sha256 not in candidates:
+            candidates.insert(0, fp.sha256)
+        with self._lock:
+            rows = dict(self._connection().execute(
+                f"SELECT sha256, value FROM artifacts WHERE name = ? AND sha256 IN ({', '.join('?' * len(candidates))})",
+                (name, *candidates),
+            ).fetchall())
+        return next((rows[sha] for sha in candidates if sha in rows), None)
+
+
+fingerprint_index = FingerprintIndex()
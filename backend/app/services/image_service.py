@@ -1,15 +1,17 @@
+import io
 import os
 import asyncio
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Dict, List, Optional
 from PIL import Image
-import numpy as np
+from app.config import settings
 from app.config.model_paths import get_model_path, verify_models
 
 class ImageService:
     def __init__(self):
         self.thumbnail_size = (300, 300)
         self.max_image_size = (1200, 1200)
+        self.bg_remover = None
         models_status = verify_models()
         self.u2net_available = models_status.get("u2net", {}).get("model", False)
         
@@ -23,7 +25,13 @@ class ImageService:
             
             # Try portrait model first (smaller, faster)
             try:
-                self.bg_remover = BackgroundRemoval(model_name="u2netp")
+                self.bg_remover = BackgroundRemoval(
+                    model_name="u2netp",
+                    batch_size=settings.BG_REMOVAL_BATCH_SIZE,
+                    num_workers=settings.BG_REMOVAL_WORKERS,
+                    mask_upsampling=settings.BG_REMOVAL_UPSAMPLING,
+                    soft_alpha=settings.BG_REMOVAL_SOFT_ALPHA,
+                )
                 if self.bg_remover.processor and self.bg_remover.processor.model is not None:
                     self.u2net_available = True
                     print("✅ U-2-Net Portrait model loaded successfully")
@@ -33,7 +41,13 @@ class ImageService:
             
             # Fall back to full model
             try:
-                self.bg_remover = BackgroundRemoval(model_name="u2net")
+                self.bg_remover = BackgroundRemoval(
+                    model_name="u2net",
+                    batch_size=settings.BG_REMOVAL_BATCH_SIZE,
+                    num_workers=settings.BG_REMOVAL_WORKERS,
+                    mask_upsampling=settings.BG_REMOVAL_UPSAMPLING,
+                    soft_alpha=settings.BG_REMOVAL_SOFT_ALPHA,
+                )
                 if self.bg_remover.processor and self.bg_remover.processor.model is not None:
                     self.u2net_available = True
                     print("✅ U-2-Net full model loaded successfully")
@@ -112,63 +126,54 @@ class ImageService:
             print(f"Background removal failed: {e}")
             return image_path
     
+    def remove_background_batch(self, images: List[bytes]) -> list:
+        """
+        Remove backgrounds from encoded images in batches.
+        
+        Returns:
+            One BatchItemResult per input; without U-2-Net the decoded image
+            is returned with a full mask
+        """
+        from app.ai.background_removal import BatchItemResult, decode_image
+        
+        if self.u2net_available and self.bg_remover:
+            return self.bg_remover.remove_background_batch(images)
+        
+        results = []
+        for image_bytes in images:
+            try:
+                image = decode_image(image_bytes)
+                results.append(BatchItemResult(image, Image.new('L', image.size, 255)))
+            except Exception as e:
+                results.append(BatchItemResult(error=f"Could not decode image: {e}"))
+        return results
+    
+    async def process_clothing_image_bytes(self, image_bytes: bytes) -> bytes:
+        """Remove the background from an encoded image and return it as PNG bytes."""
+        result = (await asyncio.to_thread(self.remove_background_batch, [image_bytes]))[0]
+        if not result.ok:
+            raise ValueError(result.error)
+        output = io.BytesIO()
+        result.image.save(output, format="PNG")
+        return output.getvalue()
+    
     def extract_dominant_colors(self, image_path: str, n_colors: int = 5) -> list:
         """Extract dominant colors from image"""
-        from sklearn.cluster import KMeans
+        from app.utils.color import extract_palette
         
         with Image.open(image_path) as img:
-            # Resize for faster processing
-            img.thumbnail((150, 150))
-            img = img.convert('RGB')
-            
-            # Convert to numpy array
-            pixels = np.array(img).reshape(-1, 3)
-            
-            # Use KMeans to find dominant colors
-            kmeans = KMeans(n_clusters=n_colors, random_state=42)
-            kmeans.fit(pixels)
-            
-            # Get colors as hex
-            colors = []
-            for color in kmeans.cluster_centers_:
-                hex_color = '#{:02x}{:02x}{:02x}'.format(
-                    int(color[0]), int(color[1]), int(color[2])
-                )
-                colors.append(hex_color)
-            
-            return colors
+            return [hex_color for hex_color, _ in extract_palette(img, n_colors)]
     
-    def create_outfit_collage(self, item_paths: list, output_path: str) -> str:
-        """Create a collage from multiple clothing items"""
-        images = []
-        for path in item_paths:
-            with Image.open(path) as img:
-                img.thumbnail((400, 400))
-                images.append(img.copy())
+    def create_outfit_collage(self, item_images: list) -> str:
+        """
+        Create (or reuse) a collage of clothing item images.
         
-        # Calculate collage size
-        n_items = len(images)
-        cols = min(3, n_items)
-        rows = (n_items + cols - 1) // cols
+        Args:
+            item_images: Data URIs, upload URLs or upload paths, in display order
         
-        collage_width = cols * 400 + (cols - 1) * 20
-        collage_height = rows * 400 + (rows - 1) * 20
-        
-        # Create collage
-        collage = Image.new('RGBA', (collage_width, collage_height), (255, 255, 255, 0))
-        
-        for idx, img in enumerate(images):
-            row = idx // cols
-            col = idx % cols
-            x = col * (400 + 20)
-            y = row * (400 + 20)
-            
-            # Center image in its space
-            x_offset = (400 - img.width) // 2
-            y_offset = (400 - img.height) // 2
-            
-            collage.paste(img, (x + x_offset, y + y_offset))
+        Returns:
+            Path of the collage; unchanged outfits reuse the cached file
+        """
+        from app.services.collage_renderer import collage_renderer
         
-        # Save collage
-        collage.save(output_path, 'PNG')
-        return output_path
\ No newline at end of file
+        return str(collage_renderer.render(item_images))
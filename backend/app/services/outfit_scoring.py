@@ -0,0 +1,257 @@
+"""
+Outfit compatibility scoring over whole candidate sets.
+
+Each candidate item becomes a row of features: dominant color in Lab,
+season and occasion one-hots, favorite flag, wear recency, style tags and
+(when stored) its CLIP image embedding. Per-item scores (context fit, style
+preferences, learned preference, recency) are vectors and pairwise scores (color harmony,
+shared seasons and occasions, visual coherence) are matrices from a few
+matmuls, so a tops x bottoms grid is scored in one broadcast. Further slots
+(outerwear) extend only the best BEAM_WIDTH partial outfits instead of the
+full product, and the final top-k comes from argpartition.
+"""
+
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.config.constants import Occasion, Season
+from app.utils.color import dominant_hex, hexes_to_lab, neutrality
+
+# Partial outfits kept when adding another slot
+BEAM_WIDTH = 512
+# Outfits considered for the final diversity pass, per requested outfit
+POOL_FACTOR = 8
+# An item appears in at most this many of the returned outfits
+MAX_ITEM_REPEATS = 2
+# Wear recency penalty halves every this many days
+WEAR_HALF_LIFE_DAYS = 7.0
+
+# Pairwise weights (sum to 1)
+W_COLOR = 0.45
+W_OCCASION = 0.2
+W_SEASON = 0.15
+W_VISUAL = 0.2
+# Per-item weights
+W_CONTEXT = 0.6
+W_STYLE = 0.25
+W_FAVORITE = 0.15
+W_RECENT_WEAR = 0.3
+W_PREFERENCE = 0.3
+# Share of pairwise vs per-item scores in an outfit score
+W_PAIRS = 0.6
+
+_SEASONS = [s.value for s in Season]
+_OCCASIONS = [o.value for o in Occasion]
+
+
+@dataclass
+class ItemFeatures:
+    """Feature rows for one slot's candidate items."""
+    ids: List[str]
+    lightness: np.ndarray   # (n,) L* of the dominant color
+    hue: np.ndarray         # (n, 2) unit a*b* direction, zero for neutrals
+    neutral: np.ndarray     # (n,) 1 for neutral colors, falling to 0 with chroma
+    seasons: np.ndarray     # (n, len(Season)) L2-normalized one-hots
+    occasions: np.ndarray   # (n, len(Occasion)) L2-normalized one-hots
+    favorite: np.ndarray    # (n,)
+    recent_wear: np.ndarray  # (n,) 1 when worn just now, decaying to 0
+    tags: List[set]
+    embeddings: Optional[np.ndarray] = None  # (n, dim) unit rows, zero when missing
+    has_embedding: Optional[np.ndarray] = None
+
+    def __len__(self):
+        return len(self.ids)
+
+
+def _one_hots(values: List[List[str]], vocabulary: List[str]) -> np.ndarray:
+    position = {v: i for i, v in enumerate(vocabulary)}
+    matrix = np.zeros((len(values), len(vocabulary)), dtype=np.float32)
+    for row, item_values in enumerate(values):
+        for value in item_values:
+            column = position.get(getattr(value, 'value', value))
+            if column is not None:
+                matrix[row, column] = 1.0
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-6)
+
+
+def _days_since(timestamp, now: datetime) -> float:
+    if not timestamp:
+        return np.inf
+    if isinstance(timestamp, str):
+        timestamp = datetime.fromisoformat(timestamp)
+    return max((now - timestamp.replace(tzinfo=None)).total_seconds() / 86400.0, 0.0)
+
+
+def item_features(items: List[dict], embeddings: Optional[np.ndarray] = None,
+                  has_embedding: Optional[np.ndarray] = None, now: Optional[datetime] = None) -> ItemFeatures:
+    """
+    Feature rows for item records.
+
+    Args:
+        items: Clothing item records
+        embeddings: Optional (n, dim) image embeddings aligned with `items`
+        has_embedding: Mask of the rows of `embeddings` that are real
+        now: Reference time for wear recency (defaults to utcnow)
+
+    Returns:
+        ItemFeatures
+    """
+    now = now or datetime.utcnow()
+    hexes = [dominant_hex(item) for item in items]
+    known = [i for i, h in enumerate(hexes) if h]
+    lab = np.zeros((len(items), 3), dtype=np.float32)
+    lab[:, 0] = 50.0
+    if known:
+        lab[known] = hexes_to_lab([hexes[i] for i in known])
+    chroma = np.hypot(lab[:, 1], lab[:, 2])
+    hue = lab[:, 1:] / np.maximum(chroma, 1e-6)[:, None]
+    # Unknown colors are treated as neutral
+    neutral = neutrality(lab)
+    hue[neutral >= 1.0] = 0.0
+
+    days = np.array([_days_since(item.get('last_worn'), now) for item in items], dtype=np.float64)
+    return ItemFeatures(
+        ids=[item['id'] for item in items],
+        lightness=lab[:, 0],
+        hue=hue.astype(np.float32),
+        neutral=neutral.astype(np.float32),
+        seasons=_one_hots([item.get('season') or [] for item in items], _SEASONS),
+        occasions=_one_hots([item.get('occasion') or [] for item in items], _OCCASIONS),
+        favorite=np.array([bool(item.get('is_favorite')) for item in items], dtype=np.float32),
+        recent_wear=np.exp2(-days / WEAR_HALF_LIFE_DAYS).astype(np.float32),
+        tags=[({t.lower() for t in (item.get('tags') or [])} | {(item.get('subcategory') or '').lower()}) - {''}
+              for item in items],
+        embeddings=embeddings,
+        has_embedding=has_embedding,
+    )
+
+
+def _overlap(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Cosine overlap of one-hot rows; 0.5 where either item lists nothing."""
+    overlap = a @ b.T
+    empty = (a.sum(axis=1) == 0)[:, None] | (b.sum(axis=1) == 0)[None, :]
+    return np.where(empty, 0.5, overlap)
+
+
+def pair_scores(a: ItemFeatures, b: ItemFeatures) -> np.ndarray:
+    """(len(a), len(b)) compatibility of every item of `a` with every item of `b`, in [0, 1]."""
+    # Hue harmony cos^2(dh): same or opposite hues match, 90 degrees apart clash
+    harmony = (a.hue @ b.hue.T) ** 2
+    neutral = 1.0 - np.outer(1.0 - a.neutral, 1.0 - b.neutral)
+    contrast = np.minimum(np.abs(a.lightness[:, None] - b.lightness[None, :]) / 50.0, 1.0)
+    color = 0.75 * (neutral + (1.0 - neutral) * harmony) + 0.25 * contrast
+
+    if a.embeddings is not None and b.embeddings is not None:
+        visual = np.clip(a.embeddings @ b.embeddings.T, 0.0, 1.0)
+        visual = np.where(np.outer(a.has_embedding, b.has_embedding), visual, 0.5)
+    else:
+        visual = 0.5
+
+    return (W_COLOR * color
+            + W_OCCASION * _overlap(a.occasions, b.occasions)
+            + W_SEASON * _overlap(a.seasons, b.seasons)
+            + W_VISUAL * visual)
+
+
+def unary_scores(f: ItemFeatures, season: Optional[str] = None, occasion: Optional[str] = None,
+                 style_preferences: Optional[Sequence[str]] = None,
+                 preference: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    (n,) per-item scores: context fit, style preferences, favorites and
+    learned preference (logit from the feedback model), minus recent wear.
+    """
+    context = np.ones(len(f), dtype=np.float32)
+    if season is not None:
+        listed = f.seasons.sum(axis=1) > 0
+        fits = (f.seasons[:, _SEASONS.index(season)] > 0) | (f.seasons[:, _SEASONS.index(Season.ALL_SEASON.value)] > 0)
+        context *= np.where(listed, fits, 0.5)
+    if occasion is not None:
+        listed = f.occasions.sum(axis=1) > 0
+        context *= np.where(listed, f.occasions[:, _OCCASIONS.index(occasion)] > 0, 0.5)
+
+    if style_preferences:
+        wanted = {p.lower() for p in style_preferences}
+        style = np.array([len(tags & wanted) / len(wanted) for tags in f.tags], dtype=np.float32)
+    else:
+        style = np.zeros(len(f), dtype=np.float32)
+
+    scores = W_CONTEXT * context + W_STYLE * style + W_FAVORITE * f.favorite - W_RECENT_WEAR * f.recent_wear
+    if preference is not None:
+        scores = scores + W_PREFERENCE * np.tanh(preference)
+    return scores
+
+
+def _outfit_score(unary_sum: np.ndarray, pair_sum: np.ndarray, slots: int) -> np.ndarray:
+    if slots == 1:
+        return np.clip(unary_sum, 0.0, 1.0)
+    pairs = slots * (slots - 1) // 2
+    return np.clip(W_PAIRS * pair_sum / pairs + (1.0 - W_PAIRS) * unary_sum / slots, 0.0, 1.0)
+
+
+def _top(scores: np.ndarray, n: int) -> np.ndarray:
+    """Flat indices of the n best scores, best first."""
+    n = min(n, scores.size)
+    top = np.argpartition(-scores, n - 1)[:n]
+    return top[np.argsort(-scores[top], kind='stable')]
+
+
+def rank_outfits(slots: List[ItemFeatures], unary: List[np.ndarray], k: int,
+                 beam_width: int = BEAM_WIDTH) -> List[Tuple[Tuple[int, ...], float]]:
+    """
+    Best combinations taking one item from every slot.
+
+    Args:
+        slots: Candidate features per slot (e.g. tops, bottoms, outerwear), all non-empty
+        unary: Per-item scores for each slot
+        k: Number of outfits
+        beam_width: Partial outfits kept between slots
+
+    Returns:
+        [(item index per slot, score)], best first; no item is used in more
+        than MAX_ITEM_REPEATS outfits unless there are too few combinations
+        to fill k otherwise
+    """
+    # Beam of partial outfits: item index per slot so far, summed item and pair scores
+    combos = np.arange(len(slots[0]))[:, None]
+    unary_sum = unary[0].astype(np.float32)
+    pair_sum = np.zeros(len(slots[0]), dtype=np.float32)
+
+    for s in range(1, len(slots)):
+        # Every kept partial outfit x every item of the new slot, in one broadcast
+        new_unary = unary_sum[:, None] + unary[s][None, :]
+        new_pairs = pair_sum[:, None]
+        for j in range(s):
+            new_pairs = new_pairs + pair_scores(slots[j], slots[s])[combos[:, j]]
+        scores = _outfit_score(new_unary, new_pairs, s + 1).ravel()
+
+        last = s == len(slots) - 1
+        keep = _top(scores, k * POOL_FACTOR if last else beam_width)
+        rows, columns = np.unravel_index(keep, new_unary.shape)
+        combos = np.column_stack([combos[rows], columns])
+        unary_sum = new_unary[rows, columns]
+        pair_sum = new_pairs[rows, columns]
+
+    scores = _outfit_score(unary_sum, pair_sum, len(slots))
+    order = _top(scores, k * POOL_FACTOR)
+
+    # Greedy pass so the results do not all share one top
+    chosen, uses = [], {}
+    for i in order:
+        keys = [(s, int(item)) for s, item in enumerate(combos[i])]
+        if any(uses.get(key, 0) >= MAX_ITEM_REPEATS for key in keys):
+            continue
+        for key in keys:
+            uses[key] = uses.get(key, 0) + 1
+        chosen.append(i)
+        if len(chosen) == k:
+            break
+    # Small closets cannot be that diverse: fill up with the best remaining outfits
+    if len(chosen) < k:
+        taken = set(chosen)
+        chosen += [i for i in order if i not in taken][:k - len(chosen)]
+        chosen.sort(key=lambda i: -scores[i])
+    return [(tuple(int(item) for item in combos[i]), float(scores[i])) for i in chosen]
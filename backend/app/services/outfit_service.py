@@ -1,15 +1,16 @@
 import os
 import json
+import asyncio
 import uuid
 from datetime import datetime
 from typing import List, Optional
-from pathlib import Path
 from fastapi import HTTPException, status
 from app.models.outfit import Outfit
 from app.schemas.outfit_schemas import OutfitCreate, OutfitUpdate, OutfitFilter
 from app.services.clothing_service import ClothingService
 from app.services.image_service import ImageService
-from app.config import settings
+from app.services.wardrobe_analytics import wardrobe_analytics
+from app.services.wear_log import wear_log
 
 class OutfitService:
     def __init__(self):
@@ -86,6 +87,7 @@ class OutfitService:
         
         outfits.append(outfit_dict)
         self._save_outfits(outfits)
+        wardrobe_analytics.add_outfits(user_id, 1)
         
         return Outfit(**outfit_dict)
     
@@ -152,6 +154,7 @@ class OutfitService:
             )
         
         self._save_outfits(outfits)
+        wardrobe_analytics.add_outfits(user_id, -1)
     
     def mark_as_worn(self, user_id: str, outfit_id: str) -> Outfit:
         outfits = self._load_outfits()
@@ -175,6 +178,7 @@ class OutfitService:
                 pass
         
         self._save_outfits(outfits)
+        wear_log.record(user_id, "outfit", outfit_id)
         
         return self.get_outfit(user_id, outfit_id)
     
@@ -183,11 +187,12 @@ class OutfitService:
         
         # Collect item images
         item_images = []
-        for item in outfit.items or []:
-            if item.get('images', {}).get('processed'):
-                item_images.append(item['images']['processed'])
-            elif item.get('images', {}).get('original'):
-                item_images.append(item['images']['original'])
+        for item in self.clothing_service.get_item_records(user_id, outfit.item_ids):
+            images = item.get('images') or {}
+            if images.get('processed'):
+                item_images.append(images['processed'])
+            elif images.get('original'):
+                item_images.append(images['original'])
         
         if not item_images:
             raise HTTPException(
@@ -195,18 +200,21 @@ class OutfitService:
                 detail="No images available for outfit items"
             )
         
-        # Generate collage
-        output_dir = Path(settings.UPLOAD_FOLDER) / user_id / "outfits" / outfit_id
-        output_dir.mkdir(parents=True, exist_ok=True)
-        
-        collage_path = output_dir / "outfit_collage.png"
-        self.image_service.create_outfit_collage(item_images, str(collage_path))
+        # Generate collage (cached by image content, so unchanged outfits are not re-rendered)
+        try:
+            collage_path = await asyncio.to_thread(self.image_service.create_outfit_collage, item_images)
+        except (ValueError, OSError) as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Could not render outfit images: {e}"
+            )
         
         # Update outfit with image
         outfits = self._load_outfits()
         outfit_index = next((i for i, o in enumerate(outfits) if o['id'] == outfit_id), None)
-        outfits[outfit_index]['image'] = str(collage_path)
-        outfits[outfit_index]['updated_at'] = datetime.utcnow().isoformat()
-        self._save_outfits(outfits)
+        if outfits[outfit_index].get('image') != collage_path:
+            outfits[outfit_index]['image'] = collage_path
+            outfits[outfit_index]['updated_at'] = datetime.utcnow().isoformat()
+            self._save_outfits(outfits)
         
         return {"message": "Outfit image generated", "image_path": str(collage_path)}
\ No newline at end of file
@@ -0,0 +1,148 @@
+"""
+Per-user preference model learned online from recommendation feedback.
+
+An outfit is a sparse set of named features -- its items, their
+categories, seasons, occasions, tags and dominant hue -- and acceptance is
+modeled as logistic regression over them. Each feedback event is one
+AdaGrad step that touches only the outfit's features, and only those rows
+are upserted in SQLite, so an update costs O(features) no matter how much
+feedback the user has given. The recommendation scorer reads an item's
+learned affinity as the sum of its feature weights.
+"""
+
+import math
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from app.config import settings
+from app.utils.color import dominant_hex, hexes_to_lab, neutrality
+
+LEARNING_RATE = 0.5
+# Weight decay applied to the features of each update
+L2 = 1e-3
+# Hue buckets of the dominant color (plus "neutral" below app.utils.color.NEUTRAL_CHROMA)
+HUE_BUCKETS = 8
+BIAS = "bias"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS preference_weights (
+    user_id TEXT NOT NULL,
+    feature TEXT NOT NULL,
+    weight REAL NOT NULL,
+    grad_sq REAL NOT NULL,
+    PRIMARY KEY (user_id, feature)
+) WITHOUT ROWID
+"""
+
+
+def _hue_features(items: List[dict]) -> List[Optional[str]]:
+    """'hue:<bucket>' or 'hue:neutral' per item, None when the color is unknown."""
+    hexes = [dominant_hex(item) for item in items]
+    known = [i for i, h in enumerate(hexes) if h]
+    features: List[Optional[str]] = [None] * len(items)
+    if known:
+        lab = hexes_to_lab([hexes[i] for i in known])
+        neutral = neutrality(lab) > 0
+        buckets = (np.degrees(np.arctan2(lab[:, 2], lab[:, 1])) % 360 // (360 / HUE_BUCKETS)).astype(int)
+        for i, is_neutral, bucket in zip(known, neutral, buckets):
+            features[i] = 'hue:neutral' if is_neutral else f'hue:{bucket}'
+    return features
+
+
+def item_preference_features(items: List[dict]) -> List[List[str]]:
+    """Feature names of each item record."""
+    hues = _hue_features(items)
+    features = []
+    for item, hue in zip(items, hues):
+        names = [f"item:{item['id']}", f"category:{getattr(item.get('category'), 'value', item.get('category'))}"]
+        names += [f"season:{getattr(s, 'value', s)}" for s in item.get('season') or []]
+        names += [f"occasion:{getattr(o, 'value', o)}" for o in item.get('occasion') or []]
+        names += [f"tag:{t.lower()}" for t in item.get('tags') or []]
+        if hue:
+            names.append(hue)
+        features.append(names)
+    return features
+
+
+class PreferenceModel:
+    """Sparse per-user logistic weights, cached in memory and stored in SQLite."""
+
+    def __init__(self, db_path: str = settings.PREFERENCE_DB):
+        self.db_path = db_path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._weights: Dict[str, Dict[str, List[float]]] = {}
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(_SCHEMA)
+        return self._conn
+
+    def _user_weights(self, user_id: str) -> Dict[str, List[float]]:
+        weights = self._weights.get(user_id)
+        if weights is None:
+            rows = self._connection().execute(
+                "SELECT feature, weight, grad_sq FROM preference_weights WHERE user_id = ?", (user_id,)
+            )
+            weights = self._weights[user_id] = {feature: [w, g] for feature, w, g in rows}
+        return weights
+
+    def item_scores(self, user_id: str, items: List[dict]) -> np.ndarray:
+        """(n,) learned affinity of each item: the sum of its feature weights (0 for a new user)."""
+        features = item_preference_features(items)
+        with self._lock:
+            weights = self._user_weights(user_id)
+            if not weights:
+                return np.zeros(len(items), dtype=np.float32)
+            return np.array([sum(weights.get(f, (0.0,))[0] for f in names) for names in features],
+                            dtype=np.float32)
+
+    def update(self, user_id: str, items: List[dict], accepted: bool) -> float:
+        """
+        One online logistic step for a recommended outfit.
+
+        Args:
+            user_id: User who gave the feedback
+            items: Item records of the outfit
+            accepted: Whether the user accepted it
+
+        Returns:
+            The predicted acceptance probability before the update
+        """
+        # Outfit features: the mean of its items' one-hots, plus a bias
+        x: Dict[str, float] = {BIAS: 1.0}
+        for names in item_preference_features(items):
+            for name in names:
+                x[name] = x.get(name, 0.0) + 1.0 / len(items)
+
+        with self._lock:
+            weights = self._user_weights(user_id)
+            logit = sum(weights.get(f, (0.0,))[0] * value for f, value in x.items())
+            p = 1.0 / (1.0 + math.exp(-max(min(logit, 30.0), -30.0)))
+            error = (1.0 if accepted else 0.0) - p
+            rows = []
+            for feature, value in x.items():
+                w, g2 = weights.get(feature, (0.0, 0.0))
+                gradient = error * value - L2 * w
+                g2 += gradient * gradient
+                w += LEARNING_RATE * gradient / math.sqrt(g2 + 1e-8)
+                weights[feature] = [w, g2]
+                rows.append((user_id, feature, w, g2))
+            conn = self._connection()
+            with conn:
+                conn.executemany(
+                    "INSERT INTO preference_weights (user_id, feature, weight, grad_sq) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(user_id, feature) DO UPDATE SET weight = excluded.weight, grad_sq = excluded.grad_sq",
+                    rows,
+                )
+        return p
+
+
+preference_model = PreferenceModel()
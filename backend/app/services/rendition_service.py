@@ -0,0 +1,160 @@
+"""
+Content-addressed image renditions.
+
+An image is stored once under the SHA-256 of its bytes
+(`<RENDITION_DIR>/<key[:2]>/<key>/source`). Its renditions -- every size in
+RENDITION_SIZES (longest edge) in every format in RENDITION_FORMATS -- are
+generated the first time any of them is requested, all from one decode:
+JPEGs are decoded in draft mode close to the largest size, and each smaller
+size is made from the previous one by an integer reduce() followed by a
+LANCZOS resize. Concurrent requests for a key that is being generated wait
+for that generation instead of decoding the source again.
+
+Renditions never change once written, so they are served with immutable
+cache headers at /api/v1/renditions/{key}/{size}.{format}.
+"""
+
+import hashlib
+import os
+import threading
+import uuid
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from PIL import Image, ImageOps
+
+from app.config import settings
+
+RENDITIONS_URL_PREFIX = "/api/v1/renditions/"
+RENDITION_MEDIA_TYPES = {"jpeg": "image/jpeg", "webp": "image/webp"}
+_PIL_FORMATS = {"jpeg": "JPEG", "webp": "WEBP"}
+
+
+def is_rendition_key(key: str) -> bool:
+    return len(key) == 64 and all(c in "0123456789abcdef" for c in key)
+
+
+def _fit(size: Tuple[int, int], box: int) -> Tuple[int, int]:
+    """Size scaled down (never up) so the longest edge is at most box."""
+    scale = min(box / size[0], box / size[1], 1.0)
+    return max(1, round(size[0] * scale)), max(1, round(size[1] * scale))
+
+
+def _downscale(img: Image.Image, box: int) -> Image.Image:
+    target = _fit(img.size, box)
+    if target == img.size:
+        return img
+    # Cheap integer box reduction to within 2x of the target, then a short LANCZOS resize
+    factor = min(img.size[0] // (2 * target[0]), img.size[1] // (2 * target[1]))
+    if factor >= 2:
+        img = img.reduce(factor)
+    return img.resize(target, Image.Resampling.LANCZOS)
+
+
+class RenditionService:
+    """Stores source images by content hash and derives their renditions on demand."""
+
+    def __init__(self, root: str = settings.RENDITION_DIR, sizes: List[int] = settings.RENDITION_SIZES,
+                 formats: List[str] = settings.RENDITION_FORMATS, quality: int = settings.RENDITION_QUALITY):
+        unknown = [f for f in formats if f not in RENDITION_MEDIA_TYPES]
+        if unknown:
+            raise ValueError(f"Unknown rendition formats: {unknown}. Choose from: {list(RENDITION_MEDIA_TYPES)}")
+        self.root = Path(root)
+        self.sizes = sorted(set(sizes), reverse=True)
+        self.formats = list(formats)
+        self.quality = quality
+        self._inflight: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+
+    def _dir(self, key: str) -> Path:
+        return self.root / key[:2] / key
+
+    def source_path(self, key: str) -> Path:
+        return self._dir(key) / "source"
+
+    def path(self, key: str, size: int, fmt: str) -> Path:
+        return self._dir(key) / f"{size}.{fmt}"
+
+    def url(self, key: str, size: int, fmt: str) -> str:
+        return f"{RENDITIONS_URL_PREFIX}{key}/{size}.{fmt}"
+
+    def store(self, data: bytes) -> str:
+        """Store encoded image bytes (once per content) and return their key."""
+        key = hashlib.sha256(data).hexdigest()
+        source = self.source_path(key)
+        if not source.exists():
+            source.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = source.with_name(f"source.{uuid.uuid4().hex}.tmp")
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, source)
+        return key
+
+    def get(self, key: str, size: int, fmt: str) -> Path:
+        """
+        Path of one rendition, generating the key's renditions if needed.
+
+        Raises:
+            ValueError: size or format is not configured, or the stored image cannot be decoded
+            FileNotFoundError: no source is stored under key
+        """
+        if size not in self.sizes or fmt not in self.formats:
+            raise ValueError(f"Unknown rendition {size}.{fmt}. Sizes: {self.sizes}, formats: {self.formats}")
+        path = self.path(key, size, fmt)
+        if not path.exists():
+            self._generate_once(key)
+            if not path.exists():
+                raise FileNotFoundError(f"No rendition {size}.{fmt} for {key}")
+        return path
+
+    def _generate_once(self, key: str):
+        with self._lock:
+            event = self._inflight.get(key)
+            owner = event is None
+            if owner:
+                event = self._inflight[key] = threading.Event()
+        if not owner:
+            event.wait()
+            return
+        try:
+            self._generate(key)
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            event.set()
+
+    def _generate(self, key: str):
+        source = self.source_path(key)
+        if not source.exists():
+            raise FileNotFoundError(f"No image stored for {key}")
+        missing = {(size, fmt) for size in self.sizes for fmt in self.formats if not self.path(key, size, fmt).exists()}
+        if not missing:
+            return
+
+        try:
+            with Image.open(source) as img:
+                if img.format == "JPEG":
+                    img.draft("RGB", _fit(img.size, self.sizes[0]))
+                has_alpha = img.mode in ("RGBA", "LA", "PA") or (img.mode == "P" and "transparency" in img.info)
+                current = ImageOps.exif_transpose(img).convert("RGBA" if has_alpha else "RGB")
+        except (OSError, Image.DecompressionBombError) as e:
+            raise ValueError(f"Stored image {key} cannot be decoded: {e}") from e
+
+        for size in self.sizes:
+            current = _downscale(current, size)
+            flattened = None
+            for fmt in self.formats:
+                if (size, fmt) not in missing:
+                    continue
+                out = current
+                if fmt == "jpeg" and current.mode == "RGBA":
+                    if flattened is None:
+                        flattened = Image.new("RGB", current.size, (255, 255, 255))
+                        flattened.paste(current, mask=current.getchannel("A"))
+                    out = flattened
+                path = self.path(key, size, fmt)
+                tmp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+                out.save(tmp_path, _PIL_FORMATS[fmt], quality=self.quality)
+                os.replace(tmp_path, path)
+
+
+rendition_service = RenditionService()
@@ -0,0 +1,310 @@
+"""
+Lifecycle of per-user try-on files under UPLOAD_FOLDER.
+
+Try-on results and their intermediates (content-addressed person and garment
+inputs, leftover `.tmp` files) live in `<UPLOAD_FOLDER>/<user_id>/virtual_tryon/`.
+Each file is tracked in a SQLite index with its size and last access time.
+Writes and reads go through `touch()` (the router and the /api/v1/uploads
+mount call it), which only updates an in-memory buffer; the buffer is
+flushed to the index in one transaction.
+
+A sweep reconciles the index with the disk incrementally: directory mtimes
+are stored, and only user directories whose mtime changed since the last
+scan are listed again (with `os.scandir`). Eviction is then answered from
+the index alone, per user:
+- `.tmp` files older than PROTECT_SECONDS (abandoned writes);
+- files not accessed for STORAGE_IDLE_DAYS;
+- least recently accessed files while the user is over STORAGE_USER_QUOTA_MB.
+Files accessed within PROTECT_SECONDS are never evicted, so a try-on in
+progress keeps its inputs and result.
+
+A sweep can run from scripts/manage_storage.py or as a periodic task in the
+API process (STORAGE_SWEEP_INTERVAL_MINUTES). With `dry_run` the index is
+still reconciled, but nothing is deleted and the report lists what would be.
+"""
+
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from app.config import settings
+
+MANAGED_DIR = "virtual_tryon"
+TEMP_SUFFIX = ".tmp"
+# Files accessed more recently than this are never evicted
+PROTECT_SECONDS = 3600
+# How often the periodic task writes buffered access times to the index
+ACCESS_FLUSH_SECONDS = 60
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    user_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    last_access REAL NOT NULL,
+    PRIMARY KEY (user_id, name)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS files_by_access ON files (last_access);
+CREATE TABLE IF NOT EXISTS dirs (
+    user_id TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+@dataclass(frozen=True)
+class Eviction:
+    user_id: str
+    name: str
+    size: int
+    last_access: float
+    reason: str  # "temp", "idle" or "quota"
+
+
+@dataclass
+class SweepReport:
+    dry_run: bool
+    dirs_checked: int = 0
+    dirs_scanned: int = 0
+    files_tracked: int = 0
+    bytes_tracked: int = 0
+    evictions: List[Eviction] = field(default_factory=list)
+    seconds: float = 0.0
+
+    @property
+    def bytes_evicted(self) -> int:
+        return sum(e.size for e in self.evictions)
+
+    def summary(self) -> str:
+        action = "Would evict" if self.dry_run else "Evicted"
+        return (f"{action} {len(self.evictions)} files ({self.bytes_evicted / 2 ** 20:.1f} MB) of "
+                f"{self.files_tracked} tracked ({self.bytes_tracked / 2 ** 20:.1f} MB); "
+                f"rescanned {self.dirs_scanned} of {self.dirs_checked} user dirs in {self.seconds:.2f}s")
+
+
+class StorageManager:
+    """Access-time index, quotas and LRU eviction for per-user try-on files."""
+
+    def __init__(self, upload_dir: str = settings.UPLOAD_FOLDER, db_path: str = settings.STORAGE_DB,
+                 quota_mb: int = settings.STORAGE_USER_QUOTA_MB, idle_days: int = settings.STORAGE_IDLE_DAYS):
+        self.upload_dir = Path(upload_dir)
+        self.db_path = db_path
+        self.quota_bytes = quota_mb * 2 ** 20
+        self.idle_days = idle_days
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()  # connection
+        self._pending: Dict[Tuple[str, str], float] = {}
+        self._pending_lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+        return self._conn
+
+    def managed_dir(self, user_id: str) -> Path:
+        return self.upload_dir / user_id / MANAGED_DIR
+
+    def touch(self, user_id: str, name: str, when: Optional[float] = None):
+        """Record a write or read of a try-on file (buffered in memory)."""
+        when = time.time() if when is None else when
+        with self._pending_lock:
+            if when > self._pending.get((user_id, name), 0.0):
+                self._pending[(user_id, name)] = when
+
+    def touch_upload_path(self, path: str):
+        """Record a read of `<user_id>/virtual_tryon/<name>` relative to UPLOAD_FOLDER; other paths are ignored."""
+        parts = Path(path).parts
+        if len(parts) == 3 and parts[1] == MANAGED_DIR:
+            self.touch(parts[0], parts[2])
+
+    def flush(self) -> int:
+        """Write buffered access times to the index; returns the number of files updated."""
+        with self._pending_lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                for (user_id, name), when in pending.items():
+                    updated = conn.execute(
+                        "UPDATE files SET last_access = MAX(last_access, ?) WHERE user_id = ? AND name = ?",
+                        (when, user_id, name),
+                    ).rowcount
+                    if not updated:
+                        # Written since the last scan of its directory
+                        try:
+                            size = (self.managed_dir(user_id) / name).stat().st_size
+                        except OSError:
+                            continue
+                        conn.execute("INSERT INTO files VALUES (?, ?, ?, ?)", (user_id, name, size, when))
+        return len(pending)
+
+    def _scan_dir(self, conn: sqlite3.Connection, user_id: str, path: Path, mtime_ns: int):
+        on_disk = {}
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_file(follow_symlinks=False):
+                    st = entry.stat(follow_symlinks=False)
+                    on_disk[entry.name] = (st.st_size, st.st_mtime)
+        indexed = dict(conn.execute("SELECT name, size FROM files WHERE user_id = ?", (user_id,)))
+        conn.executemany("DELETE FROM files WHERE user_id = ? AND name = ?",
+                         [(user_id, name) for name in indexed.keys() - on_disk.keys()])
+        # New files start at their mtime; tracked files keep their access time
+        conn.executemany("INSERT INTO files VALUES (?, ?, ?, ?)",
+                         [(user_id, name, size, mtime) for name, (size, mtime) in on_disk.items()
+                          if name not in indexed])
+        conn.executemany("UPDATE files SET size = ? WHERE user_id = ? AND name = ?",
+                         [(size, user_id, name) for name, (size, _) in on_disk.items()
+                          if name in indexed and indexed[name] != size])
+        conn.execute("INSERT OR REPLACE INTO dirs VALUES (?, ?)", (user_id, mtime_ns))
+
+    def scan(self, full: bool = False) -> Tuple[int, int]:
+        """
+        Bring the index up to date with the upload folder.
+
+        Args:
+            full: List every user directory, not only those whose mtime changed
+
+        Returns:
+            (user directories checked, user directories listed)
+        """
+        checked = scanned = 0
+        if not self.upload_dir.is_dir():
+            return checked, scanned
+        with self._lock:
+            conn = self._connection()
+            known = dict(conn.execute("SELECT user_id, mtime_ns FROM dirs"))
+            present = set()
+            with conn, os.scandir(self.upload_dir) as users:
+                for user in users:
+                    if not user.is_dir(follow_symlinks=False):
+                        continue
+                    path = Path(user.path) / MANAGED_DIR
+                    try:
+                        mtime_ns = path.stat().st_mtime_ns
+                    except OSError:
+                        continue
+                    checked += 1
+                    present.add(user.name)
+                    if full or known.get(user.name) != mtime_ns:
+                        self._scan_dir(conn, user.name, path, mtime_ns)
+                        scanned += 1
+                for user_id in known.keys() - present:
+                    conn.execute("DELETE FROM files WHERE user_id = ?", (user_id,))
+                    conn.execute("DELETE FROM dirs WHERE user_id = ?", (user_id,))
+        return checked, scanned
+
+    def _plan(self, conn: sqlite3.Connection, now: float) -> List[Eviction]:
+        protected = now - PROTECT_SECONDS
+        evictions = [
+            Eviction(user_id, name, size, last_access, "temp")
+            for user_id, name, size, last_access in conn.execute(
+                "SELECT user_id, name, size, last_access FROM files WHERE name LIKE ? AND last_access < ?",
+                (f"%{TEMP_SUFFIX}", protected),
+            )
+        ]
+        if self.idle_days > 0:
+            idle_cutoff = min(now - self.idle_days * 86400, protected)
+            evictions += [
+                Eviction(user_id, name, size, last_access, "idle")
+                for user_id, name, size, last_access in conn.execute(
+                    "SELECT user_id, name, size, last_access FROM files WHERE last_access < ? AND name NOT LIKE ?",
+                    (idle_cutoff, f"%{TEMP_SUFFIX}"),
+                )
+            ]
+        if self.quota_bytes <= 0:
+            return evictions
+
+        freed: Dict[str, int] = {}
+        chosen = set()
+        for e in evictions:
+            freed[e.user_id] = freed.get(e.user_id, 0) + e.size
+            chosen.add((e.user_id, e.name))
+        over_quota = conn.execute(
+            "SELECT user_id, SUM(size) FROM files GROUP BY user_id HAVING SUM(size) > ?", (self.quota_bytes,)
+        ).fetchall()
+        for user_id, total in over_quota:
+            excess = total - freed.get(user_id, 0) - self.quota_bytes
+            rows = conn.execute(
+                "SELECT name, size, last_access FROM files WHERE user_id = ? AND last_access < ? "
+                "ORDER BY last_access", (user_id, protected),
+            )
+            for name, size, last_access in rows:
+                if excess <= 0:
+                    break
+                if (user_id, name) in chosen:
+                    continue
+                evictions.append(Eviction(user_id, name, size, last_access, "quota"))
+                excess -= size
+        return evictions
+
+    def sweep(self, dry_run: bool = False, full_scan: bool = False) -> SweepReport:
+        """
+        Reconcile the index and evict expired and over-quota files.
+
+        Args:
+            dry_run: Report the evictions without deleting anything
+            full_scan: List every user directory instead of only changed ones
+
+        Returns:
+            What was (or would be) evicted, and index totals before eviction
+        """
+        start = time.perf_counter()
+        report = SweepReport(dry_run=dry_run)
+        report.dirs_checked, report.dirs_scanned = self.scan(full=full_scan)
+        self.flush()
+        with self._lock:
+            conn = self._connection()
+            report.files_tracked, report.bytes_tracked = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM files"
+            ).fetchone()
+            report.evictions = self._plan(conn, time.time())
+            if not dry_run:
+                with conn:
+                    for e in report.evictions:
+                        try:
+                            (self.managed_dir(e.user_id) / e.name).unlink()
+                        except FileNotFoundError:
+                            pass
+                        except OSError as exc:
+                            print(f"Could not evict {e.user_id}/{MANAGED_DIR}/{e.name}: {exc}")
+                            continue
+                        conn.execute("DELETE FROM files WHERE user_id = ? AND name = ?", (e.user_id, e.name))
+        report.seconds = time.perf_counter() - start
+        return report
+
+    def usage(self, user_id: str) -> Tuple[int, int]:
+        """(files, bytes) tracked for a user as of the last sweep or flush."""
+        with self._lock:
+            return self._connection().execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM files WHERE user_id = ?", (user_id,)
+            ).fetchone()
+
+    async def run_periodic(self, interval_minutes: int):
+        """Sweep every `interval_minutes` (first sweep right away) and flush access times in between."""
+        next_sweep = 0.0
+        while True:
+            try:
+                if time.monotonic() >= next_sweep:
+                    report = await asyncio.to_thread(self.sweep)
+                    next_sweep = time.monotonic() + interval_minutes * 60
+                    if report.evictions:
+                        print(f"🧹 Storage sweep: {report.summary()}")
+                else:
+                    await asyncio.to_thread(self.flush)
+            except Exception as e:
+                print(f"Storage sweep failed: {e}")
+                next_sweep = time.monotonic() + interval_minutes * 60
+            await asyncio.sleep(min(ACCESS_FLUSH_SECONDS, interval_minutes * 60))
+
+
+storage_manager = StorageManager()
@@ -1,9 +1,11 @@
 from typing import Optional
 import json
 import os
-from datetime import datetime
+from datetime import date, datetime
 from app.models.user import User
 from app.schemas.user_schemas import UserUpdate, UserPreferencesUpdate, UserAnalytics
+from app.services.wardrobe_analytics import wardrobe_analytics
+from app.services.wear_log import wear_log, default_range
 from fastapi import HTTPException, status
 
 class UserService:
@@ -78,37 +80,31 @@ class UserService:
         return User(**users[user_index])
     
     def get_user_analytics(self, user_id: str) -> UserAnalytics:
-        clothing = self._load_clothing()
-        outfits = self._load_outfits()
-        
-        user_clothing = [c for c in clothing if c.get('user_id') == user_id]
-        user_outfits = [o for o in outfits if o.get('user_id') == user_id]
-        
-        total_value = sum(item.get('cost', 0) for item in user_clothing)
-        
-        most_worn = sorted(user_clothing, key=lambda x: x.get('wear_count', 0), reverse=True)[:5]
-        least_worn = sorted(user_clothing, key=lambda x: x.get('wear_count', 0))[:5]
-        
-        color_freq = {}
-        for item in user_clothing:
-            color = item.get('color', {}).get('primary')
-            if color:
-                color_freq[color] = color_freq.get(color, 0) + 1
-        
-        favorite_colors = [{"color": k, "count": v} for k, v in sorted(color_freq.items(), key=lambda x: x[1], reverse=True)]
-        
-        cost_per_wear = {}
-        for item in user_clothing:
-            if item.get('wear_count', 0) > 0 and item.get('cost', 0) > 0:
-                cpw = item['cost'] / item['wear_count']
-                cost_per_wear[item['name']] = round(cpw, 2)
-        
-        return UserAnalytics(
-            total_items=len(user_clothing),
-            total_outfits=len(user_outfits),
-            most_worn_items=[{"name": i['name'], "wear_count": i.get('wear_count', 0)} for i in most_worn],
-            least_worn_items=[{"name": i['name'], "wear_count": i.get('wear_count', 0)} for i in least_worn],
-            cost_per_wear=cost_per_wear,
-            favorite_colors=favorite_colors,
-            wardrobe_value=round(total_value, 2)
-        )
\ No newline at end of file
+        # Aggregates are maintained on write; only the first request builds them
+        if not wardrobe_analytics.is_built(user_id):
+            self.rebuild_analytics(user_id)
+        return UserAnalytics(**wardrobe_analytics.summary(user_id))
+    
+    def rebuild_analytics(self, user_id: str):
+        """Recompute a user's analytics aggregates from the clothing and outfit files."""
+        user_clothing = [c for c in self._load_clothing() if c.get('user_id') == user_id]
+        outfit_count = sum(1 for o in self._load_outfits() if o.get('user_id') == user_id)
+        wardrobe_analytics.build(user_id, user_clothing, outfit_count)
+    
+    def get_wear_series(self, user_id: str, start: Optional[date] = None, end: Optional[date] = None,
+                        granularity: str = "month", kind: str = "item") -> dict:
+        """Total wears of the user's items or outfits per day or month, read from the wear-log rollups."""
+        if start is None:
+            start, end = default_range(granularity, end)
+        end = end or datetime.utcnow().date()
+        if start > end:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="start must be on or before end")
+        try:
+            counts = wear_log.wear_counts(user_id, start, end, granularity, kind)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        return {
+            "granularity": granularity,
+            "kind": kind,
+            "periods": [{"period": period, "count": count} for period, count in counts],
+        }
@@ -0,0 +1,228 @@
+"""
+Materialized per-user wardrobe analytics, maintained on write.
+
+The clothing and outfit services report every item create/update/delete/
+wear and every outfit create/delete here. Each user's aggregates -- item
+count, wardrobe value, color counts, cost per wear, and wear-ordered lists
+for most/least worn -- are kept in memory and updated per event (a bisect
+into the wear-ordered lists). Only what an event changes is written to
+SQLite (ANALYTICS_DB): one item row and the user's counters, so a write
+does not grow with the wardrobe. The analytics endpoint only reads the
+aggregates. scripts/rebuild_wardrobe_analytics.py recomputes them from
+scratch.
+"""
+
+import bisect
+import sqlite3
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from app.config import settings
+
+# Items listed as most and least worn
+WORN_LIST_SIZE = 5
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS analytics_users (
+    user_id TEXT PRIMARY KEY,
+    next_seq INTEGER NOT NULL,
+    outfits INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS analytics_items (
+    user_id TEXT NOT NULL,
+    item_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    wear_count INTEGER NOT NULL,
+    cost REAL NOT NULL,
+    color TEXT,
+    seq INTEGER NOT NULL,
+    PRIMARY KEY (user_id, item_id)
+) WITHOUT ROWID;
+"""
+
+
+class _UserAnalytics:
+    def __init__(self):
+        # item id -> [name, wear count, cost, primary color, sequence]; the
+        # sequence is the item's position in the clothing store, used to break ties
+        self.items: Dict[str, list] = {}
+        self.next_seq = 0
+        self.outfits = 0
+        self.total_value = 0.0
+        self.colors: Counter = Counter()
+        self.least_worn: List[tuple] = []  # (wear count, seq, id)
+        self.most_worn: List[tuple] = []   # (-wear count, seq, id)
+        self._summary: Optional[dict] = None
+
+    def _add(self, item_id: str, entry: list):
+        name, wear, cost, color, seq = entry
+        self.items[item_id] = entry
+        self.total_value += cost
+        if color:
+            self.colors[color] += 1
+        bisect.insort(self.least_worn, (wear, seq, item_id))
+        bisect.insort(self.most_worn, (-wear, seq, item_id))
+
+    def _drop(self, item_id: str) -> Optional[list]:
+        entry = self.items.pop(item_id, None)
+        if entry is None:
+            return None
+        name, wear, cost, color, seq = entry
+        self.total_value -= cost
+        if color:
+            self.colors[color] -= 1
+            if self.colors[color] <= 0:
+                del self.colors[color]
+        del self.least_worn[bisect.bisect_left(self.least_worn, (wear, seq, item_id))]
+        del self.most_worn[bisect.bisect_left(self.most_worn, (-wear, seq, item_id))]
+        return entry
+
+    def upsert(self, item: dict) -> Optional[list]:
+        """Apply an item record; returns its new entry, or None when it no longer counts (inactive)."""
+        old = self._drop(item['id'])
+        self._summary = None
+        if not item.get('is_active', True):
+            return None
+        if old is not None:
+            seq = old[4]
+        else:
+            seq = self.next_seq
+            self.next_seq += 1
+        entry = [
+            item.get('name', ''),
+            item.get('wear_count', 0) or 0,
+            item.get('cost') or 0,
+            (item.get('color') or {}).get('primary'),
+            seq,
+        ]
+        self._add(item['id'], entry)
+        return entry
+
+    def remove(self, item_id: str):
+        if self._drop(item_id) is not None:
+            self._summary = None
+
+    def summary(self) -> dict:
+        if self._summary is None:
+            worn = lambda key: {"name": self.items[key[2]][0], "wear_count": self.items[key[2]][1]}
+            cost_per_wear = {}
+            for name, wear, cost, _, _ in sorted(self.items.values(), key=lambda e: e[4]):
+                if wear > 0 and cost > 0:
+                    cost_per_wear[name] = round(cost / wear, 2)
+            self._summary = {
+                "total_items": len(self.items),
+                "total_outfits": self.outfits,
+                "most_worn_items": [worn(key) for key in self.most_worn[:WORN_LIST_SIZE]],
+                "least_worn_items": [worn(key) for key in self.least_worn[:WORN_LIST_SIZE]],
+                "cost_per_wear": cost_per_wear,
+                "favorite_colors": [{"color": c, "count": n} for c, n in self.colors.most_common()],
+                "wardrobe_value": round(self.total_value, 2),
+            }
+        return self._summary
+
+
+class WardrobeAnalytics:
+    """Per-user analytics aggregates, loaded from SQLite on first use and written per event."""
+
+    def __init__(self, db_path: str = settings.ANALYTICS_DB):
+        self.db_path = db_path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._users: Dict[str, _UserAnalytics] = {}
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+        return self._conn
+
+    def _get(self, user_id: str) -> Optional[_UserAnalytics]:
+        analytics = self._users.get(user_id)
+        if analytics is None:
+            conn = self._connection()
+            row = conn.execute("SELECT next_seq, outfits FROM analytics_users WHERE user_id = ?",
+                               (user_id,)).fetchone()
+            if row is None:
+                return None
+            analytics = self._users[user_id] = _UserAnalytics()
+            analytics.next_seq, analytics.outfits = row
+            rows = conn.execute(
+                "SELECT item_id, name, wear_count, cost, color, seq FROM analytics_items "
+                "WHERE user_id = ? ORDER BY seq", (user_id,),
+            )
+            for item_id, *entry in rows:
+                analytics._add(item_id, entry)
+        return analytics
+
+    @staticmethod
+    def _save_counters(conn: sqlite3.Connection, user_id: str, analytics: _UserAnalytics):
+        conn.execute("INSERT OR REPLACE INTO analytics_users VALUES (?, ?, ?)",
+                     (user_id, analytics.next_seq, analytics.outfits))
+
+    def is_built(self, user_id: str) -> bool:
+        with self._lock:
+            return self._get(user_id) is not None
+
+    def build(self, user_id: str, items: List[dict], outfit_count: int):
+        """Recompute a user's aggregates from their item records (in store order) and outfit count."""
+        analytics = _UserAnalytics()
+        for item in items:
+            analytics.upsert(item)
+        analytics.outfits = outfit_count
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.execute("DELETE FROM analytics_items WHERE user_id = ?", (user_id,))
+                conn.executemany("INSERT INTO analytics_items VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                 [(user_id, item_id, *entry) for item_id, entry in analytics.items.items()])
+                self._save_counters(conn, user_id, analytics)
+            self._users[user_id] = analytics
+
+    def upsert_item(self, user_id: str, item: dict):
+        """Apply an item create/update/wear; a no-op until the user's aggregates are built."""
+        with self._lock:
+            analytics = self._get(user_id)
+            if analytics is None:
+                return
+            entry = analytics.upsert(item)
+            conn = self._connection()
+            with conn:
+                if entry is None:
+                    conn.execute("DELETE FROM analytics_items WHERE user_id = ? AND item_id = ?",
+                                 (user_id, item['id']))
+                else:
+                    conn.execute("INSERT OR REPLACE INTO analytics_items VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                 (user_id, item['id'], *entry))
+                self._save_counters(conn, user_id, analytics)
+
+    def remove_item(self, user_id: str, item_id: str):
+        with self._lock:
+            analytics = self._get(user_id)
+            if analytics is not None:
+                analytics.remove(item_id)
+                conn = self._connection()
+                with conn:
+                    conn.execute("DELETE FROM analytics_items WHERE user_id = ? AND item_id = ?",
+                                 (user_id, item_id))
+
+    def add_outfits(self, user_id: str, delta: int):
+        with self._lock:
+            analytics = self._get(user_id)
+            if analytics is not None:
+                analytics.outfits += delta
+                analytics._summary = None
+                conn = self._connection()
+                with conn:
+                    self._save_counters(conn, user_id, analytics)
+
+    def summary(self, user_id: str) -> dict:
+        """The user's analytics (UserAnalytics fields); the aggregates must be built."""
+        with self._lock:
+            return self._get(user_id).summary()
+
+
+wardrobe_analytics = WardrobeAnalytics()
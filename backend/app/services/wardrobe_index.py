@@ -0,0 +1,129 @@
+"""
+Inverted index of each user's wardrobe for recommendation candidates.
+
+Every active item gets a small integer ordinal, and each (field, value)
+pair -- category, season, occasion -- maps to a bitset (a Python int) of
+the ordinals that have it. A candidate set such as "tops for work in
+winter" is the AND of three bitsets instead of a scan over the wardrobe.
+Like the color index, a user's index is built from the clothing store on
+first use and kept current by the clothing service.
+"""
+
+import threading
+from typing import Dict, List, Optional, Tuple
+
+
+def _item_keys(item: dict) -> List[Tuple[str, str]]:
+    keys = [("category", item.get('category'))]
+    keys.extend(("season", season) for season in item.get('season') or [])
+    keys.extend(("occasion", occasion) for occasion in item.get('occasion') or [])
+    return keys
+
+
+def iter_bits(bits: int):
+    """Ordinals set in a bitset, lowest first."""
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
+
+
+class _UserWardrobeIndex:
+    def __init__(self):
+        self.bitsets: Dict[Tuple[str, str], int] = {}
+        self.items: List[Optional[dict]] = []
+        self.ordinals: Dict[str, int] = {}
+        self.free: List[int] = []
+        self.keys: Dict[int, List[Tuple[str, str]]] = {}
+
+    def upsert(self, item: dict):
+        self.remove(item['id'])
+        if not item.get('is_active', True):
+            return
+        if self.free:
+            ordinal = self.free.pop()
+            self.items[ordinal] = item
+        else:
+            ordinal = len(self.items)
+            self.items.append(item)
+        self.ordinals[item['id']] = ordinal
+        bit = 1 << ordinal
+        keys = _item_keys(item)
+        for key in keys:
+            self.bitsets[key] = self.bitsets.get(key, 0) | bit
+        self.keys[ordinal] = keys
+
+    def remove(self, item_id: str):
+        ordinal = self.ordinals.pop(item_id, None)
+        if ordinal is None:
+            return
+        mask = ~(1 << ordinal)
+        for key in self.keys.pop(ordinal):
+            self.bitsets[key] &= mask
+        self.items[ordinal] = None
+        self.free.append(ordinal)
+
+    def candidates(self, category: str, season: Optional[str] = None, occasion: Optional[str] = None) -> List[dict]:
+        bits = self.bitsets.get(("category", category), 0)
+        if season is not None:
+            bits &= self.bitsets.get(("season", season), 0)
+        if occasion is not None:
+            bits &= self.bitsets.get(("occasion", occasion), 0)
+        return [self.items[ordinal] for ordinal in iter_bits(bits)]
+
+
+class WardrobeIndex:
+    """Per-user category x season x occasion bitsets, shared by the services."""
+
+    def __init__(self):
+        self._users: Dict[str, _UserWardrobeIndex] = {}
+        self._lock = threading.Lock()
+
+    def is_built(self, user_id: str) -> bool:
+        return user_id in self._users
+
+    def build(self, user_id: str, items: List[dict]):
+        index = _UserWardrobeIndex()
+        for item in items:
+            index.upsert(item)
+        with self._lock:
+            self._users[user_id] = index
+
+    def upsert(self, user_id: str, item: dict):
+        """Add or refresh an item; a no-op until the user's index is built."""
+        with self._lock:
+            index = self._users.get(user_id)
+            if index is not None:
+                index.upsert(item)
+
+    def remove(self, user_id: str, item_id: str):
+        with self._lock:
+            index = self._users.get(user_id)
+            if index is not None:
+                index.remove(item_id)
+
+    def get(self, user_id: str, item_ids: List[str]) -> List[dict]:
+        """Active item records for the given ids, skipping unknown ones."""
+        with self._lock:
+            index = self._users[user_id]
+            return [index.items[index.ordinals[i]] for i in item_ids if i in index.ordinals]
+
+    def candidates(self, user_id: str, category: str, season: Optional[str] = None,
+                   occasion: Optional[str] = None) -> List[dict]:
+        """
+        Active items of a category, optionally restricted to a season and an occasion.
+
+        Args:
+            user_id: Owner of the wardrobe (the index must be built)
+            category: ClothingCategory value
+            season: Season value the item must list
+            occasion: Occasion value the item must list
+
+        Returns:
+            Item records in ordinal order
+        """
+        with self._lock:
+            return self._users[user_id].candidates(category, season, occasion)
+
+
+wardrobe_index = WardrobeIndex()
@@ -0,0 +1,255 @@
+"""
+Append-only wear-event log with daily and monthly rollups.
+
+Every "worn" action on an item or outfit is recorded as an event. Events
+are queued in memory and a writer thread commits them in groups (every
+WEAR_LOG_COMMIT_INTERVAL_MS, or sooner when a batch fills up): one
+transaction inserts the raw events and adds their counts to the
+`wear_daily` and `wear_monthly` rollup tables. Range queries read only the
+rollups -- whole months from `wear_monthly`, partial months and daily
+series from `wear_daily` -- so they never scan raw events.
+
+Queued events are flushed at API shutdown and at interpreter exit, so a
+wear that was acknowledged is not lost with the commit window.
+
+Days and months are UTC, like the rest of the stored timestamps.
+"""
+
+import atexit
+import sqlite3
+import threading
+from collections import Counter
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from app.config import settings
+
+WEAR_KINDS = ("item", "outfit")
+GRANULARITIES = ("day", "month")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS wear_events (
+    user_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    target_id TEXT NOT NULL,
+    worn_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS wear_daily (
+    user_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    day TEXT NOT NULL,
+    target_id TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (user_id, kind, day, target_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS wear_monthly (
+    user_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    month TEXT NOT NULL,
+    target_id TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (user_id, kind, month, target_id)
+) WITHOUT ROWID;
+"""
+
+_ROLLUPS = (
+    ("wear_daily", "day", lambda d: d.isoformat()),
+    ("wear_monthly", "month", lambda d: d.isoformat()[:7]),
+)
+
+
+def _month_start(d: date) -> date:
+    return d.replace(day=1)
+
+
+def _next_month(d: date) -> date:
+    return (d.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def default_range(granularity: str, end: Optional[date] = None) -> Tuple[date, date]:
+    """The window used when a query gives no start: 30 days of days, or 12 months of months."""
+    end = end or datetime.utcnow().date()
+    if granularity == "day":
+        return end - timedelta(days=29), end
+    return _month_start(end - timedelta(days=334)), end
+
+
+def period_keys(start: date, end: date, granularity: str) -> List[str]:
+    """Every day ('YYYY-MM-DD') or month ('YYYY-MM') from start to end, inclusive."""
+    keys = []
+    if granularity == "day":
+        d = start
+        while d <= end:
+            keys.append(d.isoformat())
+            d += timedelta(days=1)
+    else:
+        d = _month_start(start)
+        while d <= end:
+            keys.append(d.isoformat()[:7])
+            d = _next_month(d)
+    return keys
+
+
+class WearLog:
+    """Group-committed wear events and their rollups in SQLite."""
+
+    def __init__(self, db_path: str = settings.WEAR_LOG_DB,
+                 commit_interval_ms: int = settings.WEAR_LOG_COMMIT_INTERVAL_MS,
+                 max_batch: int = settings.WEAR_LOG_MAX_BATCH):
+        self.db_path = db_path
+        self.commit_interval = commit_interval_ms / 1000.0
+        self.max_batch = max_batch
+        self._pending: List[Tuple[str, str, str, float]] = []
+        self._enqueued = 0
+        self._committed = 0
+        self._flush_requested = False
+        self._cond = threading.Condition()
+        self._writer: Optional[threading.Thread] = None
+        self._read_conn: Optional[sqlite3.Connection] = None
+        self._read_lock = threading.Lock()
+        # The writer is a daemon thread: commit what is still queued before the interpreter exits
+        atexit.register(self.flush)
+
+    def _connect(self) -> sqlite3.Connection:
+        Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+        return conn
+
+    def record(self, user_id: str, kind: str, target_id: str, worn_at: Optional[datetime] = None):
+        """Queue a wear event; it is committed with the next group."""
+        if kind not in WEAR_KINDS:
+            raise ValueError(f"Unknown wear kind: {kind}. Choose from: {list(WEAR_KINDS)}")
+        timestamp = (worn_at or datetime.utcnow()).replace(tzinfo=None)
+        with self._cond:
+            self._pending.append((user_id, kind, target_id, (timestamp - datetime(1970, 1, 1)).total_seconds()))
+            self._enqueued += 1
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._run, name="wear-log-writer", daemon=True)
+                self._writer.start()
+            self._cond.notify_all()
+
+    def flush(self):
+        """Commit everything queued so far and wait for it."""
+        with self._cond:
+            target = self._enqueued
+            if self._committed >= target:
+                return
+            self._flush_requested = True
+            self._cond.notify_all()
+            self._cond.wait_for(lambda: self._committed >= target)
+
+    def _run(self):
+        conn = self._connect()
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending)
+                # Group window: gather events until the interval ends, the batch fills or a flush is requested
+                self._cond.wait_for(lambda: self._flush_requested or len(self._pending) >= self.max_batch,
+                                    timeout=self.commit_interval)
+                batch, self._pending = self._pending, []
+                self._flush_requested = False
+                sequence = self._enqueued
+            try:
+                self._commit(conn, batch)
+            except Exception as e:
+                print(f"Wear log commit failed, {len(batch)} events dropped: {e}")
+            with self._cond:
+                self._committed = sequence
+                self._cond.notify_all()
+
+    @staticmethod
+    def _commit(conn: sqlite3.Connection, batch: List[Tuple[str, str, str, float]]):
+        rollups: Dict[str, Counter] = {table: Counter() for table, _, _ in _ROLLUPS}
+        for user_id, kind, target_id, worn_at in batch:
+            day = datetime.utcfromtimestamp(worn_at).date()
+            for table, _, key in _ROLLUPS:
+                rollups[table][(user_id, kind, key(day), target_id)] += 1
+        with conn:
+            conn.executemany("INSERT INTO wear_events VALUES (?, ?, ?, ?)", batch)
+            for table, column, _ in _ROLLUPS:
+                conn.executemany(
+                    f"INSERT INTO {table} (user_id, kind, {column}, target_id, count) VALUES (?, ?, ?, ?, ?) "
+                    f"ON CONFLICT DO UPDATE SET count = count + excluded.count",
+                    [(*key, count) for key, count in rollups[table].items()],
+                )
+
+    def _query(self, sql: str, params: tuple) -> list:
+        self.flush()
+        with self._read_lock:
+            if self._read_conn is None:
+                self._read_conn = self._connect()
+            return self._read_conn.execute(sql, params).fetchall()
+
+    def _sum_by_period(self, table: str, column: str, period_sql: str, user_id: str, kind: str,
+                       target_id: Optional[str], first: str, last: str) -> Counter:
+        sql = (f"SELECT {period_sql}, SUM(count) FROM {table} "
+               f"WHERE user_id = ? AND kind = ? AND {column} BETWEEN ? AND ?")
+        params = [user_id, kind, first, last]
+        if target_id is not None:
+            sql += " AND target_id = ?"
+            params.append(target_id)
+        return Counter(dict(self._query(sql + " GROUP BY 1", tuple(params))))
+
+    def wear_counts(self, user_id: str, start: date, end: date, granularity: str = "month",
+                    kind: str = "item", target_id: Optional[str] = None) -> List[Tuple[str, int]]:
+        """
+        Wears per day or month in [start, end], from the rollups.
+
+        Args:
+            user_id: Owner of the items/outfits
+            start: First day (inclusive)
+            end: Last day (inclusive)
+            granularity: "day" or "month"
+            kind: "item" or "outfit"
+            target_id: One item/outfit, or None for all of the user's
+
+        Returns:
+            [(period, count)] for every period in the range, zeros included
+        """
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"Unknown granularity: {granularity}. Choose from: {list(GRANULARITIES)}")
+        if kind not in WEAR_KINDS:
+            raise ValueError(f"Unknown wear kind: {kind}. Choose from: {list(WEAR_KINDS)}")
+        if granularity == "day":
+            counts = self._sum_by_period("wear_daily", "day", "day", user_id, kind, target_id,
+                                         start.isoformat(), end.isoformat())
+        else:
+            # Whole months [first_whole, whole_end) come from the monthly table,
+            # the partial months at either end from the daily table
+            first_whole = start if start.day == 1 else _next_month(start)
+            whole_end = _month_start(end + timedelta(days=1))
+            if first_whole < whole_end:
+                counts = self._sum_by_period("wear_monthly", "month", "month", user_id, kind, target_id,
+                                             first_whole.isoformat()[:7],
+                                             (whole_end - timedelta(days=1)).isoformat()[:7])
+                edges = [(start, first_whole - timedelta(days=1)), (whole_end, end)]
+            else:
+                counts = Counter()
+                edges = [(start, end)]
+            for first, last in edges:
+                if first <= last:
+                    counts += self._sum_by_period("wear_daily", "day", "substr(day, 1, 7)", user_id, kind,
+                                                  target_id, first.isoformat(), last.isoformat())
+        return [(key, int(counts.get(key, 0))) for key in period_keys(start, end, granularity)]
+
+    def total_before(self, user_id: str, kind: str, target_id: str, before: date) -> int:
+        """Wears of one item/outfit on days before `before` (whole months plus the days of its month)."""
+        month_start = _month_start(before)
+        monthly = self._query(
+            "SELECT COALESCE(SUM(count), 0) FROM wear_monthly "
+            "WHERE user_id = ? AND kind = ? AND month < ? AND target_id = ?",
+            (user_id, kind, month_start.isoformat()[:7], target_id),
+        )[0][0]
+        daily = self._query(
+            "SELECT COALESCE(SUM(count), 0) FROM wear_daily "
+            "WHERE user_id = ? AND kind = ? AND day >= ? AND day < ? AND target_id = ?",
+            (user_id, kind, month_start.isoformat(), before.isoformat(), target_id),
+        )[0][0]
+        return int(monthly + daily)
+
+
+wear_log = WearLog()
@@ -0,0 +1,162 @@
+"""
+Dominant-color extraction for clothing images.
+
+Pixels are binned in a coarse 3D CIELAB histogram; the heaviest bins that
+are perceptually distinct seed the palette, and a few k-means steps on a
+pixel sample refine it. Transparent pixels (background removed) are
+ignored. This runs in a few milliseconds per image.
+"""
+
+import io
+from typing import List, Optional, Tuple, Union
+
+import cv2
+import numpy as np
+from PIL import Image
+
+# Histogram bins per channel of OpenCV's 8-bit Lab (L, a, b)
+LAB_BINS = (8, 16, 16)
+# Minimum distance (Lab units) between two palette colors
+MIN_COLOR_DISTANCE = 12.0
+THUMBNAIL_SIZE = (150, 150)
+# Chroma (Lab) below which a color counts as neutral and goes with anything
+NEUTRAL_CHROMA = 15.0
+_HEX_DIGITS = set("0123456789abcdefABCDEF")
+
+
+def _to_real_lab(lab8: np.ndarray) -> np.ndarray:
+    """OpenCV 8-bit Lab -> L in [0, 100], a/b in [-128, 127]."""
+    lab = lab8.astype(np.float32)
+    lab[..., 0] *= 100.0 / 255.0
+    lab[..., 1:] -= 128.0
+    return lab
+
+
+def lab_to_hex(lab: np.ndarray) -> List[str]:
+    """Hex strings for an (N, 3) array of real Lab colors."""
+    rgb = cv2.cvtColor(lab.reshape(1, -1, 3).astype(np.float32), cv2.COLOR_Lab2RGB).reshape(-1, 3)
+    rgb = np.clip(np.rint(rgb * 255.0), 0, 255).astype(int)
+    return ['#{:02x}{:02x}{:02x}'.format(*color) for color in rgb]
+
+
+def hexes_to_lab(hex_colors: List[str]) -> np.ndarray:
+    """(N, 3) real Lab colors of '#rrggbb' strings, converted in one call."""
+    if not hex_colors:
+        return np.zeros((0, 3), dtype=np.float32)
+    values = [h.lstrip('#') for h in hex_colors]
+    rgb = np.array([[int(v[i:i + 2], 16) for i in (0, 2, 4)] for v in values], dtype=np.float32) / 255.0
+    return cv2.cvtColor(rgb.reshape(1, -1, 3), cv2.COLOR_RGB2Lab).reshape(-1, 3)
+
+
+def hex_to_lab(hex_color: str) -> np.ndarray:
+    """Real Lab color of a '#rrggbb' string."""
+    return hexes_to_lab([hex_color])[0]
+
+
+def dominant_hex(item: dict) -> Optional[str]:
+    """'#rrggbb' of an item record's dominant color: its first palette color, else a hex primary color."""
+    color = item.get('color') or {}
+    palette = color.get('palette') or []
+    candidate = palette[0]['hex'] if palette else color.get('primary', '')
+    value = (candidate or '').lstrip('#')
+    return f'#{value}' if len(value) == 6 and set(value) <= _HEX_DIGITS else None
+
+
+def neutrality(lab: np.ndarray) -> np.ndarray:
+    """Per color in an (N, 3) real Lab array: 1 for gray, falling to 0 at NEUTRAL_CHROMA and beyond."""
+    return np.clip(1.0 - np.hypot(lab[:, 1], lab[:, 2]) / NEUTRAL_CHROMA, 0.0, 1.0)
+
+
+def _nearest(pixels: np.ndarray, palette: np.ndarray) -> np.ndarray:
+    """Index of the nearest palette color for every pixel (squared distance via one matmul)."""
+    return np.argmin((palette ** 2).sum(axis=1) - 2.0 * pixels @ palette.T, axis=1)
+
+
+def _foreground_pixels(image: Image.Image, mask: Optional[Image.Image]) -> np.ndarray:
+    """(N, 3) real Lab pixels of the thumbnail, without transparent or masked-out pixels."""
+    scale = min(THUMBNAIL_SIZE[0] / image.width, THUMBNAIL_SIZE[1] / image.height)
+    if scale < 1:
+        size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+        image = image.resize(size, Image.BILINEAR, reducing_gap=3.0)
+    if mask is None and image.mode in ('RGBA', 'LA', 'P'):
+        rgba = image.convert('RGBA')
+        mask = rgba.getchannel('A')
+    elif mask is not None:
+        mask = mask.convert('L').resize(image.size, Image.NEAREST)
+
+    rgb = np.asarray(image.convert('RGB'))
+    lab = _to_real_lab(cv2.cvtColor(rgb, cv2.COLOR_RGB2LAB)).reshape(-1, 3)
+    if mask is not None:
+        foreground = np.asarray(mask).reshape(-1) > 127
+        if foreground.any():
+            lab = lab[foreground]
+    return lab
+
+
+def extract_palette(
+    image: Union[Image.Image, bytes],
+    n_colors: int = 5,
+    mask: Optional[Image.Image] = None,
+    refine_steps: int = 2,
+    sample_size: int = 4096,
+) -> List[Tuple[str, float]]:
+    """
+    Dominant colors of an image with their pixel shares.
+
+    Args:
+        image: PIL Image or encoded image bytes
+        n_colors: Maximum palette size
+        mask: Optional foreground mask; otherwise the alpha channel is used when present
+        refine_steps: k-means steps on a pixel sample after histogram seeding (0 to skip)
+        sample_size: Pixels used for the refinement
+
+    Returns:
+        [(hex color, weight)] sorted by weight, weights summing to 1
+    """
+    if isinstance(image, (bytes, bytearray)):
+        image = Image.open(io.BytesIO(image))
+        # JPEGs decode straight at a reduced scale
+        image.draft('RGB', (THUMBNAIL_SIZE[0] * 2, THUMBNAIL_SIZE[1] * 2))
+    lab = _foreground_pixels(image, mask)
+    if len(lab) == 0:
+        return []
+
+    # Bin index per pixel in the coarse Lab histogram
+    l_bins, a_bins, b_bins = LAB_BINS
+    l_idx = np.minimum((lab[:, 0] * (l_bins / 100.0)).astype(int), l_bins - 1)
+    a_idx = np.clip(((lab[:, 1] + 128.0) * (a_bins / 256.0)).astype(int), 0, a_bins - 1)
+    b_idx = np.clip(((lab[:, 2] + 128.0) * (b_bins / 256.0)).astype(int), 0, b_bins - 1)
+    bins = (l_idx * a_bins + a_idx) * b_bins + b_idx
+    n_bins = l_bins * a_bins * b_bins
+    counts = np.bincount(bins, minlength=n_bins)
+    occupied = np.flatnonzero(counts)
+    centroids = np.stack(
+        [np.bincount(bins, weights=lab[:, c], minlength=n_bins)[occupied] for c in range(3)], axis=1
+    ) / counts[occupied, None]
+
+    # Heaviest bins first, skipping ones too close to a color already chosen
+    seeds = []
+    for i in np.argsort(-counts[occupied], kind='stable'):
+        if all(np.linalg.norm(centroids[i] - centroids[j]) >= MIN_COLOR_DISTANCE for j in seeds):
+            seeds.append(i)
+            if len(seeds) == n_colors:
+                break
+    palette = centroids[seeds]
+
+    if refine_steps > 0 and len(palette) > 1:
+        if len(lab) > sample_size:
+            sample = lab[np.random.default_rng(0).choice(len(lab), sample_size, replace=False)]
+        else:
+            sample = lab
+        for _ in range(refine_steps):
+            labels = _nearest(sample, palette)
+            sizes = np.bincount(labels, minlength=len(palette))
+            sums = np.stack([np.bincount(labels, weights=sample[:, c], minlength=len(palette))
+                             for c in range(3)], axis=1)
+            palette = np.where(sizes[:, None] > 0, sums / np.maximum(sizes, 1)[:, None], palette)
+
+    labels = _nearest(lab, palette)
+    weights = np.bincount(labels, minlength=len(palette)) / len(lab)
+    order = np.argsort(-weights, kind='stable')
+    hexes = lab_to_hex(palette[order])
+    return [(hexes[k], round(float(weights[i]), 4)) for k, i in enumerate(order) if weights[i] > 0]
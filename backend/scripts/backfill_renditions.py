@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Store the display image of items uploaded before renditions existed and
+record its key on the item.
+
+Only the source is stored; renditions are generated on first request.
+
+Usage:
+    python scripts/backfill_renditions.py
+    python scripts/backfill_renditions.py --dry-run
+"""
+
+import argparse
+import base64
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill rendition keys for clothing items")
+    parser.add_argument("--clothing-file", default="app/data/mock/clothing.json")
+    parser.add_argument("--dry-run", action="store_true", help="Count the items without changing anything")
+    args = parser.parse_args()
+
+    from app.services.rendition_service import rendition_service
+
+    clothing = json.loads(Path(args.clothing_file).read_text())
+    start = time.perf_counter()
+    updated = 0
+    for item in clothing:
+        images = item.get('images') or {}
+        display = images.get('processed') or images.get('original')
+        if images.get('key') or not display or not display.startswith('data:'):
+            continue
+        if not args.dry_run:
+            images['key'] = rendition_service.store(base64.b64decode(display.split(',', 1)[1]))
+        updated += 1
+
+    if updated and not args.dry_run:
+        tmp_path = Path(args.clothing_file).with_suffix('.json.tmp')
+        tmp_path.write_text(json.dumps(clothing, indent=2, default=str))
+        tmp_path.replace(args.clothing_file)
+    action = "Would backfill" if args.dry_run else "Backfilled"
+    print(f"{action} {updated} of {len(clothing)} items in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
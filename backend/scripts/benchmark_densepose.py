@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Compare DensePose latency with full R-CNN detection against the
+keypoint-guided person ROI mode, and the per-part render loop against the
+LUT render.
+
+Usage:
+    python scripts/benchmark_densepose.py person1.jpg person2.jpg --runs 5
+    python scripts/benchmark_densepose.py --render-only
+"""
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+
+def _median_time(fn, runs):
+    latencies = []
+    result = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = fn()
+        latencies.append(time.perf_counter() - start)
+    return result, statistics.median(latencies[1:] or latencies)
+
+
+def loop_render(img_array, label_map):
+    """The former render: one boolean pass per part, then a float blend."""
+    from app.ai.preprocess.densepose_render import PART_COLORS
+
+    colored_seg = np.zeros(img_array.shape, dtype=np.uint8)
+    for part_id, color in enumerate(PART_COLORS):
+        colored_seg[label_map == part_id] = color
+    return (0.6 * img_array + 0.4 * colored_seg).astype(np.uint8)
+
+
+def benchmark_render(runs):
+    from app.ai.preprocess.densepose_render import render_parts
+
+    rng = np.random.default_rng(0)
+    img_array = rng.integers(0, 256, (1024, 768, 3), dtype=np.uint8)
+    labels = rng.integers(0, 15, (1024, 768), dtype=np.uint8)
+    box = [0, 0, 768, 1024]
+
+    loop_img, loop_time = _median_time(lambda: loop_render(img_array, labels), runs)
+    lut_img, lut_time = _median_time(lambda: render_parts(img_array, labels, box), runs)
+    max_diff = np.abs(loop_img.astype(np.int16) - lut_img.astype(np.int16)).max()
+    print(f"render loop: {loop_time * 1000:.1f}ms  LUT: {lut_time * 1000:.1f}ms  "
+          f"({loop_time / lut_time:.1f}x, max pixel diff {max_diff} from float truncation)")
+
+
+def benchmark_roi(images, runs, roi_min_size):
+    from PIL import Image
+    from app.ai.preprocess.densepose_wrapper import DensePoseProcessor
+    from app.ai.preprocess.openpose.run_openpose import OpenPose
+
+    processor = DensePoseProcessor(device="cuda", roi_min_size=roi_min_size)
+    if not processor.is_available():
+        print("DensePose is not available; skipping the ROI comparison")
+        return
+    openpose = OpenPose(0)
+
+    print(f"{'image':<30}{'full (ms)':>12}{'roi (ms)':>12}{'openpose (ms)':>15}")
+    for path in images:
+        image = Image.open(path).convert("RGB").resize((768, 1024))
+        keypoints, pose_time = _median_time(lambda: openpose(image.resize((384, 512))), runs)
+        _, full_time = _median_time(lambda: processor.process_image(image), runs)
+        _, roi_time = _median_time(lambda: processor.process_image(image, keypoints=keypoints), runs)
+        print(f"{Path(path).name:<30}{full_time * 1000:>12.1f}{roi_time * 1000:>12.1f}{pose_time * 1000:>15.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark DensePose rendering and ROI inference")
+    parser.add_argument("images", nargs="*", help="Person image paths")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--roi-min-size", type=int, default=512, help="INPUT.MIN_SIZE_TEST for the ROI mode")
+    parser.add_argument("--render-only", action="store_true", help="Only compare the render paths")
+    args = parser.parse_args()
+
+    benchmark_render(args.runs)
+    if not args.render_only and args.images:
+        benchmark_roi(args.images, args.runs, args.roi_min_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Check that the lookup-table mask engine (get_category_masks) returns the
+same masks as get_mask_location for every category, and compare the cost
+of one engine call against three get_mask_location calls.
+
+Synthetic parses and poses are used, with some wrists left undetected so
+the parse-label arm fallback is exercised too.
+
+Usage:
+    python scripts/benchmark_mask_engine.py --samples 20 --runs 10
+"""
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+
+def synthetic_person(seed: int, width: int = 384, height: int = 512):
+    """A blocky human parse (labels 0-18) and matching OpenPose keypoints."""
+    rng = np.random.default_rng(seed)
+    cx = width / 2 + rng.uniform(-30, 30)
+    top = rng.uniform(20, 60)
+    parse = Image.new("L", (width, height), 0)
+    draw = ImageDraw.Draw(parse)
+
+    shoulder_y = top + 90
+    hip_y = shoulder_y + rng.uniform(140, 180)
+    draw.ellipse([cx - 35, top, cx + 35, top + 80], fill=11)
+    draw.ellipse([cx - 38, top - 10, cx + 38, top + 25], fill=int(rng.choice([2, 1])))
+    draw.rectangle([cx - 15, top + 75, cx + 15, shoulder_y], fill=18)
+    torso_label = int(rng.choice([4, 7]))
+    draw.rectangle([cx - 60, shoulder_y, cx + 60, hip_y], fill=torso_label)
+    bottom_label = int(rng.choice([5, 6]))
+    draw.rectangle([cx - 55, hip_y, cx + 55, hip_y + 150], fill=bottom_label)
+    draw.rectangle([cx - 50, hip_y + 150, cx - 5, height - 30], fill=12)
+    draw.rectangle([cx + 5, hip_y + 150, cx + 50, height - 30], fill=13)
+    draw.rectangle([cx - 50, height - 30, cx - 5, height - 5], fill=9)
+    draw.rectangle([cx + 5, height - 30, cx + 50, height - 5], fill=10)
+
+    # OpenPose order: 2/3/4 right shoulder/elbow/wrist, 5/6/7 left
+    pose = np.zeros((18, 2))
+    pose[1] = (cx, shoulder_y)
+    for side, sign in ((2, -1), (5, 1)):
+        shoulder = np.array([cx + sign * 60, shoulder_y])
+        elbow = shoulder + [sign * rng.uniform(10, 40), rng.uniform(60, 90)]
+        wrist = elbow + [sign * rng.uniform(-20, 30), rng.uniform(50, 80)]
+        pose[side:side + 3] = shoulder, elbow, wrist
+        arm_label = 15 if side == 2 else 14
+        draw.line([tuple(shoulder), tuple(elbow), tuple(wrist)], fill=arm_label, width=22)
+        if rng.random() < 0.25:
+            pose[side + 2] = 0  # undetected wrist
+    if rng.random() < 0.2:
+        draw.rectangle([cx + 70, hip_y - 40, cx + 110, hip_y + 20], fill=16)
+
+    return parse, {"pose_keypoints_2d": pose.tolist()}
+
+
+def _time(fn, runs):
+    latencies = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+    return statistics.median(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parity and timing of the mask engine")
+    parser.add_argument("--samples", type=int, default=20)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--model-type", default="hd", choices=["hd", "dc"])
+    args = parser.parse_args()
+
+    from app.ai.utils_mask import MASK_CATEGORIES, get_category_masks, get_mask_location
+
+    mismatches = 0
+    reference_times, engine_times = [], []
+    for seed in range(args.samples):
+        parse, keypoints = synthetic_person(seed)
+        engine = get_category_masks(args.model_type, parse, keypoints)
+        for category in MASK_CATEGORIES:
+            mask, mask_gray = get_mask_location(args.model_type, category, parse, keypoints)
+            if not (np.array_equal(np.asarray(mask), np.asarray(engine[category][0]))
+                    and np.array_equal(np.asarray(mask_gray), np.asarray(engine[category][1]))):
+                mismatches += 1
+                print(f"sample {seed}: {category} mask differs")
+
+        reference_times.append(_time(
+            lambda: [get_mask_location(args.model_type, c, parse, keypoints) for c in MASK_CATEGORIES], args.runs))
+        engine_times.append(_time(lambda: get_category_masks(args.model_type, parse, keypoints), args.runs))
+
+    reference_ms = statistics.median(reference_times) * 1000
+    engine_ms = statistics.median(engine_times) * 1000
+    print(f"{args.samples} samples x {len(MASK_CATEGORIES)} categories, {mismatches} mismatching masks")
+    print(f"get_mask_location x{len(MASK_CATEGORIES)}: {reference_ms:.2f}ms  "
+          f"get_category_masks: {engine_ms:.2f}ms  ({reference_ms / engine_ms:.1f}x)")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
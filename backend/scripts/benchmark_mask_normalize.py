@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Check that normalize_mask returns the same mask as the former per-pixel
+pil_to_binary_mask path (RGB convert, resize to 768x1024, double loop
+threshold), and time both.
+
+Masks are synthetic: blurred random shapes in grayscale, RGB, RGBA and
+palette mode, at several resolutions, so thresholds hit anti-aliased edges.
+
+Usage:
+    python scripts/benchmark_mask_normalize.py --samples 12 --runs 3
+"""
+
+import argparse
+import io
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+SIZES = [(768, 1024), (384, 512), (1080, 1440), (600, 900)]
+MODES = ["L", "RGB", "RGBA", "P"]
+
+
+def loop_binary_mask(mask_image, threshold=0):
+    """The former user-mask path of IDMVTONSimplified, kept as the reference."""
+    pil_image = mask_image.convert("RGB").resize((768, 1024))
+    np_image = np.array(pil_image)
+    grayscale_image = Image.fromarray(np_image).convert("L")
+    binary_mask = np.array(grayscale_image) > threshold
+    mask = np.zeros(binary_mask.shape, dtype=np.uint8)
+    for i in range(binary_mask.shape[0]):
+        for j in range(binary_mask.shape[1]):
+            if binary_mask[i, j] == True:
+                mask[i, j] = 1
+    mask = (mask * 255).astype(np.uint8)
+    return Image.fromarray(mask)
+
+
+def synthetic_mask(seed: int):
+    rng = np.random.default_rng(seed)
+    size = SIZES[seed % len(SIZES)]
+    mode = MODES[seed % len(MODES)]
+    image = Image.new("RGB", size, (0, 0, 0))
+    draw = ImageDraw.Draw(image)
+    for _ in range(rng.integers(1, 5)):
+        x0, y0 = rng.uniform(0, size[0] * 0.7), rng.uniform(0, size[1] * 0.7)
+        x1, y1 = x0 + rng.uniform(40, size[0] * 0.5), y0 + rng.uniform(40, size[1] * 0.5)
+        color = tuple(int(c) for c in rng.integers(20, 256, 3))
+        draw.ellipse([x0, y0, x1, y1], fill=color)
+    image = image.filter(ImageFilter.GaussianBlur(3))
+    if mode == "P":
+        return image.convert("P", palette=Image.ADAPTIVE)
+    return image.convert(mode)
+
+
+def _time(fn, runs):
+    latencies = []
+    result = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = fn()
+        latencies.append(time.perf_counter() - start)
+    return result, statistics.median(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parity and timing of normalize_mask")
+    parser.add_argument("--samples", type=int, default=12)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    from app.ai.utils_mask import normalize_mask
+
+    mismatches = 0
+    loop_times, vector_times = [], []
+    for seed in range(args.samples):
+        image = synthetic_mask(seed)
+        threshold = (0, 10, 127)[seed % 3]
+        expected, loop_time = _time(lambda: loop_binary_mask(image, threshold), args.runs)
+        actual, vector_time = _time(lambda: normalize_mask(image, threshold=threshold), args.runs)
+        loop_times.append(loop_time)
+        vector_times.append(vector_time)
+
+        encoded = io.BytesIO()
+        image.convert("RGB").save(encoded, format="PNG")
+        inputs = {
+            "pil": actual,
+            "array": normalize_mask(np.array(image.convert("RGB")), threshold=threshold),
+            "bytes": normalize_mask(encoded.getvalue(), threshold=threshold),
+        }
+        for kind, mask in inputs.items():
+            if mask.mode != "L" or not np.array_equal(np.asarray(mask), np.asarray(expected)):
+                mismatches += 1
+                print(f"sample {seed} ({image.mode} {image.size}, {kind} input): mask differs")
+
+    loop_ms = statistics.median(loop_times) * 1000
+    vector_ms = statistics.median(vector_times) * 1000
+    print(f"{args.samples} masks, {mismatches} mismatches")
+    print(f"per-pixel loop: {loop_ms:.1f}ms  normalize_mask: {vector_ms:.2f}ms  ({loop_ms / vector_ms:.0f}x)")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark the OpenPose body post-processing: the vectorized
+postprocess against the original loop implementation. Both must return
+identical candidate/subset arrays.
+
+Without --image, synthetic heatmaps/PAFs with a few people are used, so no
+model weights are needed. With --image, the real network output is used.
+
+Usage:
+    python scripts/benchmark_openpose_postprocess.py --people 3 --runs 20
+    python scripts/benchmark_openpose_postprocess.py --image person.jpg
+"""
+
+import argparse
+import math
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from scipy.ndimage import gaussian_filter
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+
+def postprocess_reference(heatmap_avg, paf_avg, image_height):
+    """The original loop implementation of body.postprocess, kept as its parity reference."""
+    thre1 = 0.1
+    thre2 = 0.05
+
+    all_peaks = []
+    peak_counter = 0
+
+    for part in range(18):
+        map_ori = heatmap_avg[:, :, part]
+        one_heatmap = gaussian_filter(map_ori, sigma=3)
+
+        map_left = np.zeros(one_heatmap.shape)
+        map_left[1:, :] = one_heatmap[:-1, :]
+        map_right = np.zeros(one_heatmap.shape)
+        map_right[:-1, :] = one_heatmap[1:, :]
+        map_up = np.zeros(one_heatmap.shape)
+        map_up[:, 1:] = one_heatmap[:, :-1]
+        map_down = np.zeros(one_heatmap.shape)
+        map_down[:, :-1] = one_heatmap[:, 1:]
+
+        peaks_binary = np.logical_and.reduce(
+            (one_heatmap >= map_left, one_heatmap >= map_right, one_heatmap >= map_up, one_heatmap >= map_down,
+             one_heatmap > thre1))
+        peaks = list(zip(np.nonzero(peaks_binary)[1], np.nonzero(peaks_binary)[0]))  # note reverse
+        peaks_with_score = [x + (map_ori[x[1], x[0]],) for x in peaks]
+        peak_id = range(peak_counter, peak_counter + len(peaks))
+        peaks_with_score_and_id = [peaks_with_score[i] + (peak_id[i],) for i in range(len(peak_id))]
+
+        all_peaks.append(peaks_with_score_and_id)
+        peak_counter += len(peaks)
+
+    # find connection in the specified sequence, center 29 is in the position 15
+    limbSeq = [[2, 3], [2, 6], [3, 4], [4, 5], [6, 7], [7, 8], [2, 9], [9, 10], \
+               [10, 11], [2, 12], [12, 13], [13, 14], [2, 1], [1, 15], [15, 17], \
+               [1, 16], [16, 18], [3, 17], [6, 18]]
+    # the middle joints heatmap correpondence
+    mapIdx = [[31, 32], [39, 40], [33, 34], [35, 36], [41, 42], [43, 44], [19, 20], [21, 22], \
+              [23, 24], [25, 26], [27, 28], [29, 30], [47, 48], [49, 50], [53, 54], [51, 52], \
+              [55, 56], [37, 38], [45, 46]]
+
+    connection_all = []
+    special_k = []
+    mid_num = 10
+
+    for k in range(len(mapIdx)):
+        score_mid = paf_avg[:, :, [x - 19 for x in mapIdx[k]]]
+        candA = all_peaks[limbSeq[k][0] - 1]
+        candB = all_peaks[limbSeq[k][1] - 1]
+        nA = len(candA)
+        nB = len(candB)
+        indexA, indexB = limbSeq[k]
+        if (nA != 0 and nB != 0):
+            connection_candidate = []
+            for i in range(nA):
+                for j in range(nB):
+                    vec = np.subtract(candB[j][:2], candA[i][:2])
+                    norm = math.sqrt(vec[0] * vec[0] + vec[1] * vec[1])
+                    norm = max(0.001, norm)
+                    vec = np.divide(vec, norm)
+
+                    startend = list(zip(np.linspace(candA[i][0], candB[j][0], num=mid_num), \
+                                        np.linspace(candA[i][1], candB[j][1], num=mid_num)))
+
+                    vec_x = np.array([score_mid[int(round(startend[I][1])), int(round(startend[I][0])), 0] \
+                                      for I in range(len(startend))])
+                    vec_y = np.array([score_mid[int(round(startend[I][1])), int(round(startend[I][0])), 1] \
+                                      for I in range(len(startend))])
+
+                    score_midpts = np.multiply(vec_x, vec[0]) + np.multiply(vec_y, vec[1])
+                    score_with_dist_prior = sum(score_midpts) / len(score_midpts) + min(
+                        0.5 * image_height / norm - 1, 0)
+                    criterion1 = len(np.nonzero(score_midpts > thre2)[0]) > 0.8 * len(score_midpts)
+                    criterion2 = score_with_dist_prior > 0
+                    if criterion1 and criterion2:
+                        connection_candidate.append(
+                            [i, j, score_with_dist_prior, score_with_dist_prior + candA[i][2] + candB[j][2]])
+
+            connection_candidate = sorted(connection_candidate, key=lambda x: x[2], reverse=True)
+            connection = np.zeros((0, 5))
+            for c in range(len(connection_candidate)):
+                i, j, s = connection_candidate[c][0:3]
+                if (i not in connection[:, 3] and j not in connection[:, 4]):
+                    connection = np.vstack([connection, [candA[i][3], candB[j][3], s, i, j]])
+                    if (len(connection) >= min(nA, nB)):
+                        break
+
+            connection_all.append(connection)
+        else:
+            special_k.append(k)
+            connection_all.append([])
+
+    # last number in each row is the total parts number of that person
+    # the second last number in each row is the score of the overall configuration
+    subset = -1 * np.ones((0, 20))
+    candidate = np.array([item for sublist in all_peaks for item in sublist])
+
+    for k in range(len(mapIdx)):
+        if k not in special_k:
+            partAs = connection_all[k][:, 0]
+            partBs = connection_all[k][:, 1]
+            indexA, indexB = np.array(limbSeq[k]) - 1
+
+            for i in range(len(connection_all[k])):  # = 1:size(temp,1)
+                found = 0
+                subset_idx = [-1, -1]
+                for j in range(len(subset)):  # 1:size(subset,1):
+                    if subset[j][indexA] == partAs[i] or subset[j][indexB] == partBs[i]:
+                        subset_idx[found] = j
+                        found += 1
+
+                if found == 1:
+                    j = subset_idx[0]
+                    if subset[j][indexB] != partBs[i]:
+                        subset[j][indexB] = partBs[i]
+                        subset[j][-1] += 1
+                        subset[j][-2] += candidate[partBs[i].astype(int), 2] + connection_all[k][i][2]
+                elif found == 2:  # if found 2 and disjoint, merge them
+                    j1, j2 = subset_idx
+                    membership = ((subset[j1] >= 0).astype(int) + (subset[j2] >= 0).astype(int))[:-2]
+                    if len(np.nonzero(membership == 2)[0]) == 0:  # merge
+                        subset[j1][:-2] += (subset[j2][:-2] + 1)
+                        subset[j1][-2:] += subset[j2][-2:]
+                        subset[j1][-2] += connection_all[k][i][2]
+                        subset = np.delete(subset, j2, 0)
+                    else:  # as like found == 1
+                        subset[j1][indexB] = partBs[i]
+                        subset[j1][-1] += 1
+                        subset[j1][-2] += candidate[partBs[i].astype(int), 2] + connection_all[k][i][2]
+
+                # if find no partA in the subset, create a new subset
+                elif not found and k < 17:
+                    row = -1 * np.ones(20)
+                    row[indexA] = partAs[i]
+                    row[indexB] = partBs[i]
+                    row[-1] = 2
+                    row[-2] = sum(candidate[connection_all[k][i, :2].astype(int), 2]) + connection_all[k][i][2]
+                    subset = np.vstack([subset, row])
+    # delete some rows of subset which has few parts occur
+    deleteIdx = []
+    for i in range(len(subset)):
+        if subset[i][-1] < 4 or subset[i][-2] / subset[i][-1] < 0.4:
+            deleteIdx.append(i)
+    subset = np.delete(subset, deleteIdx, axis=0)
+
+    # subset: n*20 array, 0-17 is the index in candidate, 18 is the total score, 19 is the total parts
+    # candidate: x, y, score, id
+    return candidate, subset
+
+
+def synthetic_maps(people: int, height: int = 512, width: int = 384, seed: int = 0):
+    """Heatmaps with one gaussian blob per part and person, PAFs along each limb."""
+    from app.ai.preprocess.openpose.annotator.openpose.body import LIMB_SEQ, MAP_IDX
+
+    rng = np.random.default_rng(seed)
+    yy, xx = np.mgrid[0:height, 0:width]
+    heatmap = np.zeros((height, width, 19))
+    paf = np.zeros((height, width, 38))
+    for _ in range(people):
+        center = rng.uniform([60, 60], [width - 60, height - 120])
+        parts = center + rng.normal(0, 40, size=(18, 2))
+        parts = np.clip(parts, 2, [width - 3, height - 3])
+        for part, (x, y) in enumerate(parts):
+            heatmap[:, :, part] += 0.8 * np.exp(-((xx - x) ** 2 + (yy - y) ** 2) / (2 * 4.0 ** 2))
+        for k, (a, b) in enumerate(LIMB_SEQ):
+            (ax, ay), (bx, by) = parts[a - 1], parts[b - 1]
+            length = max(np.hypot(bx - ax, by - ay), 1e-3)
+            ux, uy = (bx - ax) / length, (by - ay) / length
+            # distance of every pixel to the limb segment
+            t = np.clip(((xx - ax) * ux + (yy - ay) * uy) / length, 0, 1)
+            dist = np.hypot(xx - (ax + t * (bx - ax)), yy - (ay + t * (by - ay)))
+            on_limb = dist < 4
+            paf[:, :, MAP_IDX[k][0] - 19][on_limb] = ux
+            paf[:, :, MAP_IDX[k][1] - 19][on_limb] = uy
+    heatmap += rng.normal(0, 0.01, heatmap.shape)
+    return heatmap, paf
+
+
+def _time(fn, runs):
+    latencies = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = fn()
+        latencies.append(time.perf_counter() - start)
+    return result, statistics.median(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark OpenPose body post-processing")
+    parser.add_argument("--image", help="Person image; runs the real network instead of synthetic maps")
+    parser.add_argument("--people", type=int, default=2, help="People in the synthetic maps")
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    from app.ai.preprocess.openpose.annotator.openpose import body as body_module
+    from app.ai.preprocess.openpose.annotator.openpose import util
+
+    if args.image:
+        from PIL import Image
+        from app.ai.preprocess.openpose.annotator.openpose import OpenposeDetector
+
+        detector = OpenposeDetector()
+        image = np.asarray(Image.open(args.image).convert("RGB").resize((384, 512)))[:, :, ::-1].copy()
+        (heatmap, paf), forward_time = _time(lambda: detector.body_estimation.forward(image), args.runs)
+        print(f"network forward + resize: {forward_time * 1000:.1f}ms")
+    else:
+        heatmap, paf = synthetic_maps(args.people)
+    image_height = heatmap.shape[0]
+
+    (ref_candidate, ref_subset), ref_time = _time(
+        lambda: postprocess_reference(heatmap, paf, image_height), args.runs)
+    (candidate, subset), vec_time = _time(
+        lambda: body_module.postprocess(heatmap, paf, image_height), args.runs)
+
+    identical = np.array_equal(ref_candidate, candidate) and np.array_equal(ref_subset, subset)
+    print(f"peaks: {len(candidate)}  people: {len(subset)}  identical: {identical}")
+    print(f"loop postprocess:       {ref_time * 1000:.1f}ms")
+    print(f"vectorized postprocess: {vec_time * 1000:.1f}ms  ({ref_time / vec_time:.1f}x)")
+
+    # Multi-channel resize of the 38-channel PAF map vs one channel at a time
+    small = paf[::8, ::8].astype(np.float32)
+    size = (paf.shape[0], paf.shape[1])
+    per_channel, per_channel_time = _time(
+        lambda: np.stack([util.smart_resize(small[:, :, i], size) for i in range(small.shape[2])], axis=2),
+        args.runs)
+    multi, multi_time = _time(lambda: util.smart_resize(small, size), args.runs)
+    print(f"PAF resize per channel: {per_channel_time * 1000:.1f}ms  multi-channel: {multi_time * 1000:.1f}ms  "
+          f"identical: {np.array_equal(per_channel, multi)}")
+
+    if not identical:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Compare the lean NumPy human-parsing path against the DataLoader-based
+onnx_inference: parse maps must be identical, and both are timed.
+
+With --modes, also time sequential vs concurrent ATR/LIP sessions and
+batched parsing of all images at once.
+
+Usage:
+    python scripts/benchmark_parsing.py person1.jpg person2.jpg --runs 5
+    python scripts/benchmark_parsing.py person*.jpg --modes --threads 8
+"""
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+
+def _time(fn, runs):
+    latencies = []
+    result = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = fn()
+        latencies.append(time.perf_counter() - start)
+    return result, latencies
+
+
+def compare_modes(images, runs, threads):
+    """Time sequential vs concurrent sessions and per-image vs batched parsing."""
+    from app.ai.preprocess.humanparsing.run_parsing import Parsing
+
+    print(f"\n{'mode':<28}{'per image (ms)':>16}")
+    reference = None
+    for label, concurrent in (("sequential sessions", False), ("concurrent sessions", True)):
+        parsing = Parsing(0, num_threads=threads, concurrent=concurrent)
+        results, latencies = _time(lambda: [parsing(image) for image in images], runs)
+        per_image = statistics.median(latencies[1:] or latencies) / len(images)
+        print(f"{label:<28}{per_image * 1000:>16.1f}")
+        reference = reference or results
+
+        results, latencies = _time(lambda: parsing.batch(images), runs)
+        per_image = statistics.median(latencies[1:] or latencies) / len(images)
+        identical = all(np.array_equal(np.asarray(a[0]), np.asarray(b[0])) for a, b in zip(reference, results))
+        print(f"{label + ' + batch':<28}{per_image * 1000:>16.1f}  identical={identical}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark human-parsing inference paths")
+    parser.add_argument("images", nargs="+", help="Person image paths")
+    parser.add_argument("--runs", type=int, default=5, help="Timed runs per image and path")
+    parser.add_argument("--size", type=int, nargs=2, default=[384, 512], metavar=("W", "H"),
+                        help="Resize images to this size first (the try-on pipeline uses 384x512)")
+    parser.add_argument("--modes", action="store_true",
+                        help="Also compare sequential, concurrent and batched parsing")
+    parser.add_argument("--threads", type=int, default=0, help="Thread budget for --modes (0 = all cores)")
+    args = parser.parse_args()
+
+    from PIL import Image
+    from app.ai.preprocess.humanparsing.run_parsing import Parsing
+    from app.ai.preprocess.humanparsing.parsing_api import onnx_inference, numpy_inference
+
+    parsing = Parsing(0)
+    baseline_times, lean_times = [], []
+    mismatches = 0
+
+    for path in args.images:
+        image = Image.open(path).convert("RGB").resize(tuple(args.size))
+        (base_img, base_face), base_lat = _time(
+            lambda: onnx_inference(parsing.session, parsing.lip_session, image), args.runs)
+        (lean_img, lean_face), lean_lat = _time(
+            lambda: numpy_inference(parsing.session, parsing.lip_session, image, parsing.buffers), args.runs)
+
+        same = (np.array_equal(np.asarray(base_img), np.asarray(lean_img))
+                and np.array_equal(base_face.numpy(), lean_face.numpy()))
+        if not same:
+            diff = np.count_nonzero(np.asarray(base_img) != np.asarray(lean_img))
+            print(f"MISMATCH {path}: {diff} pixels differ")
+            mismatches += 1
+
+        # Drop the first (warm-up) run from the summary
+        baseline_times.extend(base_lat[1:] or base_lat)
+        lean_times.extend(lean_lat[1:] or lean_lat)
+        print(f"{Path(path).name:<30} identical={same}  "
+              f"baseline={statistics.median(base_lat) * 1000:.1f}ms  lean={statistics.median(lean_lat) * 1000:.1f}ms")
+
+    base_median = statistics.median(baseline_times)
+    lean_median = statistics.median(lean_times)
+    print(f"\nmedian baseline: {base_median * 1000:.1f}ms  median lean: {lean_median * 1000:.1f}ms  "
+          f"speedup: {base_median / lean_median:.2f}x")
+    if args.modes:
+        images = [Image.open(path).convert("RGB").resize(tuple(args.size)) for path in args.images]
+        compare_modes(images, args.runs, args.threads)
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
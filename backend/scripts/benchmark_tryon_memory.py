@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Benchmark peak RSS against latency for the IDM-VTON execution modes.
+
+Each mode runs in its own subprocess because peak RSS (ru_maxrss) is a
+process-wide high-water mark.
+
+Usage:
+    python scripts/benchmark_tryon_memory.py --person person.jpg --garment shirt.jpg
+"""
+
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_single(mode: str, model_path: str, person: str, garment: str, steps: int, runs: int) -> dict:
+    """Load the pipeline in `mode` and time `runs` try-on requests."""
+    from PIL import Image
+    from app.ai.idm_vton_simplified import IDMVTONSimplified
+
+    model = IDMVTONSimplified(model_path=model_path, device="cpu", execution_mode=mode)
+    start = time.perf_counter()
+    if not model.load_models():
+        raise RuntimeError("Failed to load IDM-VTON models")
+    load_time = time.perf_counter() - start
+    rss_after_load = _peak_rss_mb()
+
+    person_image = Image.open(person)
+    garment_image = Image.open(garment)
+    latencies = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        model.generate_virtual_tryon(
+            person_image=person_image,
+            garment_image=garment_image,
+            garment_description="a stylish garment",
+            denoise_steps=steps,
+        )
+        latencies.append(time.perf_counter() - start)
+
+    return {
+        "mode": mode,
+        "load_time_s": round(load_time, 2),
+        "peak_rss_after_load_mb": round(rss_after_load, 1),
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+        "latency_s": [round(latency, 2) for latency in latencies],
+        "staging_s": {k: round(v, 2) for k, v in (model.stager.timings if model.stager else {}).items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark IDM-VTON peak RSS against latency")
+    parser.add_argument("--person", required=True, help="Person image path")
+    parser.add_argument("--garment", required=True, help="Garment image path")
+    parser.add_argument(
+        "--model-path",
+        default="/Volumes/4TB-Z/AI-Models/virtual-closet/idm-vton/model_weights",
+        help="IDM-VTON model folder",
+    )
+    parser.add_argument("--modes", nargs="+", default=["resident", "sequential"])
+    parser.add_argument("--steps", type=int, default=30, help="Denoising steps per request")
+    parser.add_argument("--runs", type=int, default=2, help="Requests per mode (first one is cold)")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        result = run_single(args.child, args.model_path, args.person, args.garment, args.steps, args.runs)
+        print(json.dumps(result))
+        return
+
+    results = []
+    for mode in args.modes:
+        cmd = [
+            sys.executable, __file__,
+            "--person", args.person,
+            "--garment", args.garment,
+            "--model-path", args.model_path,
+            "--steps", str(args.steps),
+            "--runs", str(args.runs),
+            "--child", mode,
+        ]
+        output = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    print(f"{'mode':<12}{'peak RSS (MB)':>15}{'load (s)':>10}  latency per run (s)")
+    for result in results:
+        print(f"{result['mode']:<12}{result['peak_rss_mb']:>15}{result['load_time_s']:>10}  {result['latency_s']}")
+        if result["staging_s"]:
+            print(f"{'':<12}last staging times: {result['staging_s']}")
+
+
+if __name__ == "__main__":
+    main()
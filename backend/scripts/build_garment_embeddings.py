@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Embed clothing images into the per-user garment embedding matrices.
+
+Uploads are embedded as they come in when an image encoder is available;
+run this to backfill items added before that (or while the try-on models
+were not loaded). The IDM-VTON image encoder is loaded on its own.
+
+Usage:
+    python scripts/build_garment_embeddings.py                 # items without an embedding
+    python scripts/build_garment_embeddings.py --force         # every item
+    python scripts/build_garment_embeddings.py --user USER_ID --batch-size 32
+"""
+
+import argparse
+import base64
+import io
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill garment image embeddings")
+    parser.add_argument("--clothing-file", default="app/data/mock/clothing.json")
+    parser.add_argument("--user", help="Only this user's items")
+    parser.add_argument("--force", action="store_true", help="Also re-embed items that have an embedding")
+    parser.add_argument("--batch-size", type=int, default=16)
+    args = parser.parse_args()
+
+    from PIL import Image
+    from app.ai.garment_embeddings import GarmentEmbedder
+    from app.services.embedding_index import embedding_index
+
+    clothing_file = Path(args.clothing_file)
+    if not clothing_file.exists():
+        sys.exit(f"Clothing file not found: {clothing_file}")
+    clothing = json.loads(clothing_file.read_text())
+
+    embedder = GarmentEmbedder.from_pretrained(batch_size=args.batch_size)
+    by_user = {}
+    for item in clothing:
+        if not item.get('is_active', True) or (args.user and item.get('user_id') != args.user):
+            continue
+        images = item.get('images') or {}
+        data_uri = images.get('processed') or images.get('original')
+        if data_uri and data_uri.startswith('data:'):
+            by_user.setdefault(item['user_id'], []).append((item['id'], data_uri))
+
+    start = time.perf_counter()
+    embedded = 0
+    for user_id, entries in by_user.items():
+        if not args.force:
+            existing = embedding_index.item_ids(user_id)
+            entries = [(item_id, uri) for item_id, uri in entries if item_id not in existing]
+        # Decode and embed one batch at a time to bound memory
+        for i in range(0, len(entries), args.batch_size):
+            batch = entries[i:i + args.batch_size]
+            images = [Image.open(io.BytesIO(base64.b64decode(uri.split(',', 1)[1]))) for _, uri in batch]
+            embedding_index.upsert(user_id, [item_id for item_id, _ in batch], embedder.embed(images))
+            embedded += len(batch)
+    elapsed = time.perf_counter() - start
+    print(f"Embedded {embedded} items for {len(by_user)} users in {elapsed:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Export the DensePose R-CNN backbone and DensePose head to ONNX.
+
+The exported graph takes a normalized, zero-padded image batch and person
+boxes (in input coordinates), and returns the coarse and fine segmentation
+logits per box. Region proposals and the box head are left out: at serve
+time the person box comes from the OpenPose keypoints. FPN level assignment
+is done with arithmetic masks instead of data-dependent indexing, so it
+survives tracing.
+
+A JSON sidecar next to the model stores the preprocessing config
+(input format, resize sizes, pixel mean/std, size divisibility) for
+app/ai/preprocess/densepose_onnx.py, which needs only onnxruntime and NumPy.
+
+Requires detectron2 + DensePose at export time only.
+
+Usage:
+    python scripts/export_densepose_onnx.py
+    python scripts/export_densepose_onnx.py --verify person.jpg
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+
+def build_export_module(model):
+    import torch
+
+    class DensePoseExportModule(torch.nn.Module):
+        """Backbone + DensePose pooler/head/predictor for given boxes."""
+
+        def __init__(self, model):
+            super().__init__()
+            roi_heads = model.roi_heads
+            self.backbone = model.backbone
+            self.in_features = list(roi_heads.in_features)
+            self.use_decoder = getattr(roi_heads, "use_decoder", False)
+            self.decoder = roi_heads.decoder if self.use_decoder else None
+            self.pooler = roi_heads.densepose_pooler
+            self.head = roi_heads.densepose_head
+            self.predictor = roi_heads.densepose_predictor
+
+        def forward(self, image, boxes):
+            features = self.backbone(image)
+            features = [features[f] for f in self.in_features]
+            if self.use_decoder:
+                features = [self.decoder(features)]
+
+            rois = torch.cat([torch.zeros_like(boxes[:, :1]), boxes], dim=1)
+            level_poolers = self.pooler.level_poolers
+            if len(level_poolers) == 1:
+                pooled = level_poolers[0](features[0], rois)
+            else:
+                # Same level assignment as detectron2's ROIPooler
+                box_sizes = torch.sqrt((boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1]))
+                levels = torch.floor(
+                    self.pooler.canonical_level + torch.log2(box_sizes / self.pooler.canonical_box_size + 1e-8))
+                levels = torch.clamp(levels, min=self.pooler.min_level, max=self.pooler.max_level)
+                levels = levels - self.pooler.min_level
+                pooled = 0
+                for level, (feature, level_pooler) in enumerate(zip(features, level_poolers)):
+                    weight = (levels == level).to(feature.dtype).view(-1, 1, 1, 1)
+                    pooled = pooled + level_pooler(feature, rois) * weight
+
+            outputs = self.predictor(self.head(pooled))
+            if hasattr(outputs, "coarse_segm"):
+                return outputs.coarse_segm, outputs.fine_segm
+            # Older DensePose predictors return ((S, I, U, V), ...)
+            densepose_outputs = outputs[0]
+            return densepose_outputs[0], densepose_outputs[1]
+
+    return DensePoseExportModule(model).eval()
+
+
+def export(config_path: str, weights: str, output_path: Path, opset: int):
+    import torch
+    from densepose import add_densepose_config
+    from detectron2.checkpoint import DetectionCheckpointer
+    from detectron2.config import get_cfg
+    from detectron2.modeling import build_model
+
+    cfg = get_cfg()
+    add_densepose_config(cfg)
+    cfg.merge_from_file(config_path)
+    cfg.MODEL.WEIGHTS = weights
+    cfg.MODEL.DEVICE = "cpu"
+    model = build_model(cfg).eval()
+    DetectionCheckpointer(model).load(cfg.MODEL.WEIGHTS)
+
+    module = build_export_module(model)
+    divisibility = model.backbone.size_divisibility
+    dummy_image = torch.zeros(1, 3, 1024, 768)
+    dummy_boxes = torch.tensor([[100.0, 80.0, 660.0, 1000.0]])
+    with torch.no_grad():
+        torch.onnx.export(
+            module,
+            (dummy_image, dummy_boxes),
+            str(output_path),
+            input_names=["image", "boxes"],
+            output_names=["coarse_segm", "fine_segm"],
+            dynamic_axes={
+                "image": {2: "height", 3: "width"},
+                "boxes": {0: "num_boxes"},
+                "coarse_segm": {0: "num_boxes"},
+                "fine_segm": {0: "num_boxes"},
+            },
+            # roi_align with aligned=True (ROIAlignV2) needs opset 16
+            opset_version=opset,
+        )
+
+    meta = {
+        "input_format": cfg.INPUT.FORMAT,
+        "min_size": cfg.INPUT.MIN_SIZE_TEST,
+        "max_size": cfg.INPUT.MAX_SIZE_TEST,
+        "pixel_mean": [float(v) for v in cfg.MODEL.PIXEL_MEAN],
+        "pixel_std": [float(v) for v in cfg.MODEL.PIXEL_STD],
+        "size_divisibility": int(divisibility),
+    }
+    output_path.with_suffix(".json").write_text(json.dumps(meta, indent=2))
+    print(f"Exported DensePose backbone + head to {output_path}")
+
+
+def verify(images, output_path: Path):
+    """Compare the ONNX render against the detectron2 processor in ROI mode."""
+    from PIL import Image
+    from app.ai.preprocess.densepose_onnx import OnnxDensePoseProcessor
+    from app.ai.preprocess.densepose_wrapper import DensePoseProcessor
+    from app.ai.preprocess.openpose.run_openpose import OpenPose
+
+    eager = DensePoseProcessor(device="cpu")
+    onnx = OnnxDensePoseProcessor(output_path)
+    openpose = OpenPose(0)
+    for path in images:
+        image = Image.open(path).convert("RGB").resize((768, 1024))
+        keypoints = openpose(image.resize((384, 512)))
+        eager_img = np.asarray(eager.process_image(image, keypoints=keypoints), dtype=np.int16)
+        onnx_img = np.asarray(onnx.process_image(image, keypoints=keypoints), dtype=np.int16)
+        differing = np.count_nonzero(np.any(eager_img != onnx_img, axis=2)) / (eager_img.shape[0] * eager_img.shape[1])
+        print(f"{Path(path).name:<30} pixels differing: {differing:.2%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export DensePose R-CNN to ONNX")
+    parser.add_argument("--config", help="DensePose config (default: the one DensePoseProcessor uses)")
+    parser.add_argument(
+        "--weights",
+        default="https://dl.fbaipublicfiles.com/densepose/densepose_rcnn_R_50_FPN_s1x/165712039/model_final_162be9.pkl",
+    )
+    parser.add_argument("--output", help="Output .onnx path (default: DENSEPOSE_ONNX_PATH)")
+    parser.add_argument("--opset", type=int, default=16)
+    parser.add_argument("--verify", nargs="*", metavar="IMAGE", help="Compare against detectron2 on these images")
+    args = parser.parse_args()
+
+    from app.ai.preprocess.densepose_onnx import DEFAULT_ONNX_PATH
+    from app.config.settings import settings
+
+    output_path = Path(args.output or settings.DENSEPOSE_ONNX_PATH or DEFAULT_ONNX_PATH)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    config_path = args.config or str(
+        Path(__file__).resolve().parents[1] / "detectron2_src/projects/DensePose/configs/densepose_rcnn_R_50_FPN_s1x.yaml"
+    )
+    export(config_path, args.weights, output_path, args.opset)
+    if args.verify:
+        verify(args.verify, output_path)
+
+
+if __name__ == "__main__":
+    main()
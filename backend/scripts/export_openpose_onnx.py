@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Export the OpenPose body network to ONNX with a dynamic spatial size.
+
+The model is written next to body_pose_model.pth as body_pose_model.onnx,
+which is where OpenposeDetector(backend="onnx") looks for it. With
+--verify, the keypoints of both backends are compared on the given images;
+tests/test_openpose_onnx.py runs the same check once the export exists.
+
+Usage:
+    python scripts/export_openpose_onnx.py
+    python scripts/export_openpose_onnx.py --verify person1.jpg person2.jpg
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+
+def export(output_path: Path, opset: int):
+    import torch
+    from app.ai.preprocess.openpose.annotator.openpose import Body, annotator_ckpts_path
+
+    body = Body(str(Path(annotator_ckpts_path) / "body_pose_model.pth"))
+    model = body.model.to("cpu").eval()
+    # The padded network input for a 384x512 person image at scale 0.5
+    dummy = torch.zeros(1, 3, 368, 280)
+    torch.onnx.export(
+        model,
+        dummy,
+        str(output_path),
+        input_names=["image"],
+        output_names=["paf", "heatmap"],
+        dynamic_axes={
+            "image": {2: "height", 3: "width"},
+            "paf": {2: "out_height", 3: "out_width"},
+            "heatmap": {2: "out_height", 3: "out_width"},
+        },
+        opset_version=opset,
+    )
+    print(f"Exported body network to {output_path}")
+
+
+def verify(images, tolerance: float) -> bool:
+    """Compare keypoints of the torch and ONNX backends on each image."""
+    from PIL import Image
+    from app.ai.preprocess.openpose.annotator.openpose import OpenposeDetector
+
+    torch_detector = OpenposeDetector(backend="torch")
+    onnx_detector = OpenposeDetector(backend="onnx")
+    all_match = True
+    for path in images:
+        image = np.asarray(Image.open(path).convert("RGB").resize((384, 512)))
+        torch_pose = torch_detector(image, return_is_index=True)["bodies"]
+        onnx_pose = onnx_detector(image, return_is_index=True)["bodies"]
+
+        torch_candidate = np.array(torch_pose["candidate"])
+        onnx_candidate = np.array(onnx_pose["candidate"])
+        # Keypoints are peak pixels, so both backends must agree on them exactly
+        # (normalized by the image size); only the network scores may drift
+        same_shape = torch_candidate.shape == onnx_candidate.shape
+        same_points = same_shape and np.allclose(torch_candidate, onnx_candidate, atol=tolerance, rtol=0)
+        torch_subset = np.array(torch_pose["subset"]).reshape(-1, 20)
+        onnx_subset = np.array(onnx_pose["subset"]).reshape(-1, 20)
+        same_subset = np.array_equal(torch_subset[:, :18], onnx_subset[:, :18])
+        match = same_points and same_subset
+        all_match &= match
+        print(f"{Path(path).name:<30} keypoints={len(torch_candidate)}/{len(onnx_candidate)}  "
+              f"people={len(torch_pose['subset'])}/{len(onnx_pose['subset'])}  match={match}")
+    return all_match
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the OpenPose body network to ONNX")
+    parser.add_argument("--output", help="Output path (default: next to body_pose_model.pth, "
+                                         "which is also the path --verify loads)")
+    parser.add_argument("--opset", type=int, default=17)
+    parser.add_argument("--skip-export", action="store_true", help="Only run --verify on an existing export")
+    parser.add_argument("--verify", nargs="*", metavar="IMAGE", help="Images for the keypoint parity check")
+    parser.add_argument("--tolerance", type=float, default=1e-6,
+                        help="Max normalized keypoint difference allowed in --verify")
+    args = parser.parse_args()
+
+    from app.ai.preprocess.openpose.annotator.openpose import annotator_ckpts_path
+
+    output_path = Path(args.output) if args.output else Path(annotator_ckpts_path) / "body_pose_model.onnx"
+    if not args.skip_export:
+        export(output_path, args.opset)
+
+    if args.verify:
+        if not verify(args.verify, args.tolerance):
+            print("Keypoint parity check FAILED")
+            sys.exit(1)
+        print("Keypoint parity check passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Sweep per-user try-on files: reconcile the access-time index with the
+upload folder (only user directories changed since the last sweep are
+listed) and evict stale temp files, files idle for --idle-days and the
+least recently accessed files of users over --quota-mb.
+
+The API process runs the same sweep every STORAGE_SWEEP_INTERVAL_MINUTES.
+
+Usage:
+    python scripts/manage_storage.py --dry-run
+    python scripts/manage_storage.py --quota-mb 200 --idle-days 14
+    python scripts/manage_storage.py --full-scan --verbose
+"""
+
+import argparse
+import sys
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+
+def main():
+    from app.config import settings
+
+    parser = argparse.ArgumentParser(description="Enforce quotas and evict idle try-on files")
+    parser.add_argument("--upload-dir", default=settings.UPLOAD_FOLDER)
+    parser.add_argument("--db", default=settings.STORAGE_DB, help="Access-time index")
+    parser.add_argument("--quota-mb", type=int, default=settings.STORAGE_USER_QUOTA_MB,
+                        help="Per-user quota (0 = unlimited)")
+    parser.add_argument("--idle-days", type=int, default=settings.STORAGE_IDLE_DAYS,
+                        help="Evict files not accessed for this many days (0 = never)")
+    parser.add_argument("--dry-run", action="store_true", help="Report what would be evicted without deleting")
+    parser.add_argument("--full-scan", action="store_true", help="List every user directory, not only changed ones")
+    parser.add_argument("--verbose", action="store_true", help="List every evicted file")
+    args = parser.parse_args()
+
+    from app.services.storage_manager import StorageManager
+
+    manager = StorageManager(args.upload_dir, args.db, args.quota_mb, args.idle_days)
+    report = manager.sweep(dry_run=args.dry_run, full_scan=args.full_scan)
+
+    by_user = defaultdict(list)
+    for eviction in report.evictions:
+        by_user[eviction.user_id].append(eviction)
+    if by_user:
+        print(f"{'user':<40} {'files':>6} {'MB':>9}  temp/idle/quota")
+    for user_id, evictions in sorted(by_user.items()):
+        reasons = [sum(e.reason == r for e in evictions) for r in ("temp", "idle", "quota")]
+        size_mb = sum(e.size for e in evictions) / 2 ** 20
+        print(f"{user_id:<40} {len(evictions):>6} {size_mb:>9.2f}  {'/'.join(map(str, reasons))}")
+        if args.verbose:
+            for e in evictions:
+                accessed = datetime.fromtimestamp(e.last_access).isoformat(timespec="seconds")
+                print(f"    {e.name}  {e.size / 2 ** 20:.2f} MB  last access {accessed}  ({e.reason})")
+    print(report.summary())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Recompute the materialized wardrobe analytics from the clothing and outfit
+files.
+
+The aggregates are kept current on every write; run this after editing the
+data files by hand, restoring a backup, or changing how analytics are
+computed.
+
+Usage:
+    python scripts/rebuild_wardrobe_analytics.py                 # every user
+    python scripts/rebuild_wardrobe_analytics.py --user USER_ID
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild wardrobe analytics aggregates")
+    parser.add_argument("--clothing-file", default="app/data/mock/clothing.json")
+    parser.add_argument("--outfits-file", default="app/data/mock/outfits.json")
+    parser.add_argument("--user", help="Only this user")
+    args = parser.parse_args()
+
+    from app.services.wardrobe_analytics import wardrobe_analytics
+
+    clothing = json.loads(Path(args.clothing_file).read_text()) if Path(args.clothing_file).exists() else []
+    outfits = json.loads(Path(args.outfits_file).read_text()) if Path(args.outfits_file).exists() else []
+
+    items_by_user, outfits_by_user = {}, {}
+    for item in clothing:
+        items_by_user.setdefault(item.get('user_id'), []).append(item)
+    for outfit in outfits:
+        outfits_by_user[outfit.get('user_id')] = outfits_by_user.get(outfit.get('user_id'), 0) + 1
+
+    users = [args.user] if args.user else sorted(u for u in set(items_by_user) | set(outfits_by_user) if u)
+    start = time.perf_counter()
+    for user_id in users:
+        wardrobe_analytics.build(user_id, items_by_user.get(user_id, []), outfits_by_user.get(user_id, 0))
+    print(f"Rebuilt analytics for {len(users)} users in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Recompute the color palettes stored on clothing records.
+
+New items get their palette at upload; run this after changing the
+extraction or to backfill items imported before palettes existed.
+
+Usage:
+    python scripts/recompute_color_palettes.py            # items without a palette
+    python scripts/recompute_color_palettes.py --force    # every item
+    python scripts/recompute_color_palettes.py --user USER_ID --dry-run
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompute clothing color palettes")
+    parser.add_argument("--clothing-file", default="app/data/mock/clothing.json")
+    parser.add_argument("--user", help="Only this user's items")
+    parser.add_argument("--force", action="store_true", help="Also recompute existing palettes")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--dry-run", action="store_true", help="Compute but do not write")
+    args = parser.parse_args()
+
+    from app.services.clothing_service import recompute_palettes
+
+    clothing_file = Path(args.clothing_file)
+    if not clothing_file.exists():
+        sys.exit(f"Clothing file not found: {clothing_file}")
+    clothing = json.loads(clothing_file.read_text())
+
+    start = time.perf_counter()
+    updated = recompute_palettes(clothing, user_id=args.user, force=args.force, workers=args.workers)
+    elapsed = time.perf_counter() - start
+    print(f"Updated {updated} palettes in {elapsed:.2f}s")
+
+    if updated and not args.dry_run:
+        clothing_file.write_text(json.dumps(clothing, indent=2, default=str))
+        print(f"Saved {clothing_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+import os
+from pathlib import Path
+
+import numpy as np
+import pytest
+from PIL import Image
+
+pytest.importorskip("torch")
+pytest.importorskip("onnxruntime")
+
+from app.ai.preprocess.openpose.annotator.openpose import OpenposeDetector, annotator_ckpts_path
+
+PERSON_IMAGE = Path(__file__).resolve().parents[2] / "assets" / "55585FDD-1FE4-49E6-BD84-56D3CF94670D_1_102_a.jpeg"
+# Keypoints are peak pixels normalized by the image size; only the network scores may drift
+KEYPOINT_TOLERANCE = 1e-6
+
+pytestmark = pytest.mark.skipif(
+    not all(os.path.exists(os.path.join(annotator_ckpts_path, name))
+            for name in ("body_pose_model.pth", "body_pose_model.onnx")),
+    reason="OpenPose weights or body_pose_model.onnx (scripts/export_openpose_onnx.py) not found",
+)
+
+
+@pytest.fixture(scope="module")
+def detectors():
+    return OpenposeDetector(backend="torch"), OpenposeDetector(backend="onnx")
+
+
+@pytest.mark.parametrize("size", [(384, 512), (768, 1024)])
+def test_onnx_keypoints_match_torch(detectors, size):
+    image = np.asarray(Image.open(PERSON_IMAGE).convert("RGB").resize(size))
+    torch_pose, onnx_pose = (detector(image, return_is_index=True)["bodies"] for detector in detectors)
+
+    torch_candidate = np.array(torch_pose["candidate"])
+    onnx_candidate = np.array(onnx_pose["candidate"])
+    assert len(torch_candidate) > 0
+    assert torch_candidate.shape == onnx_candidate.shape
+    np.testing.assert_allclose(onnx_candidate[:, :2], torch_candidate[:, :2], atol=KEYPOINT_TOLERANCE, rtol=0)
+
+    torch_subset = np.array(torch_pose["subset"]).reshape(-1, 20)
+    onnx_subset = np.array(onnx_pose["subset"]).reshape(-1, 20)
+    assert np.array_equal(onnx_subset[:, :18], torch_subset[:, :18])
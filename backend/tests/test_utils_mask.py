@@ -0,0 +1,69 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw, ImageFilter
+
+# app.ai's package __init__ imports torch through model_manager
+pytest.importorskip("torch")
+
+from app.ai.utils_mask import normalize_mask
+
+# Smaller and larger than the 768x1024 output, and not at its aspect ratio
+SIZES = [(384, 512), (1080, 1440), (600, 900)]
+MODES = ["L", "RGB", "RGBA", "P"]
+
+
+def loop_binary_mask(mask_image, threshold=0):
+    """The former user-mask path of IDMVTONSimplified (RGB, resize, per-pixel threshold)."""
+    pil_image = mask_image.convert("RGB").resize((768, 1024))
+    np_image = np.array(pil_image)
+    grayscale_image = Image.fromarray(np_image).convert("L")
+    binary_mask = np.array(grayscale_image) > threshold
+    mask = np.zeros(binary_mask.shape, dtype=np.uint8)
+    for i in range(binary_mask.shape[0]):
+        for j in range(binary_mask.shape[1]):
+            if binary_mask[i, j] == True:
+                mask[i, j] = 1
+    mask = (mask * 255).astype(np.uint8)
+    return Image.fromarray(mask)
+
+
+def synthetic_mask(mode, size, seed):
+    """Blurred random shapes, so thresholds hit anti-aliased edges."""
+    rng = np.random.default_rng(seed)
+    image = Image.new("RGB", size, (0, 0, 0))
+    draw = ImageDraw.Draw(image)
+    for _ in range(rng.integers(1, 5)):
+        x0, y0 = rng.uniform(0, size[0] * 0.7), rng.uniform(0, size[1] * 0.7)
+        x1, y1 = x0 + rng.uniform(40, size[0] * 0.5), y0 + rng.uniform(40, size[1] * 0.5)
+        draw.ellipse([x0, y0, x1, y1], fill=tuple(int(c) for c in rng.integers(20, 256, 3)))
+    image = image.filter(ImageFilter.GaussianBlur(3))
+    if mode == "P":
+        return image.convert("P", palette=Image.ADAPTIVE)
+    return image.convert(mode)
+
+
+@pytest.mark.parametrize("mode", MODES)
+@pytest.mark.parametrize("size", SIZES)
+def test_normalize_mask_matches_loop(mode, size):
+    seed = SIZES.index(size) * len(MODES) + MODES.index(mode)
+    image = synthetic_mask(mode, size, seed)
+    threshold = (0, 10, 127)[seed % 3]
+    expected = np.asarray(loop_binary_mask(image, threshold))
+
+    mask = normalize_mask(image, threshold=threshold)
+
+    assert mask.mode == "L"
+    assert np.array_equal(np.asarray(mask), expected)
+
+
+@pytest.mark.parametrize("mode", MODES)
+def test_normalize_mask_array_and_bytes_inputs(mode):
+    image = synthetic_mask(mode, (600, 900), seed=7)
+    expected = np.asarray(loop_binary_mask(image))
+    encoded = io.BytesIO()
+    image.convert("RGB").save(encoded, format="PNG")
+
+    for source in (np.array(image.convert("RGB")), encoded.getvalue()):
+        assert np.array_equal(np.asarray(normalize_mask(source)), expected)
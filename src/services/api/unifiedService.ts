@@ -6,9 +6,19 @@ import { mockAIChat } from '../mockData/aiChat';
 import { mockUser } from '../mockData/user';
 import { mockAuth } from '../mockData/auth';
 import api from '../api';
+import { getBaseURLWithoutVersion } from '../../config/api';
 import AsyncStorage from '@react-native-async-storage/async-storage';
 import { ClothingCategory } from '../../types/clothing';
 
+// Smallest rendition the server offers that covers `size` (else the largest), so the grid never
+// downloads full-size images; sizes and formats come from the API's `renditions` map
+const pickRendition = (renditions: Record<string, string>, size: number): string | undefined => {
+  const sizes = Object.keys(renditions).map(Number).sort((a, b) => a - b);
+  if (sizes.length === 0) return undefined;
+  const chosen = sizes.find((s) => s >= size) ?? sizes[sizes.length - 1];
+  return `${getBaseURLWithoutVersion()}${renditions[String(chosen)]}`;
+};
+
 // Transform backend snake_case to frontend camelCase
 const transformClothingFromBackend = (item: any) => ({
   id: item.id,
@@ -17,7 +27,8 @@ const transformClothingFromBackend = (item: any) => ({
   category: item.category,
   images: {
     original: item.images?.original || '',
-    thumbnail: item.images?.thumbnail || item.images?.original || '',
+    thumbnail: (item.images?.renditions && pickRendition(item.images.renditions, 300))
+      || item.images?.thumbnail || item.images?.original || '',
   },
   createdAt: item.created_at,
   updatedAt: item.updated_at,